@@ -0,0 +1,236 @@
+# Multi-process agent workers connected by a local message bus.
+#
+# Each agent (or a pool of replicas of it) runs in its own worker process with a
+# bounded mailbox. Senders block for at most BUS_SEND_TIMEOUT seconds when a
+# mailbox is full (backpressure), workers drain several envelopes per wake-up
+# (batched delivery), and transfer_to_agent handoffs are forwarded to the target
+# agent's mailbox together with the conversation. One more process owns the shared
+# long-term memory log: workers hand it their writes and read the log it appends.
+#
+#   bus = AgentBus(["Sales Agent", "Customer Support Agent"], replicas={"Customer Support Agent": 2})
+#   bus.start()
+#   bus.submit_turn("Sales Agent", [{"role": "user", "content": "I need a refund"}])
+#   print(bus.get_result(timeout=120))
+#   bus.stop()
+
+import os
+import queue
+import uuid
+import logging
+import multiprocessing
+from typing import Dict, List, Optional
+
+BUS_MAILBOX_SIZE = int(os.getenv('BUS_MAILBOX_SIZE', '256'))  # Batches waiting per agent mailbox
+BUS_BATCH_SIZE = int(os.getenv('BUS_BATCH_SIZE', '32'))  # Envelopes handled per worker wake-up
+BUS_SEND_TIMEOUT = float(os.getenv('BUS_SEND_TIMEOUT', '5'))  # Seconds a sender waits on a full mailbox
+BUS_MAX_HANDOFFS = int(os.getenv('BUS_MAX_HANDOFFS', '5'))  # Handoffs per conversation before giving up
+
+
+class MailboxFull(Exception):
+    """Raised when a recipient's mailbox stays full for longer than the send timeout."""
+
+
+class BusClient:
+    """
+    Sending side of the bus. Picklable, so it is handed to every worker process;
+    inside a worker it replaces direct Agent.communicate calls.
+    """
+
+    def __init__(self, mailboxes: Dict[str, 'multiprocessing.Queue'], results: 'multiprocessing.Queue',
+                 memory: 'multiprocessing.Queue'):
+        self.mailboxes = mailboxes
+        self.results = results
+        self.memory = memory
+
+    def send_batch(self, recipient: str, envelopes: List[Dict], timeout: float = BUS_SEND_TIMEOUT):
+        if recipient not in self.mailboxes:
+            raise KeyError(f"No worker for agent '{recipient}'.")
+        try:
+            self.mailboxes[recipient].put(envelopes, timeout=timeout)
+        except queue.Full:
+            raise MailboxFull(f"Mailbox for '{recipient}' is full.")
+
+    def send(self, recipient: str, envelope: Dict, timeout: float = BUS_SEND_TIMEOUT):
+        self.send_batch(recipient, [envelope], timeout=timeout)
+
+    def send_message(self, sender: str, recipient: str, message: str):
+        """Agent-to-agent message, delivered to the recipient's receive_message."""
+        self.send(recipient, {'kind': 'message', 'sender': sender, 'body': message})
+
+    def write_memory(self, texts: List[str], owner: str, visibility: str, readers: List[str],
+                     sources: Optional[List[Optional[str]]] = None):
+        """Long-term memory write, stored by the memory owner process (the SharedMemory writer hook)."""
+        self.memory.put([{'kind': 'write', 'texts': texts, 'owner': owner, 'visibility': visibility,
+                          'readers': readers, 'sources': sources}])
+
+
+def _drain(mailbox, batch_size: int) -> List[Dict]:
+    """Blocks for the first batch, then takes whatever else is already waiting."""
+    envelopes = list(mailbox.get())
+    while len(envelopes) < batch_size:
+        try:
+            envelopes.extend(mailbox.get_nowait())
+        except queue.Empty:
+            break
+    return envelopes
+
+
+def _run_turn(gptco, client: BusClient, agent_name: str, envelope: Dict):
+    agent = gptco.agents[agent_name]
+    response = gptco.run_full_turn(agent, envelope['messages'])
+    history = envelope['messages'] + response.messages
+    handoffs = envelope.get('handoffs', [])
+    target = response.agent.name if response.agent else agent_name
+
+    if target != agent_name and target in client.mailboxes and len(handoffs) < BUS_MAX_HANDOFFS:
+        # Route the handoff to the process that owns the target agent
+        client.send(target, {
+            'kind': 'turn',
+            'id': envelope['id'],
+            'messages': history,
+            'handoffs': handoffs + [{'source': agent_name, 'target': target}],
+        })
+        return
+
+    client.results.put({
+        'id': envelope['id'],
+        'agent': target,
+        'messages': history,
+        'handoffs': handoffs,
+    })
+
+
+def _log_file(gptco, name: str) -> str:
+    # One log file per worker process: rotation is not safe with several writers on one file
+    return f"{os.path.splitext(gptco.AGENT_LOG_FILE)[0]}.{name.replace(' ', '_')}.{os.getpid()}.log"
+
+
+def agent_worker(agent_name: str, client: BusClient, replica: int = 1, batch_size: int = BUS_BATCH_SIZE):
+    """Worker process entry point: hosts one agent and serves its mailbox until told to stop."""
+    import gptco  # Imported in the child so every worker has its own agents and globals
+    from structured_logging import configure_logging
+
+    configure_logging(_log_file(gptco, agent_name))
+    gptco.message_bus = client
+    # Only the memory owner appends to the shared log; this process reads what it writes
+    gptco.shared_memory.writer = client.write_memory
+    agent = gptco.agents[agent_name]
+    if replica > 1:
+        gptco.load_agent_memory(agent, replica=replica)
+    gptco.current_agent.set(agent)
+    mailbox = client.mailboxes[agent_name]
+
+    while True:
+        envelopes = _drain(mailbox, batch_size)
+        received = 0
+        stops = 0
+        for envelope in envelopes:
+            kind = envelope.get('kind')
+            try:
+                if kind == 'stop':
+                    stops += 1  # Handled once the rest of the batch is done
+                elif kind == 'message':
+                    agent.receive_message(envelope['sender'], envelope['body'])
+                    received += 1
+                elif kind == 'turn':
+                    _run_turn(gptco, client, agent_name, envelope)
+            except Exception as e:
+                logging.error(f"{agent_name} worker failed on a '{kind}' envelope. Error: {str(e)}")
+                if kind == 'turn':
+                    client.results.put({'id': envelope.get('id'), 'agent': agent_name, 'error': str(e)})
+        if received or stops:
+            gptco.save_agent_memory(agent, replica=replica)
+        if stops:
+            # One stop is meant for each replica; hand back the ones this worker drained for its siblings
+            for _ in range(stops - 1):
+                client.send(agent_name, {'kind': 'stop'})
+            return
+
+
+def memory_owner(client: BusClient, batch_size: int = BUS_BATCH_SIZE):
+    """
+    Process entry point for the only writer of the shared memory log. Writes from all workers are
+    grouped per owner, so each wake-up makes one embedding call per group.
+    """
+    import gptco
+    from structured_logging import configure_logging
+
+    configure_logging(_log_file(gptco, 'shared memory'))
+    while True:
+        requests = _drain(client.memory, batch_size)
+        groups: Dict[tuple, tuple] = {}
+        for request in requests:
+            if request.get('kind') != 'write':
+                continue
+            key = (request['owner'], request['visibility'], tuple(request['readers']))
+            texts, sources = groups.setdefault(key, ([], []))
+            texts.extend(request['texts'])
+            sources.extend(request['sources'] or [None] * len(request['texts']))
+        for (owner, visibility, readers), (texts, sources) in groups.items():
+            try:
+                gptco.shared_memory.add_many(texts, owner, visibility, readers, sources=sources)
+            except Exception as e:
+                logging.error(f"Failed to store {len(texts)} shared memory entries for {owner}. Error: {str(e)}")
+        if any(request.get('kind') == 'stop' for request in requests):
+            gptco.shared_memory.close()
+            return
+
+
+class AgentBus:
+    """Starts and supervises one or more worker processes per agent."""
+
+    def __init__(self, agent_names: List[str], replicas: Optional[Dict[str, int]] = None,
+                 mailbox_size: int = BUS_MAILBOX_SIZE):
+        # Spawned (not forked) children start lean and do not inherit the parent's threads
+        self.context = multiprocessing.get_context('spawn')
+        self.replicas = {name: max(1, (replicas or {}).get(name, 1)) for name in agent_names}
+        mailboxes = {name: self.context.Queue(maxsize=mailbox_size) for name in agent_names}
+        self.client = BusClient(mailboxes, self.context.Queue(), self.context.Queue())
+        self.processes = []
+        self.memory_process = None
+
+    def start(self):
+        self.memory_process = self.context.Process(target=memory_owner, args=(self.client,),
+                                                   name="shared memory", daemon=True)
+        self.memory_process.start()
+        for name, count in self.replicas.items():
+            for replica in range(count):
+                process = self.context.Process(
+                    target=agent_worker,
+                    args=(name, self.client, replica + 1),
+                    name=f"{name} #{replica + 1}",
+                    daemon=True,
+                )
+                process.start()
+                self.processes.append(process)
+
+    def submit_turn(self, agent_name: str, messages: List[Dict], timeout: float = BUS_SEND_TIMEOUT) -> str:
+        """Queues a conversation turn for an agent and returns its ID."""
+        turn_id = uuid.uuid4().hex
+        self.client.send(agent_name, {'kind': 'turn', 'id': turn_id, 'messages': messages, 'handoffs': []},
+                         timeout=timeout)
+        return turn_id
+
+    def send_message(self, sender: str, recipient: str, message: str):
+        self.client.send_message(sender, recipient, message)
+
+    def get_result(self, timeout: Optional[float] = None) -> Dict:
+        """Returns the next finished turn: {'id', 'agent', 'messages', 'handoffs'} or {'id', 'error'}."""
+        return self.client.results.get(timeout=timeout)
+
+    def stop(self, timeout: float = 10):
+        for name, count in self.replicas.items():
+            for _ in range(count):
+                self.client.send(name, {'kind': 'stop'}, timeout=timeout)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        if self.memory_process is not None:
+            # Last, so the workers' final writes are stored
+            self.client.memory.put([{'kind': 'stop'}])
+            self.memory_process.join(timeout)
+            if self.memory_process.is_alive():
+                self.memory_process.terminate()
+            self.memory_process = None
@@ -0,0 +1,85 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Any
+from pydantic import BaseModel
+
+
+class AgentSpec(BaseModel):
+    """Declarative agent definition; the Agent itself is only built on first use."""
+    name: str
+    email: str
+    purpose_prompt: str
+    tools: List
+
+
+def normalize_agent_name(name: str) -> str:
+    return name.lower().replace(' ', '')
+
+
+class AgentRegistry:
+    """
+    Dict-like registry of agents. Names, emails and the normalized-name index are known
+    up front; an agent (and its memory) is materialized by `factory(spec)` the first
+    time it is looked up, so a session that only talks to one agent only pays for one.
+    """
+
+    def __init__(self, specs: List[AgentSpec], factory: Callable[[AgentSpec], Any]):
+        self._specs = {spec.name: spec for spec in specs}
+        self._factory = factory
+        self._agents = {}
+        self._lock = threading.RLock()
+        # Built once instead of on every transfer_to_agent call
+        self._name_index = {normalize_agent_name(name): name for name in self._specs}
+        self.materialize_timings = {}  # Seconds spent building each agent
+
+    def __getitem__(self, name: str):
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        with self._lock:
+            agent = self._agents.get(name)
+            if agent is None:
+                spec = self._specs[name]  # KeyError for unknown agents, like a dict
+                started = time.perf_counter()
+                agent = self._factory(spec)
+                self.materialize_timings[name] = time.perf_counter() - started
+                logging.info(f"Materialized {name} in {self.materialize_timings[name] * 1000:.1f} ms")
+                self._agents[name] = agent
+            return agent
+
+    def find(self, agent_name: str):
+        """Looks up an agent by name, ignoring case and spaces. Returns None if unknown."""
+        name = self._name_index.get(normalize_agent_name(agent_name))
+        return self[name] if name is not None else None
+
+    def get(self, name: str, default=None):
+        return self[name] if name in self._specs else default
+
+    def spec(self, name: str) -> AgentSpec:
+        return self._specs[name]
+
+    def is_materialized(self, name: str) -> bool:
+        return name in self._agents
+
+    def materialized(self) -> Dict[str, Any]:
+        """Agents that have been built so far, without building the rest."""
+        return dict(self._agents)
+
+    def keys(self):
+        return self._specs.keys()
+
+    def values(self):
+        return [self[name] for name in self._specs]
+
+    def items(self):
+        return [(name, self[name]) for name in self._specs]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def __iter__(self):
+        return iter(self._specs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
@@ -0,0 +1,196 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from telemetry import increment
+
+# Artifact store configuration (override in the .env file)
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', 'artifacts')
+ARTIFACT_THRESHOLD = int(os.getenv('ARTIFACT_THRESHOLD', '4000'))  # Tool results longer than this (characters) are stored
+ARTIFACT_SUMMARY_CHARS = int(os.getenv('ARTIFACT_SUMMARY_CHARS', '600'))  # Extractive summary sent to the model instead
+ARTIFACT_PAGE_CHARS = int(os.getenv('ARTIFACT_PAGE_CHARS', '3000'))  # Characters returned per read_artifact page
+
+_HANDLE_LENGTH = 16
+_BASE64 = re.compile(r'^[A-Za-z0-9+/=\s]+$')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD = re.compile(r'[a-z][a-z0-9]{2,}')
+_STOPWORDS = set(
+    "the and for are but not you all any can had her was one our out his has how its may new now see two who "
+    "did get him let put say she too use that with this from they will would there their what about which when "
+    "your have been were into more than them then some could other these those also only just such very".split()
+)
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text and the title of an HTML page."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self.title = ''
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style', 'noscript', 'svg'):
+            self._skip += 1
+        elif tag == 'title':
+            self._in_title = True
+        elif tag in ('p', 'br', 'div', 'li', 'h1', 'h2', 'h3', 'tr', 'section', 'article'):
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'noscript', 'svg') and self._skip:
+            self._skip -= 1
+        elif tag == 'title':
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self.parts.append(data)
+
+
+def looks_like_html(text: str) -> bool:
+    head = text[:1000].lower()
+    return '<html' in head or '<!doctype html' in head or head.count('</') > 5
+
+
+def looks_like_base64(text: str) -> bool:
+    sample = text[:4000]
+    return len(text) > 256 and ' ' not in sample.strip() and bool(_BASE64.match(sample))
+
+
+def html_to_text(html: str) -> Tuple[str, str]:
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logging.warning(f"Could not parse HTML for summary. Error: {str(e)}")
+        return '', html
+    text = re.sub(r'[ \t\r\f\v]+', ' ', ''.join(parser.parts))
+    text = re.sub(r'\s*\n\s*', '\n', text).strip()
+    return ' '.join(parser.title.split()), text
+
+
+def summarize(content: str, limit: int = ARTIFACT_SUMMARY_CHARS) -> str:
+    """
+    Extractive summary: sentences are scored by the frequency of their content words across the
+    whole text, and the best ones are kept in their original order until `limit` characters.
+    HTML is reduced to its title and visible text first; base64 payloads are only described.
+    """
+    if looks_like_base64(content):
+        return f"Base64-encoded binary data (about {len(content) * 3 // 4} bytes); not readable as text."
+    title = ''
+    if looks_like_html(content):
+        title, content = html_to_text(content)
+    sentences = [s.strip() for s in _SENTENCE_END.split(content) if len(s.strip()) > 20]
+    if not sentences:
+        return (title + "\n" if title else '') + ' '.join(content.split())[:limit]
+    frequencies = Counter(word for word in _WORD.findall(content.lower()) if word not in _STOPWORDS)
+
+    def score(sentence: str) -> float:
+        words = [word for word in _WORD.findall(sentence.lower()) if word not in _STOPWORDS]
+        return sum(frequencies[word] for word in words) / (len(words) + 5) if words else 0.0
+
+    budget = limit - len(title)
+    ranked = sorted(range(len(sentences)), key=lambda i: (-score(sentences[i]), i))
+    chosen = []
+    # The opening sentence usually says what the document is, so it is always considered first
+    for i in [0] + ranked:
+        if i in chosen:
+            continue
+        cost = min(len(sentences[i]), 300) + 1
+        if cost > budget:
+            continue
+        chosen.append(i)
+        budget -= cost
+    lines = [sentences[i] if len(sentences[i]) <= 300 else sentences[i][:297] + '...' for i in sorted(chosen)]
+    return (f"{title}\n" if title else '') + ' '.join(lines)
+
+
+class ArtifactStore:
+    """
+    Content-addressed storage for large tool results. Each artifact is written once to
+    `<dir>/<hh>/<sha256>.txt` (identical results share a file) with a small JSON sidecar, and is
+    referred to in prompts and memories by a short handle (the first 16 hex digits of the hash).
+    """
+
+    def __init__(self, directory: str = ARTIFACT_DIR, threshold: int = ARTIFACT_THRESHOLD,
+                 page_chars: int = ARTIFACT_PAGE_CHARS):
+        self.directory = directory
+        self.threshold = threshold
+        self.page_chars = page_chars
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str, suffix: str = '.txt') -> str:
+        return os.path.join(self.directory, digest[:2], digest + suffix)
+
+    def put(self, content: str, source: str = '') -> Dict:
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        meta = {'handle': digest[:_HANDLE_LENGTH], 'sha256': digest, 'source': source, 'chars': len(content),
+                'pages': max(1, -(-len(content) // self.page_chars)), 'created': time.time()}
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                for target, payload in ((path, data), (self._path(digest, '.json'), json.dumps(meta).encode('utf-8'))):
+                    temporary = f"{target}.{os.getpid()}.tmp"
+                    with open(temporary, 'wb') as f:
+                        f.write(payload)
+                    os.replace(temporary, target)
+                increment('gptco_artifacts_total', outcome='stored', source=source)
+            else:
+                increment('gptco_artifacts_total', outcome='deduplicated', source=source)
+        return meta
+
+    def resolve(self, handle: str) -> Optional[str]:
+        """Full hash for a handle (any unique prefix of at least 8 hex digits)."""
+        handle = handle.strip().lower()
+        if len(handle) < 8 or not re.fullmatch(r'[0-9a-f]+', handle):
+            return None
+        bucket = os.path.join(self.directory, handle[:2])
+        if not os.path.isdir(bucket):
+            return None
+        matches = [name[:-4] for name in os.listdir(bucket) if name.startswith(handle) and name.endswith('.txt')]
+        return matches[0] if len(matches) == 1 else None
+
+    def read(self, handle: str, page: int = 1) -> Optional[Dict]:
+        digest = self.resolve(handle)
+        if digest is None:
+            return None
+        with open(self._path(digest), encoding='utf-8') as f:
+            content = f.read()
+        pages = max(1, -(-len(content) // self.page_chars))
+        page = min(max(int(page), 1), pages)
+        start = (page - 1) * self.page_chars
+        return {'handle': digest[:_HANDLE_LENGTH], 'page': page, 'pages': pages,
+                'content': content[start:start + self.page_chars]}
+
+    def offload(self, content: str, source: str = '') -> str:
+        """Returns `content` unchanged when small; otherwise stores it and returns a handle plus summary."""
+        if content is None or len(content) <= self.threshold:
+            return content
+        try:
+            meta = self.put(content, source)
+        except OSError as e:
+            logging.error(f"Could not store artifact for {source}; truncating instead. Error: {str(e)}")
+            return content[:self.threshold] + f"\n[truncated, {len(content)} characters in total]"
+        return (
+            f"[artifact {meta['handle']}] The {source or 'tool'} result was {meta['chars']} characters, "
+            f"stored as an artifact.\nSummary: {summarize(content)}\n"
+            f"Read the full content with read_artifact(handle='{meta['handle']}', page=1) ({meta['pages']} pages)."
+        )
+
+
+artifacts = ArtifactStore()
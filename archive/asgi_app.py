@@ -0,0 +1,110 @@
+# ASGI serving mode for the agent action API.
+# Run standalone with several worker processes:
+#   python asgi_app.py --workers 4 --port 5000
+# or through any ASGI server:
+#   uvicorn asgi_app:app --workers 4
+
+import os
+import json
+import asyncio
+import argparse
+import threading
+from typing import Callable
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from structured_logging import configure_logging
+
+
+def create_app(execute_agent_action: Callable, run_batch_item: Callable, action_workers: int,
+               log_file: str) -> Starlette:
+    """
+    Builds the ASGI app around the agent API's callables and settings. gptco.start_server passes its
+    own, so a gptco running as __main__ is not imported a second time.
+    """
+    # Bounds the number of actions in flight per worker process across all requests
+    action_slots = None
+
+    def slots() -> asyncio.Semaphore:
+        nonlocal action_slots
+        if action_slots is None:
+            action_slots = asyncio.Semaphore(action_workers)
+        return action_slots
+
+    async def run_blocking(func, *args):
+        # Tools are blocking (HTTP, SMTP, disk), so they run on the default thread pool
+        async with slots():
+            return await asyncio.to_thread(func, *args)
+
+    async def agent_action(request: Request):
+        data = await request.json()
+        action = data.get('action')
+        params = data.get('params', {})
+        result = await run_blocking(execute_agent_action, action, params, data.get('agent'))
+        return JSONResponse({'result': json.loads(json.dumps(result, default=str))})
+
+    async def agent_actions(request: Request):
+        """Runs a batch of actions concurrently and streams one NDJSON line per result as it finishes."""
+        data = await request.json()
+        actions = data.get('actions', [])
+
+        async def generate():
+            tasks = [asyncio.ensure_future(run_blocking(run_batch_item, index, item))
+                     for index, item in enumerate(actions)]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    outcome = await next_done
+                    yield json.dumps(outcome, default=str) + "\n"
+            finally:
+                # Client went away: drop actions that have not started yet
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    def configure_worker_logging():
+        # No-op when gptco.main() already configured logging; uvicorn worker processes get their own file
+        configure_logging(f"{os.path.splitext(log_file)[0]}.asgi.{os.getpid()}.log")
+
+    return Starlette(routes=[
+        Route('/agent_action', agent_action, methods=['POST']),
+        Route('/agent_actions', agent_actions, methods=['POST']),
+    ], on_startup=[configure_worker_logging])
+
+
+def __getattr__(name):
+    # `uvicorn asgi_app:app` worker processes build the app from gptco on first access
+    if name == 'app':
+        import gptco
+        globals()['app'] = create_app(gptco.execute_agent_action, gptco.run_batch_item, gptco.ACTION_WORKERS,
+                                      gptco.AGENT_LOG_FILE)
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def run_in_thread(app: Starlette, port: int):
+    """Serves `app` with a single uvicorn worker in a background thread."""
+    import uvicorn
+    config = uvicorn.Config(app, port=port, log_level='error')
+    server = uvicorn.Server(config)
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+    return server_thread
+
+
+def serve(port: int, workers: int):
+    """Serves the ASGI app with the given number of worker processes (blocks)."""
+    import uvicorn
+    uvicorn.run('asgi_app:app', port=port, workers=workers, log_level='error')
+
+
+if __name__ == '__main__':
+    from gptco import SERVER_PORT, SERVER_WORKERS
+
+    parser = argparse.ArgumentParser(description="Serve the agent action API over ASGI.")
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS)
+    args = parser.parse_args()
+    serve(port=args.port, workers=args.workers)
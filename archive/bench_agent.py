@@ -0,0 +1,239 @@
+# End-to-end throughput benchmark for the agent loop.
+#
+# Record a fixture once against the live APIs, then replay it offline at full speed
+# (no network, no API spend) to measure turns/sec, p50/p99 latency per phase and
+# allocations for a single session, many concurrent sessions and handoff-heavy turns.
+#
+#   python bench_agent.py --mode record --fixture bench_fixture.jsonl
+#   python bench_agent.py --fixture bench_fixture.jsonl
+#   python bench_agent.py --fixture bench_fixture.jsonl --scenario many --sessions 16 --allocations
+#   python bench_agent.py --fixture bench_fixture.jsonl --speed 1.0   # replay at recorded API latency
+#
+# Turns run in a fresh temporary directory so memory databases and files written by
+# tools start empty in both modes. The scripted messages avoid tools that need a user
+# at the keyboard (screenshots, GUI automation).
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import contextlib
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SINGLE_SESSION_SCRIPT = [
+    "Hi, I'm interested in your product. What plans do you offer?",
+    "Can you list the files in the current directory?",
+    "Store my preferred plan as 'pro' please.",
+    "What did I say my preferred plan was?",
+]
+
+HANDOFF_SCRIPT = [
+    "I was charged twice, please transfer me to Customer Support Agent.",
+    "Actually this looks like a technical problem, transfer me to Technical Support Agent.",
+    "Thanks, please hand me back to Sales Agent so I can upgrade.",
+    "Transfer me to Customer Support Agent to confirm the refund.",
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+class PhaseTimer:
+    """
+    Collects raw span durations per phase and token usage per session while a scenario runs.
+    Only spans of the scenario's own sessions are counted; spans and usage attributed to any
+    other session are tallied separately, so cross-session leaks show up in the report.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self.tokens = {}
+        self.sessions = set()
+        self.foreign_spans = 0
+        self.foreign_tokens = 0
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def __call__(self, active, duration):
+        if not self.enabled:
+            return
+        with self._lock:
+            if active.attributes.get('session') in self.sessions:
+                self.samples.setdefault(active.name, []).append(duration)
+            else:
+                self.foreign_spans += 1
+
+    def record_usage(self, active, usage, model):
+        if not self.enabled:
+            return
+        read = (lambda field: usage.get(field)) if isinstance(usage, dict) else (lambda field: getattr(usage, field, None))
+        tokens = (read('prompt_tokens') or 0) + (read('completion_tokens') or 0)
+        session = active.attributes.get('session')
+        with self._lock:
+            if session in self.sessions:
+                self.tokens[session] = self.tokens.get(session, 0) + tokens
+            else:
+                self.foreign_tokens += tokens
+
+    def reset(self, sessions=()):
+        self.samples = {}
+        self.tokens = {}
+        self.sessions = set(sessions)
+        self.foreign_spans = 0
+        self.foreign_tokens = 0
+
+
+def wait_for_background(gptco, timeout=120.0):
+    """Waits until queued reflections have finished so every scenario ends in the same state."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        busy = sum(stats['queue_depth'] + stats['running'] for stats in gptco.scheduler.metrics().values())
+        if not busy:
+            return
+        time.sleep(0.05)
+
+
+def run_session(gptco, agent_name, script, turns, session_id):
+    agent = gptco.agents[agent_name]
+    conversation = gptco.conversations.get(session_id)
+    for index in range(turns):
+        conversation.append({"role": "user", "content": script[index % len(script)]})
+        response = gptco.run_full_turn(agent, conversation.window(), session_id=session_id, conversation=conversation)
+        agent = response.agent or agent
+    return turns
+
+
+def run_scenario(gptco, name, args, timer):
+    if name == 'single':
+        jobs = [("Sales Agent", SINGLE_SESSION_SCRIPT, f"{name}-0")]
+    elif name == 'many':
+        jobs = [("Sales Agent", SINGLE_SESSION_SCRIPT, f"{name}-{index}") for index in range(args.sessions)]
+    else:
+        jobs = [("Sales Agent", HANDOFF_SCRIPT, f"{name}-{index}") for index in range(max(1, args.sessions // 4))]
+
+    # Let the previous scenario's background work drain so it is not attributed to this one
+    wait_for_background(gptco)
+    timer.reset(session for _, _, session in jobs)
+    timer.enabled = True
+    if args.allocations:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        turns = sum(pool.map(lambda job: run_session(gptco, job[0], job[1], args.turns, job[2]), jobs))
+    wall = time.perf_counter() - started
+    timer.enabled = False
+
+    result = {
+        'scenario': name,
+        'sessions': len(jobs),
+        'turns': turns,
+        'wall_seconds': wall,
+        'turns_per_second': turns / wall if wall else 0.0,
+        'phases': {
+            phase: {'count': len(samples), 'p50': percentile(samples, 0.50), 'p99': percentile(samples, 0.99),
+                    'mean': statistics.fmean(samples)}
+            for phase, samples in sorted(timer.samples.items())
+        },
+        'tokens': sum(timer.tokens.values()),
+        'tokens_by_session': dict(sorted(timer.tokens.items())),
+        'foreign_spans': timer.foreign_spans,
+        'foreign_tokens': timer.foreign_tokens,
+    }
+    if args.allocations:
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        diff = after.compare_to(before, 'lineno')
+        allocated = sum(stat.size_diff for stat in diff if stat.size_diff > 0)
+        result['allocations'] = {
+            'peak_kib': peak / 1024,
+            'allocated_kib_per_turn': allocated / 1024 / max(turns, 1),
+            'top': [f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} +{stat.size_diff / 1024:.1f} KiB"
+                    for stat in diff[:5]],
+        }
+    wait_for_background(gptco)
+    return result
+
+
+def print_result(result):
+    print(f"\n== {result['scenario']}: {result['sessions']} session(s), {result['turns']} turns "
+          f"in {result['wall_seconds']:.2f}s -> {result['turns_per_second']:.2f} turns/sec")
+    print(f"  {'phase':<14}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for phase, stats in result['phases'].items():
+        print(f"  {phase:<14}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}"
+              f"{stats['mean'] * 1000:>10.1f}")
+    print(f"  tokens: {result['tokens']} across {len(result['tokens_by_session'])} session(s)")
+    if result['foreign_spans'] or result['foreign_tokens']:
+        print(f"  WARNING: {result['foreign_spans']} span(s) and {result['foreign_tokens']} token(s) "
+              f"were attributed to sessions outside this scenario")
+    if 'allocations' in result:
+        allocations = result['allocations']
+        print(f"  allocations: peak {allocations['peak_kib']:.0f} KiB, "
+              f"{allocations['allocated_kib_per_turn']:.1f} KiB/turn retained")
+        for line in allocations['top']:
+            print(f"    {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark run_full_turn against a recorded session fixture.")
+    parser.add_argument('--mode', choices=['replay', 'record'], default='replay')
+    parser.add_argument('--fixture', default='bench_fixture.jsonl')
+    parser.add_argument('--scenario', choices=['single', 'many', 'handoff', 'all'], default='all')
+    parser.add_argument('--turns', type=int, default=4, help="Turns per session")
+    parser.add_argument('--sessions', type=int, default=8, help="Concurrent sessions in the many-session scenario")
+    parser.add_argument('--speed', type=float, default=0.0, help="Replay at recorded latency divided by this (0 = full speed)")
+    parser.add_argument('--allocations', action='store_true', help="Trace allocations (slows the run down)")
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Keep the agents' console output")
+    args = parser.parse_args()
+
+    # Configure record/replay before gptco is imported; it installs the recorder at import time
+    fixture = os.path.abspath(args.fixture)
+    json_path = os.path.abspath(args.json) if args.json else None
+    os.environ['REPLAY_MODE'] = args.mode
+    os.environ['REPLAY_FIXTURE'] = fixture
+    os.environ['REPLAY_SPEED'] = str(args.speed)
+    if args.mode == 'replay':
+        os.environ.setdefault('OPENAI_API_KEY', 'replay-placeholder')
+    sys.path.insert(0, HERE)
+    os.chdir(tempfile.mkdtemp(prefix='gptco-bench-'))
+
+    import gptco
+    from telemetry import add_span_listener, add_usage_listener
+
+    timer = PhaseTimer()
+    add_span_listener(timer)
+    add_usage_listener(timer.record_usage)
+    scenarios = ['single', 'many', 'handoff'] if args.scenario == 'all' else [args.scenario]
+
+    results = []
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with output:
+        for name in scenarios:
+            results.append(run_scenario(gptco, name, args, timer))
+    for result in results:
+        print_result(result)
+
+    recorder = gptco.replay_recorder
+    if recorder is not None and recorder.mode == 'replay':
+        print(f"\nReplay fallbacks (requests served out of order): {recorder.fallbacks}")
+    elif recorder is not None:
+        recorder.close()
+        print(f"\nRecorded fixture: {fixture}")
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# Import-time benchmark for the entry points (gptco.py and chatgpt.py).
+#
+# Runs `python -X importtime -c "import <module>"` in fresh interpreters, reports the
+# cold-start time with a per-package breakdown, and fails (exit code 1) when a
+# median exceeds the budget or regresses past a recorded baseline, or when a
+# deferred subsystem is imported eagerly again.
+#
+#   python bench_startup.py                       # report for gptco and chatgpt
+#   python bench_startup.py --module chatgpt      # one module only
+#   python bench_startup.py --budget-ms 400       # fail above 400 ms
+#   python bench_startup.py --baseline startup_baseline.json --update-baseline
+#   python bench_startup.py --baseline startup_baseline.json --tolerance 0.2
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Subsystems that must only load on first use
+DEFERRED_MODULES = ['openai', 'faiss', 'numpy', 'pyautogui', 'flask', 'flask_limiter', 'flask_httpauth', 'smtplib',
+                    'pyttsx3', 'speech_recognition']
+ENTRY_POINTS = ['gptco', 'chatgpt']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr: str):
+    """Returns [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure_once(module: str):
+    env = dict(os.environ)
+    env.setdefault('OPENAI_API_KEY', 'benchmark-placeholder')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=HERE, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    total_us = next((cumulative for name, _, cumulative, _ in entries if name == module), 0)
+    return total_us / 1000.0, entries
+
+
+def top_level_breakdown(entries, limit: int):
+    """Cumulative time of the packages imported directly by the benchmarked module (depth 1)."""
+    packages = {}
+    for name, _, cumulative, depth in entries:
+        if depth == 1:
+            root = name.split('.')[0]
+            packages[root] = packages.get(root, 0) + cumulative
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    return [(name, us / 1000.0) for name, us in ranked[:limit]]
+
+
+def check_module(module: str, args, baselines: dict) -> list:
+    """Measures one module, prints its report and returns its failures; records its median in `baselines`."""
+    samples = []
+    entries = []
+    for _ in range(args.runs):
+        total_ms, entries = measure_once(module)
+        samples.append(total_ms)
+    median_ms = statistics.median(samples)
+
+    print(f"import {module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(samples):.1f} ms, max {max(samples):.1f} ms)")
+    print("Slowest direct imports (cumulative, last run):")
+    for name, ms in top_level_breakdown(entries, args.top):
+        print(f"  {name:<30} {ms:8.1f} ms")
+
+    failures = []
+    imported = {name.split('.')[0] for name, _, _, _ in entries}
+    eager = [name for name in DEFERRED_MODULES if name in imported]
+    if eager:
+        failures.append(f"{module}: deferred subsystems imported eagerly: {', '.join(eager)}")
+
+    if args.budget_ms and median_ms > args.budget_ms:
+        failures.append(f"{module}: median {median_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+
+    if args.update_baseline:
+        baselines[module] = median_ms
+    elif module in baselines:
+        limit = baselines[module] * (1 + args.tolerance)
+        print(f"Baseline {baselines[module]:.1f} ms, limit {limit:.1f} ms")
+        if median_ms > limit:
+            failures.append(f"{module}: median {median_ms:.1f} ms regressed past baseline limit {limit:.1f} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and regression-check the import time of the entry points.")
+    parser.add_argument('--module', action='append', dest='modules',
+                        help=f"Module to measure (repeatable; default {', '.join(ENTRY_POINTS)})")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '0')))
+    parser.add_argument('--baseline', help="JSON file holding the recorded median in ms per module")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed regression over the baseline")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    baselines = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if not args.baseline:
+        args.update_baseline = False
+
+    failures = []
+    for index, module in enumerate(args.modules or ENTRY_POINTS):
+        if index:
+            print()
+        failures.extend(check_module(module, args, baselines))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2)
+        print("Baseline updated: " + ", ".join(f"{module} {ms:.1f} ms" for module, ms in baselines.items()))
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,26 @@
 #outdated, see gptco.py
 
 import requests
-import openai
-import speech_recognition as sr
-import pyttsx3
-from flask import Flask, request, jsonify
 import logging
 import os
+import sys
+import time
+import base64
+import hashlib
 import threading
 import concurrent.futures
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-from flask_httpauth import HTTPTokenAuth
-
-# Initialize Flask application
-app = Flask(__name__)
-
-# Set up rate limiting
-limiter = Limiter(
-    get_remote_address,
-    app=app,
-    default_limits=["100 per hour"]
-)
-
-# Set up HTTP token authentication
-auth = HTTPTokenAuth(scheme='Bearer')
+from collections import OrderedDict
+from lazy_import import LazyModule
+from jobs import JobManager, register_job_routes
+from pipeline import Pipeline, Stage
+from usage_ledger import ledger
+from model_router import router
+from replay import install_from_env
+from structured_logging import configure_logging
+
+# The OpenAI SDK and Flask (with its rate limiter and token auth) load on first use, see get_app()
+openai = LazyModule('openai', on_load=lambda module: setattr(module, 'api_key', os.getenv('OPENAI_API_KEY')))
+flask = LazyModule('flask')
 
 # Authorized tokens (example)
 AUTHORIZED_TOKENS = {
@@ -32,125 +28,279 @@ AUTHORIZED_TOKENS = {
     "example_token_2": "user2"
 }
 
-@auth.verify_token
 def verify_token(token):
     return AUTHORIZED_TOKENS.get(token)
 
-# Set up OpenAI API key
-openai.api_key = os.getenv('OPENAI_API_KEY')
-
-# Set up logging for tracking events
-logging.basicConfig(filename='company_log.log', level=logging.INFO, format='%(asctime)s %(message)s')
-
-# Initialize speech recognition and text-to-speech
-recognizer = sr.Recognizer()
-tts_engine = pyttsx3.init()
+# Record or replay external calls for offline benchmarks (REPLAY_MODE=record|replay, see replay.py)
+install_from_env(sys.modules[__name__])
+
+# Log file for tracking events, configured when the service starts (see structured_logging.py)
+COMPANY_LOG_FILE = os.getenv('COMPANY_LOG_FILE', 'company_log.log')
+
+# Speech recognition and text-to-speech are initialized on first use
+_recognizer = None
+_tts_engine = None
+_voice_lock = threading.Lock()
+
+def get_recognizer():
+    global _recognizer
+    with _voice_lock:
+        if _recognizer is None:
+            import speech_recognition as sr
+            _recognizer = sr.Recognizer()
+        return _recognizer
+
+def get_tts_engine():
+    global _tts_engine
+    with _voice_lock:
+        if _tts_engine is None:
+            import pyttsx3
+            _tts_engine = pyttsx3.init()
+        return _tts_engine
 
 def speak_text(text):
+    tts_engine = get_tts_engine()
     tts_engine.say(text)
     tts_engine.runAndWait()
 
+# Round-table and web search configuration
+ROUND_TABLE_WORKERS = int(os.getenv('ROUND_TABLE_WORKERS', '8'))  # Roles answered at once across all requests
+ROUND_TABLE_DEADLINE = float(os.getenv('ROUND_TABLE_DEADLINE', '30'))  # Seconds per round
+LEDGER_SESSION = os.getenv('LEDGER_SESSION', 'chatgpt')  # Session name used for this service's usage records
+WEB_SEARCH_CACHE_TTL = float(os.getenv('WEB_SEARCH_CACHE_TTL', '600'))  # Seconds a search result is reused
+WEB_SEARCH_CACHE_SIZE = int(os.getenv('WEB_SEARCH_CACHE_SIZE', '256'))
+
+# Shared, bounded pool for role calls so concurrent requests cannot spawn unbounded threads
+round_table_executor = concurrent.futures.ThreadPoolExecutor(max_workers=ROUND_TABLE_WORKERS, thread_name_prefix='round-table')
+
+class TTLCache:
+    """Thread-safe cache whose entries expire after `ttl` seconds; oldest entries are evicted first."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+web_search_cache = TTLCache(WEB_SEARCH_CACHE_TTL, WEB_SEARCH_CACHE_SIZE)
+
 # Function to perform a web search
 def web_search(query):
+    cached = web_search_cache.get(query)
+    if cached is not None:
+        return cached
     headers = {
         "Ocp-Apim-Subscription-Key": os.getenv('BING_API_KEY')
     }
-    search_url = f"https://api.bing.microsoft.com/v7.0/search?q={query}"
+    search_url = "https://api.bing.microsoft.com/v7.0/search"
     try:
-        response = requests.get(search_url, headers=headers)
+        response = requests.get(search_url, headers=headers, params={"q": query}, timeout=10)
         response.raise_for_status()
         results = response.json()
         snippets = [entry['snippet'] for entry in results.get("webPages", {}).get("value", [])]
-        return "\n".join(snippets[:3])
+        result = "\n".join(snippets[:3])
+        web_search_cache.put(query, result)
+        return result
     except requests.RequestException as e:
         logging.error(f"Web search failed: {e}")
         return "No relevant web search results found."
 
-# Function for role-based GPT interaction
-def round_table_discussion(goal, roles):
-    discussions = {}
-    context = ""
-    lock = threading.Lock()
-
-    def get_role_input(role):
-        nonlocal context
-        search_query = f"{role} advice on achieving goal: {goal}"
-        web_context = web_search(search_query)
-
-        prompt = f"You are a {role} GPT. The current context is: '{context}'. The goal is: '{goal}'. Here is additional context from the web: '{web_context}'. Provide your input on how to achieve this goal."
-        response = openai.Completion.create(
-            engine="gpt-4o",
+def _completion(prompt, max_tokens, agent, task_class, phase='llm', ends_at=None):
+    """
+    Runs a completion on the model the router picks for `task_class` and records
+    its token usage in the ledger under the given role. With `ends_at` (a time.monotonic()
+    deadline) the time left is the request timeout, so a call nobody waits for ends with it.
+    """
+    def complete(model):
+        options = {}
+        if ends_at is not None:
+            options['timeout'] = max(ends_at - time.monotonic(), 0.1)
+        response = openai.completions.create(
+            model=model,
             prompt=prompt,
-            max_tokens=200
+            max_tokens=max_tokens,
+            **options
         )
-        response_text = response.choices[0].text.strip()
-        with lock:
-            discussions[role] = response_text
-            context += f"\n{role}: {response_text}"
+        ledger.record_usage(response.usage, model, phase=phase, session=LEDGER_SESSION, agent=agent)
+        return response
+
+    return router.call(task_class, complete).choices[0].text.strip()
+
+def _role_completion(prompt, role, ends_at):
+    return _completion(prompt, 200, f"{role} GPT", 'decision', phase='round_table', ends_at=ends_at)
+
+def _first_round_input(role, goal, cancel_event, ends_at):
+    if cancel_event.is_set():
+        return None
+    search_query = f"{role} advice on achieving goal: {goal}"
+    web_context = web_search(search_query)
+    if cancel_event.is_set():
+        return None
+    prompt = f"You are a {role} GPT. The goal is: '{goal}'. Here is additional context from the web: '{web_context}'. Provide your input on how to achieve this goal."
+    return _role_completion(prompt, role, ends_at)
+
+def _synthesis_input(role, goal, first_round, cancel_event, ends_at):
+    if cancel_event.is_set():
+        return None
+    context = "\n".join(f"{other}: {text}" for other, text in first_round.items())
+    prompt = f"You are a {role} GPT. The goal is: '{goal}'. The round table so far:\n{context}\nRefine your input on how to achieve this goal, taking the other roles into account."
+    return _role_completion(prompt, role, ends_at)
+
+def _run_round(roles, submit, deadline, cancel_event, on_event=None, round_name='first'):
+    """
+    Fans the roles out on the shared pool and collects whatever finishes before the deadline.
+    Roles still running at the deadline are cancelled and reported as missing.
+    """
+    futures = {submit(role): role for role in roles}
+    results = {}
+    try:
+        for future in concurrent.futures.as_completed(futures, timeout=deadline):
+            role = futures[future]
+            try:
+                response_text = future.result()
+            except Exception as e:
+                logging.error(f"{role} GPT failed in the {round_name} round: {e}")
+                continue
+            if response_text is None:
+                continue
+            results[role] = response_text
             logging.info(f"{role} GPT provided input: {response_text}")
+            if on_event:
+                on_event('role', {'round': round_name, 'role': role, 'text': response_text})
+    except concurrent.futures.TimeoutError:
+        missing = [role for future, role in futures.items() if not future.done()]
+        logging.warning(f"Round table {round_name} round hit its deadline; missing roles: {missing}")
+    finally:
+        # Early cancellation: queued roles never start, running roles skip their next call
+        cancel_event.set()
+        for future in futures:
+            future.cancel()
+    return results
+
+# Function for role-based GPT interaction
+def round_table_discussion(goal, roles, deadline=ROUND_TABLE_DEADLINE, synthesis=False, on_event=None):
+    """
+    Runs a round table in parallel. Every role answers independently in the first round,
+    so results do not depend on completion order. With `synthesis=True` a second round
+    lets each role refine its answer after seeing the whole first round.
+    Each round is bounded by `deadline` seconds; late roles are left out of the result,
+    and their model calls time out with the round so they do not hold a pool worker.
+    """
+    first_cancel = threading.Event()
+    first_ends_at = time.monotonic() + deadline
+    discussions = _run_round(
+        roles,
+        lambda role: round_table_executor.submit(_first_round_input, role, goal, first_cancel, first_ends_at),
+        deadline,
+        first_cancel,
+        on_event,
+        'first',
+    )
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(get_role_input, role) for role in roles]
-        concurrent.futures.wait(futures)
+    if synthesis and discussions:
+        synthesis_cancel = threading.Event()
+        first_round = dict(discussions)
+        synthesis_ends_at = time.monotonic() + deadline
+        refined = _run_round(
+            list(first_round),
+            lambda role: round_table_executor.submit(_synthesis_input, role, goal, first_round, synthesis_cancel,
+                                                     synthesis_ends_at),
+            deadline,
+            synthesis_cancel,
+            on_event,
+            'synthesis',
+        )
+        discussions.update(refined)
 
     return discussions
 
+# Leading bytes of the image formats the vision models accept
+IMAGE_SIGNATURES = ((b'\x89PNG', 'image/png'), (b'\xff\xd8\xff', 'image/jpeg'), (b'GIF8', 'image/gif'))
+
+def image_data_url(image):
+    """Data URL for a base64 image (or the data URL it already is), typed from the image's own bytes."""
+    if image.startswith('data:'):
+        return image
+    head = base64.b64decode(image[:16] + '=' * (-len(image[:16]) % 4))
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        mime = 'image/webp'
+    else:
+        mime = next((mime for signature, mime in IMAGE_SIGNATURES if head.startswith(signature)), None)
+    if mime is None:
+        raise ValueError("Unsupported image format; send a PNG, JPEG, GIF or WebP image.")
+    return f"data:{mime};base64,{image}"
+
+def _image_completion(prompt, image, max_tokens, agent, task_class, phase='llm'):
+    """Like _completion, for a prompt about a base64-encoded image (chat completion with the image attached)."""
+    url = image_data_url(image)
+
+    def complete(model):
+        response = openai.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": url}},
+            ]}],
+            max_tokens=max_tokens
+        )
+        ledger.record_usage(response.usage, model, phase=phase, session=LEDGER_SESSION, agent=agent)
+        return response
+
+    return router.call(task_class, complete).choices[0].message.content.strip()
+
+def image_digest(image):
+    """Hash of a base64 image (or '' without one): the vision stage is cached per goal and image."""
+    return hashlib.sha256(image.encode('utf-8')).hexdigest() if image else ''
+
 # Functions for different types of GPT inputs
-def vision_gpt(goal):
+def vision_gpt(goal, image=None):
     prompt = f"You are a vision GPT. You have received visual information related to the goal: '{goal}'. Describe the relevant visual context to support decision making."
-    response = openai.Completion.create(
-        engine="gpt-4o",
-        prompt=prompt,
-        max_tokens=100
-    )
-    return response.choices[0].text.strip()
+    # Vision is optional work: skip it once this service or the vision role is over budget
+    if not ledger.allow('vision', LEDGER_SESSION, 'vision GPT'):
+        return "No visual context available (usage budget exceeded)."
+    if image:
+        return _image_completion(prompt, image, 100, 'vision GPT', 'vision', phase='vision')
+    return _completion(prompt, 100, 'vision GPT', 'vision', phase='vision')
 
 def text_input_gpt(text_input):
     prompt = f"You are a text input GPT. You have received the following information: '{text_input}'. Send it to decision making."
-    response = openai.Completion.create(
-        engine="gpt-4o",
-        prompt=prompt,
-        max_tokens=100
-    )
-    return response.choices[0].text.strip()
+    return _completion(prompt, 100, 'text input GPT', 'extraction')
 
 def voice_input_gpt(voice_input_text):
     prompt = f"You are a voice input GPT. You have received the following spoken information: '{voice_input_text}'. Summarize and Send it to decision making."
-    response = openai.Completion.create(
-        engine="gpt-4o",
-        prompt=prompt,
-        max_tokens=100
-    )
-    return response.choices[0].text.strip()
+    return _completion(prompt, 100, 'voice input GPT', 'extraction')
 
 # Function for the central brain GPT to process inputs
 def brain_gpt(goal, vision_input, text_input, voice_input):
     prompt = f"You are the central brain GPT. The goal is: '{goal}'. Here is input from vision: '{vision_input}', text: '{text_input}', and voice: '{voice_input}'. Make a strategic decision based on this combined information."
-    response = openai.Completion.create(
-        engine="gpt-4o",
-        prompt=prompt,
-        max_tokens=300
-    )
-    return response.choices[0].text.strip()
-
-# Function to gather inputs and make a decision
-def gather_inputs_and_decide(goal, text_input, voice_input_text):
-    vision_input = vision_gpt(goal)
-    processed_text_input = text_input_gpt(text_input)
-    processed_voice_input = voice_input_gpt(voice_input_text)
-
-    decision = brain_gpt(goal, vision_input, processed_text_input, processed_voice_input)
-    logging.info(f"Brain GPT made a decision: {decision}")
+    return _completion(prompt, 300, 'brain GPT', 'decision')
 
+# Output coordinator: decides how the decision should be delivered
+def output_coordinator_gpt(decision):
     output_type_prompt = f"You are an output coordinator GPT. The decision is: '{decision}'. Should the output be delivered as text, voice, or a visual representation using DALL-E? Provide a reason for your choice."
-    output_response = openai.Completion.create(
-        engine="gpt-4o",
-        prompt=output_type_prompt,
-        max_tokens=100
-    )
-    output_decision = output_response.choices[0].text.strip().lower()
+    output_decision = _completion(output_type_prompt, 100, 'output coordinator GPT', 'classification').lower()
     logging.info(f"Output coordinator decided on output type: {output_decision}")
+    return output_decision
 
+def deliver_output(decision, output_decision):
     try:
         if "voice" in output_decision:
             speak_text(decision)
@@ -171,34 +321,119 @@ def gather_inputs_and_decide(goal, text_input, voice_input_text):
         output_result = "Failed to generate output."
 
     logging.info(f"Output result: {output_result}")
-
     return output_result
 
-# Flask routes to handle API requests
-@app.route('/gather_inputs_and_decide', methods=['POST'])
-@auth.login_required
-@limiter.limit("10 per minute")
+def _decide(goal, vision, text, voice):
+    decision = brain_gpt(goal, vision, text, voice)
+    logging.info(f"Brain GPT made a decision: {decision}")
+    return decision
+
+# Decision pipeline: vision, text and voice are independent and run concurrently,
+# so the critical path is one input call, the brain and the output coordinator.
+PIPELINE_RETRIES = int(os.getenv('PIPELINE_RETRIES', '1'))
+
+decision_pipeline = Pipeline([
+    # Keyed on the image's digest, so a new frame with the same goal is analyzed again
+    Stage('vision', lambda goal, image, image_digest: vision_gpt(goal, image), inputs=['goal', 'image', 'image_digest'],
+          retries=PIPELINE_RETRIES, cache=True, cache_inputs=['goal', 'image_digest']),
+    Stage('text', lambda text_input: text_input_gpt(text_input), inputs=['text_input'], retries=PIPELINE_RETRIES, cache=True),
+    Stage('voice', lambda voice_input_text: voice_input_gpt(voice_input_text), inputs=['voice_input_text'], retries=PIPELINE_RETRIES, cache=True),
+    Stage('decision', _decide, inputs=['goal', 'vision', 'text', 'voice'], retries=PIPELINE_RETRIES),
+    Stage('output_type', lambda decision: output_coordinator_gpt(decision), inputs=['decision'], retries=PIPELINE_RETRIES),
+    Stage('output', lambda decision, output_type: deliver_output(decision, output_type), inputs=['decision', 'output_type']),
+])
+
+# Function to gather inputs and make a decision
+def gather_inputs_and_decide(goal, text_input, voice_input_text, on_event=None, image=None):
+    result = decision_pipeline.run(
+        {'goal': goal, 'text_input': text_input, 'voice_input_text': voice_input_text,
+         'image': image, 'image_digest': image_digest(image)},
+        on_event=on_event,
+    )
+    return result['output']
+
+# Flask routes to handle API requests (registered in get_app)
 def api_gather_inputs_and_decide():
-    data = request.get_json()
+    data = flask.request.get_json()
     goal = data.get('goal')
     text_input = data.get('text_input', '')
     voice_input_text = data.get('voice_input_text', '')
+    image = data.get('image')  # Optional PNG, JPEG, GIF or WebP image or screen frame (base64 or data URL) for the vision stage
 
-    result = gather_inputs_and_decide(goal, text_input, voice_input_text)
+    result = gather_inputs_and_decide(goal, text_input, voice_input_text, image=image)
 
-    return jsonify({"result": result}), 200
+    return flask.jsonify({"result": result}), 200
 
-@app.route('/round_table', methods=['POST'])
-@auth.login_required
-@limiter.limit("10 per minute")
 def api_round_table():
-    data = request.get_json()
+    data = flask.request.get_json()
     goal = data.get('goal')
     roles = data.get('roles', ['Sales', 'Marketing', 'Finance'])
+    deadline = float(data.get('deadline', ROUND_TABLE_DEADLINE))
+    synthesis = bool(data.get('synthesis', False))
+
+    discussions = round_table_discussion(goal, roles, deadline=deadline, synthesis=synthesis)
+
+    return flask.jsonify({"round_table_discussion": discussions}), 200
+
+# Asynchronous job API: submit a pipeline, then poll or stream its progress
+job_manager = JobManager(max_workers=int(os.getenv('JOB_WORKERS', '4')))
+
+def gather_inputs_and_decide_job(payload, emit):
+    result = gather_inputs_and_decide(payload.get('goal'), payload.get('text_input', ''), payload.get('voice_input_text', ''),
+                                      on_event=emit, image=payload.get('image'))
+    return {"result": result}
+
+def round_table_job(payload, emit):
+    roles = payload.get('roles', ['Sales', 'Marketing', 'Finance'])
+    emit('stage', {'name': 'round_table', 'status': 'running', 'roles': roles})
+    discussions = round_table_discussion(
+        payload.get('goal'),
+        roles,
+        deadline=float(payload.get('deadline', ROUND_TABLE_DEADLINE)),
+        synthesis=bool(payload.get('synthesis', False)),
+        on_event=emit,
+    )
+    return {"round_table_discussion": discussions}
+
+_app = None
+_app_lock = threading.Lock()
+
+def get_app():
+    """Builds the Flask app on first use, so importing this module does not import Flask."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            from flask_limiter import Limiter
+            from flask_limiter.util import get_remote_address
+            from flask_httpauth import HTTPTokenAuth
+
+            app = flask.Flask(__name__)
+
+            # Set up rate limiting
+            limiter = Limiter(
+                get_remote_address,
+                app=app,
+                default_limits=["100 per hour"]
+            )
 
-    discussions = round_table_discussion(goal, roles)
-
-    return jsonify({"round_table_discussion": discussions}), 200
+            # Set up HTTP token authentication
+            auth = HTTPTokenAuth(scheme='Bearer')
+            auth.verify_token(verify_token)
+
+            for rule, view in (('/gather_inputs_and_decide', api_gather_inputs_and_decide), ('/round_table', api_round_table)):
+                app.add_url_rule(rule, view.__name__, auth.login_required(limiter.limit("10 per minute")(view)), methods=['POST'])
+            register_job_routes(
+                app,
+                job_manager,
+                {
+                    'gather_inputs_and_decide': gather_inputs_and_decide_job,
+                    'round_table': round_table_job,
+                },
+                decorate=lambda view: auth.login_required(view),
+            )
+            _app = app
+        return _app
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    configure_logging(COMPANY_LOG_FILE)
+    get_app().run(debug=True)
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from typing import Dict, List
+
+# Conversation store configuration (override in the .env file)
+CONVERSATION_DIR = os.getenv('CONVERSATION_DIR', 'conversations')
+CONVERSATION_WINDOW = int(os.getenv('CONVERSATION_WINDOW', '50'))  # Messages kept in memory and sent as context
+CONVERSATION_CACHE_SIZE = int(os.getenv('CONVERSATION_CACHE_SIZE', '256'))  # Open sessions kept per process
+CONVERSATION_FSYNC = os.getenv('CONVERSATION_FSYNC', 'false').lower() == 'true'  # fsync after every append
+
+_READ_BLOCK = 64 * 1024
+
+
+def _safe_name(session_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', session_id) or 'session'
+
+
+def read_tail(path: str, count: int) -> List[Dict]:
+    """Returns the last `count` JSONL records of a file, reading backwards so resume cost does not grow with history."""
+    if count <= 0 or not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= count:
+            step = min(_READ_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = [line for line in data.split(b'\n') if line.strip()]
+    records = []
+    for line in lines[-count:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # A torn last line from a crash mid-write is skipped
+            logging.warning(f"Skipping unreadable transcript line in {path}")
+    return records
+
+
+class Conversation:
+    """
+    One session's transcript: every message is appended to `<session>.jsonl` on disk, and the
+    most recent `window` messages are kept in a ring buffer that serves as the model's context.
+    Appending and reading the window cost O(new messages) and O(window), never O(history).
+    """
+
+    def __init__(self, session_id: str, directory: str = CONVERSATION_DIR, window: int = CONVERSATION_WINDOW):
+        self.session_id = session_id
+        base = os.path.join(directory, _safe_name(session_id))
+        self.path = base + '.jsonl'
+        self.meta_path = base + '.meta.json'
+        self.messages = deque(maxlen=window)
+        self.agent = None  # Agent that handled the last turn
+        self.total = 0  # Messages in the full transcript
+        self._file = None
+        self._lock = threading.Lock()
+        self._resume()
+
+    def _resume(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.agent = meta.get('agent')
+            self.total = meta.get('messages', 0)
+        self.messages.extend(read_tail(self.path, self.messages.maxlen))
+        self.total = max(self.total, len(self.messages))
+
+    def append(self, message: Dict):
+        self.extend([message])
+
+    def extend(self, messages: List[Dict]):
+        if not messages:
+            return
+        payload = ''.join(json.dumps(message, default=str) + "\n" for message in messages)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a')
+            self._file.write(payload)
+            self._file.flush()
+            if CONVERSATION_FSYNC:
+                os.fsync(self._file.fileno())
+            self.messages.extend(messages)
+            self.total += len(messages)
+
+    def window(self) -> List[Dict]:
+        """The most recent messages, oldest first, bounded by the window size."""
+        with self._lock:
+            return list(self.messages)
+
+    def set_agent(self, agent_name: str):
+        """Records which agent holds the session, so a resumed session continues with it."""
+        with self._lock:
+            self.agent = agent_name
+            meta = {'session_id': self.session_id, 'agent': agent_name, 'messages': self.total, 'updated': time.time()}
+            os.makedirs(os.path.dirname(self.meta_path) or '.', exist_ok=True)
+            temporary = self.meta_path + '.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(meta, f)
+            os.replace(temporary, self.meta_path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ConversationStore:
+    """Hands out one Conversation per session ID, resuming it from disk on first use (LRU-bounded)."""
+
+    def __init__(self, directory: str = CONVERSATION_DIR, window: int = CONVERSATION_WINDOW,
+                 cache_size: int = CONVERSATION_CACHE_SIZE):
+        self.directory = directory
+        self.window = window
+        self.cache_size = cache_size
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Conversation:
+        with self._lock:
+            conversation = self._open.get(session_id)
+            if conversation is not None:
+                self._open.move_to_end(session_id)
+                return conversation
+            conversation = Conversation(session_id, self.directory, self.window)
+            self._open[session_id] = conversation
+            while len(self._open) > self.cache_size:
+                _, evicted = self._open.popitem(last=False)
+                evicted.close()
+            return conversation
+
+    def exists(self, session_id: str) -> bool:
+        return os.path.exists(os.path.join(self.directory, _safe_name(session_id) + '.jsonl'))
+
+    def close(self):
+        with self._lock:
+            for conversation in self._open.values():
+                conversation.close()
+            self._open.clear()
+
+
+conversations = ConversationStore()
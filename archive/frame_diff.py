@@ -0,0 +1,95 @@
+import os
+from typing import Optional, Tuple
+from pydantic import BaseModel
+
+# Change-detection configuration for the screenshot loop (override in the .env file)
+FRAME_DIFF_BLOCK_SIZE = int(os.getenv('FRAME_DIFF_BLOCK_SIZE', '16'))  # Block size on the downsampled frame
+FRAME_DIFF_THRESHOLD = float(os.getenv('FRAME_DIFF_THRESHOLD', '6.0'))  # Mean abs grey-level delta per block
+FRAME_DIFF_SCALE = int(os.getenv('FRAME_DIFF_SCALE', '4'))  # Downsampling factor before comparing
+
+
+class FrameChange(BaseModel):
+    changed: bool
+    changed_ratio: float = 0.0  # Fraction of blocks that changed
+    bbox: Optional[Tuple[int, int, int, int]] = None  # (left, top, right, bottom) in full-resolution pixels
+
+
+class FrameDiffer:
+    """
+    Detects changes between consecutive screenshots with a NumPy block diff.
+    Frames are downsampled to greyscale, split into blocks, and a block counts as
+    changed when its mean absolute difference exceeds the threshold. The reference
+    frame only advances on a detected change, so slow drift still adds up.
+    """
+
+    def __init__(self, block_size: int = FRAME_DIFF_BLOCK_SIZE, threshold: float = FRAME_DIFF_THRESHOLD,
+                 scale: int = FRAME_DIFF_SCALE):
+        self.block_size = block_size
+        self.threshold = threshold
+        self.scale = max(1, scale)
+        self._reference = None
+        self._reference_size = None
+
+    def _downsample(self, image):
+        import numpy as np
+        width, height = image.size
+        small = image.convert('L').resize((max(1, width // self.scale), max(1, height // self.scale)))
+        return np.asarray(small, dtype=np.int16)
+
+    def reset(self):
+        self._reference = None
+        self._reference_size = None
+
+    def compare(self, image) -> FrameChange:
+        """Compares a PIL image against the reference frame."""
+        import numpy as np
+        frame = self._downsample(image)
+        if self._reference is None or self._reference_size != image.size:
+            self._reference = frame
+            self._reference_size = image.size
+            return FrameChange(changed=True, changed_ratio=1.0, bbox=None)
+
+        block = self.block_size
+        rows = -(-frame.shape[0] // block)
+        cols = -(-frame.shape[1] // block)
+        # Pad to whole blocks so edge regions are compared too
+        delta = np.zeros((rows * block, cols * block), dtype=np.float32)
+        delta[:frame.shape[0], :frame.shape[1]] = np.abs(frame - self._reference)
+        block_means = delta.reshape(rows, block, cols, block).mean(axis=(1, 3))
+        changed_blocks = block_means > self.threshold
+
+        if not changed_blocks.any():
+            return FrameChange(changed=False)
+
+        self._reference = frame
+        block_rows = np.flatnonzero(changed_blocks.any(axis=1))
+        block_cols = np.flatnonzero(changed_blocks.any(axis=0))
+        width, height = image.size
+        step = block * self.scale
+        bbox = (
+            int(block_cols[0] * step),
+            int(block_rows[0] * step),
+            int(min(width, (block_cols[-1] + 1) * step)),
+            int(min(height, (block_rows[-1] + 1) * step)),
+        )
+        return FrameChange(changed=True, changed_ratio=float(changed_blocks.mean()), bbox=bbox)
+
+
+class AdaptiveInterval:
+    """
+    Polling interval that backs off while the screen is idle and snaps back
+    to the minimum as soon as something changes.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, backoff: float = 1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.current = min_interval
+
+    def next(self, changed: bool) -> float:
+        if changed:
+            self.current = self.min_interval
+        else:
+            self.current = min(self.max_interval, self.current * self.backoff)
+        return self.current
@@ -1,45 +1,79 @@
 import os
 import json
 import time
+
+_startup_started = time.perf_counter()  # Cold-start measurement starts before the heavy imports
+
 import inspect
+import functools
 import logging
 import subprocess
 import requests
-import smtplib
 import sqlite3
-import base64
 import sys
+import threading
+import contextvars
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.mime.text import MIMEText
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Callable
 from pydantic import BaseModel
 from dotenv import load_dotenv
-import openai
-import faiss
-import numpy as np
 from colorama import init, Fore, Style
-import pyautogui
-from flask import Flask, request, jsonify
 
-# Initialize colorama
-init(autoreset=True)
-
-# Configure logging
-logging.basicConfig(filename='agent_logs.log', level=logging.INFO)
-
-# Load environment variables from .env file
+# Load environment variables from .env file (before the modules below read their settings)
 load_dotenv()
 
+from lazy_import import LazyModule
+from image_pipeline import EncodedImage, prepare_image, prepare_pil_image, get_cached_description, cache_description
+from frame_diff import FrameDiffer, AdaptiveInterval
+from jobs import JobCancelled, JobManager, register_job_routes
+from agent_registry import AgentSpec, AgentRegistry
+from scheduler import Scheduler, INTERACTIVE, TOOL_CONTINUATION, REFLECTION, BATCH, PRIORITY_NAMES
+from telemetry import span, current_span, usage_of, increment, register_gauges, render_prometheus, add_usage_listener
+from usage_ledger import ledger
+from model_router import router
+from replay import install_from_env
+from structured_logging import configure_logging, bound_payload
+from conversation_store import Conversation, conversations
+from shell_pool import CommandRejected, shell_pool
+from profiling import profiler
+from shared_memory import SHARED_MEMORY_VISIBILITY, SharedMemory
+from artifact_store import artifacts
+from turn_checkpoint import CHECKPOINT_ENABLED, TurnCheckpoint, current_idempotency_key, interrupted_turns
+from retrieval import (RETRIEVAL_ENABLED, RETRIEVAL_K, RETRIEVAL_TOKEN_BUDGET, RETRIEVAL_TIMEOUT, RETRIEVAL_WORKERS,
+                       latest_user_message, select_memories)
+
+# Log file used when gptco.py runs as the main program (see structured_logging.py)
+AGENT_LOG_FILE = os.getenv('AGENT_LOG_FILE', 'agent_logs.log')
+
 # Retrieve the OpenAI API key from environment variables
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
 if not OPENAI_API_KEY:
     raise ValueError("OpenAI API key not found. Please set it in the .env file.")
 
-# Set the OpenAI API key
-openai.api_key = OPENAI_API_KEY
+# Heavy subsystems are imported on first use: the OpenAI SDK, numpy, GUI automation,
+# SMTP and the HTTP server (shared_memory.py defers the vector index the same way)
+openai = LazyModule('openai', on_load=lambda module: setattr(module, 'api_key', OPENAI_API_KEY))
+np = LazyModule('numpy')
+pyautogui = LazyModule('pyautogui')
+smtplib = LazyModule('smtplib')
+flask = LazyModule('flask')
 
-# Global variable to keep track of the current agent
-current_agent = None
+# Record or replay external calls for offline benchmarks (REPLAY_MODE=record|replay, see replay.py)
+replay_recorder = install_from_env(sys.modules[__name__])
+
+# Agent and session of the turn running in this context (set by run_full_turn). Jobs run several
+# turns at once on different threads, so tools read these instead of module globals
+current_agent = contextvars.ContextVar('current_agent', default=None)
+current_session_id = contextvars.ContextVar('current_session_id', default='local')
+
+# Message bus used by Agent.communicate when agents run in separate worker processes (see agent_bus.py)
+message_bus = None
+
+# Shares LLM capacity between interactive turns, tool continuations, reflections and batch loops
+scheduler = Scheduler()
 
 # Email system simulation
 email_storage = {}  # Dictionary to store emails for each agent
@@ -117,21 +151,29 @@ def fetch_url(url: str):
         return str(e)
 
 # 3. Command Execution
+# Event hook of the turn running in this context, so tools can stream progress to the caller
+turn_events = contextvars.ContextVar('turn_events', default=None)
+
+def stream_tool_output(stream: str, text: str):
+    """Forwards a chunk of command output to the console and the turn's event hook as it arrives."""
+    print(Fore.MAGENTA + text, end='' if text.endswith("\n") else "\n")
+    agent = current_agent.get()
+    emit_event(turn_events.get(), 'tool_output', agent=agent.name if agent else None,
+               stream=stream, content=text)
+
 def execute_shell_command(command: str):
-    """Executes a shell command in a safe manner."""
-    # Define a list of allowed commands for safety
-    allowed_commands = ['ls', 'echo', 'pwd', 'whoami']
-    cmd = command.split()[0]
-    if cmd in allowed_commands:
-        try:
-            result = subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT, timeout=5)
-            return result.decode('utf-8')
-        except subprocess.CalledProcessError as e:
-            return f"Error: {e.output.decode('utf-8')}"
-        except Exception as e:
-            return str(e)
-    else:
-        return "Command not allowed for safety reasons."
+    """
+    Runs one command whose program is on the allowed list (by default ls, echo, pwd and whoami).
+    The command is not run by a shell: pipes (|), redirects (< >), chaining (; &) and substitution
+    (backticks, $(...)) are rejected unless quoted, and quoted they are passed on as plain text.
+    """
+    # Runs on the warm, restricted worker pool in shell_pool.py; the allow-list is SHELL_ALLOWED_COMMANDS
+    try:
+        return shell_pool.run(command, on_output=stream_tool_output).text()
+    except CommandRejected as e:
+        return str(e)
+    except TimeoutError as e:
+        return f"Error: {e}"
 
 # 4. Interacting with Applications
 def open_application(application_path: str):
@@ -159,11 +201,16 @@ def click_at(x: int, y: int):
 def send_real_email(recipient_email: str, subject: str, body: str):
     """Sends an actual email."""
     try:
-        sender_email = current_agent.email
+        sender_email = current_agent.get().email
         msg = MIMEText(body)
         msg['Subject'] = subject
         msg['From'] = sender_email
         msg['To'] = recipient_email
+        # Inside a checkpointed turn the Message-ID is derived from the call's idempotency key,
+        # so a retried send is recognizable as the same message downstream
+        idempotency_key = current_idempotency_key.get()
+        if idempotency_key:
+            msg['Message-ID'] = f"<{idempotency_key}@{sender_email.split('@')[-1]}>"
 
         # SMTP server configuration
         smtp_server = os.getenv('SMTP_SERVER')  # e.g., 'smtp.gmail.com'
@@ -221,6 +268,51 @@ def supervisor_retrieve_data(key: str):
     """Supervisor Agent retrieves data."""
     return retrieve_data(key)
 
+# 6b. Shared Organizational Memory
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '100'))  # Texts per embeddings request
+
+def embed_texts(texts: List[str], agent: Optional[str] = None, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """Embeds texts with one request per `batch_size` texts; returns a float32 matrix."""
+    embeddings = []
+    for start in range(0, len(texts), batch_size):
+        with span('embedding', agent=agent) as phase:
+            response = openai.embeddings.create(
+                input=texts[start:start + batch_size],
+                model=EMBEDDING_MODEL
+            )
+            phase.record_usage(usage_of(response), model=EMBEDDING_MODEL)
+        embeddings.extend(item['embedding'] for item in response['data'])
+    return np.array(embeddings, dtype=np.float32)
+
+# Long-term memory of all agents: each text is embedded and stored once, tagged with its owners
+shared_memory = SharedMemory(embed_texts)
+
+def search_company_memory(query: str):
+    """Searches the long-term memory of every agent at once and lists the closest entries per agent."""
+    agent = current_agent.get()
+    if agent is not None and agent.name not in shared_memory.read_all:
+        return "Company-wide memory search is not available to this agent."
+    try:
+        results = shared_memory.search_by_owner(query)
+    except Exception as e:
+        logging.error(f"Company memory search failed for query: {query}. Error: {str(e)}")
+        return str(e)
+    if not results:
+        return "No matching memories."
+    return "\n".join(f"{owner}:\n" + "\n".join(f"- {text}" for text in texts) for owner, texts in results.items())
+
+# 6c. Artifacts: large tool results are stored on disk and read back in pages
+def read_artifact(handle: str, page: int = 1):
+    """Reads one page of a stored tool result (artifact) by its handle."""
+    try:
+        result = artifacts.read(handle, page)
+    except (OSError, ValueError) as e:
+        return str(e)
+    if result is None:
+        return f"No artifact found for handle '{handle}'."
+    return f"[artifact {result['handle']} page {result['page']} of {result['pages']}]\n{result['content']}"
+
 # 7. Image Handling
 def upload_image(image_path: str):
     """
@@ -228,9 +320,7 @@ def upload_image(image_path: str):
     This allows the image to be included in prompts.
     """
     try:
-        with open(image_path, 'rb') as img_file:
-            encoded_string = base64.b64encode(img_file.read()).decode('utf-8')
-        return encoded_string
+        return prepare_image(image_path).base64
     except FileNotFoundError:
         return f"Image '{image_path}' not found."
     except Exception as e:
@@ -240,68 +330,89 @@ def include_image_in_prompt(image_path: str):
     """
     Encodes the image and returns a markdown image tag.
     """
-    encoded_image = upload_image(image_path)
-    if "not found" in encoded_image or "Error" in encoded_image:
-        return encoded_image
-    markdown_image = f"![Screenshot](data:image/jpeg;base64,{encoded_image})"
+    try:
+        encoded_image = prepare_image(image_path)
+    except FileNotFoundError:
+        return f"Image '{image_path}' not found."
+    except Exception as e:
+        return str(e)
+    markdown_image = f"![Screenshot]({encoded_image.data_url()})"
     return markdown_image
 
 # 8. Image Upload to GPT
-def upload_image_to_gpt(image_path: str):
+IMAGE_DESCRIPTION_PROMPT = "Describe the contents of this image."
+
+def describe_encoded_image(encoded_image: EncodedImage):
     """
-    Encodes an image to Base64 and uploads it to the GPT model to get a description.
+    Sends an already encoded image to the GPT model and returns the JSON response.
+    Responses are cached by image content hash, so an identical image is only analyzed once.
     """
-    import base64
-    import requests
+    cached = get_cached_description(encoded_image.digest, IMAGE_DESCRIPTION_PROMPT)
+    if cached is not None:
+        return cached
+
+    # Vision is optional work: skip it once the session or agent is over budget
+    agent = current_agent.get()
+    if not ledger.allow('vision', current_session_id.get(), agent.name if agent else ''):
+        return "Vision analysis skipped: usage budget exceeded."
 
     # OpenAI API Key (ensure it's set in the environment variables)
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         return "OpenAI API key not found in environment variables."
 
-    # Function to encode the image
-    def encode_image(image_path):
-        try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
-        except FileNotFoundError:
-            return f"Image '{image_path}' not found."
-        except Exception as e:
-            return str(e)
-
-    # Getting the base64 string
-    base64_image = encode_image(image_path)
-    if base64_image.startswith("Image") or "Error" in base64_image:
-        return base64_image  # Return the error message
-
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
 
     payload = {
-        "model": "gpt-4o",  # Corrected model name
+        "model": "gpt-4o",  # Replaced per call by the model router
         "messages": [
             {
                 "role": "user",
-                "content": "Describe the contents of this image.",
-            },
-            {
-                "role": "user",
-                "content": f"data:image/jpeg;base64,{base64_image}"
+                "content": [
+                    {"type": "text", "text": IMAGE_DESCRIPTION_PROMPT},
+                    {"type": "image_url", "image_url": {"url": encoded_image.data_url()}},
+                ],
             }
         ],
     }
 
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        response.raise_for_status()
-        return response.json()
+        with span('llm', purpose='vision') as phase:
+            def post(model):
+                response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers,
+                                         json=dict(payload, model=model))
+                response.raise_for_status()
+                body = response.json()
+                phase.record_usage(usage_of(body), model=model)
+                return body
+            result = router.call('vision', post)
     except requests.HTTPError as http_err:
         return f"HTTP error occurred: {http_err}"
     except Exception as err:
         return f"An error occurred: {err}"
 
+    cache_description(encoded_image.digest, IMAGE_DESCRIPTION_PROMPT, result)
+    return result
+
+def upload_image_to_gpt(image_path: str):
+    """
+    Encodes an image to Base64 and uploads it to the GPT model to get a description.
+    """
+    try:
+        encoded_image = prepare_image(image_path)
+    except FileNotFoundError:
+        return f"Image '{image_path}' not found."
+    except Exception as e:
+        return str(e)
+    logging.info(
+        f"Prepared image '{image_path}': {encoded_image.source_bytes} bytes -> "
+        f"{encoded_image.encoded_bytes} bytes ({encoded_image.width}x{encoded_image.height})"
+    )
+    return describe_encoded_image(encoded_image)
+
 # 9. Screenshot Function with Image Upload
 def take_screenshot_and_analyze():
     """
@@ -322,7 +433,7 @@ def take_screenshot_and_analyze():
                 # Assuming the description is needed to be returned
                 description = upload_response.get('choices', [{}])[0].get('message', {}).get('content', "No description available.")
                 # Add the image description to memory
-                current_agent.add_to_memory(f"Screenshot taken: {description}")
+                current_agent.get().add_to_memory(f"Screenshot taken: {description}")
                 return f"Screenshot taken and description added to memory."
             else:
                 # If an error occurred
@@ -395,50 +506,29 @@ class Agent(BaseModel):
     instructions: str  # Inference Prompt will be dynamically generated
     tools: List
     short_term_memory: List[str] = []  # Short-term memory
-    long_term_memory_index: Any = None  # FAISS index for long-term memory
-    long_term_memory_data: List[str] = []  # Data corresponding to the FAISS index
     reward: float = 0.0  # Accumulated reward
+    legacy_long_term_memory: List[str] = []  # From an older memory file; kept in it until shared_memory stores them
+    # Long-term memory lives in shared_memory, where this agent sees the entries it owns and public ones
 
-    def add_to_memory(self, content: str):
-        """Adds content to both short-term and long-term memory using embeddings."""
+    def add_to_memory(self, content: str, visibility: str = SHARED_MEMORY_VISIBILITY, readers: List[str] = ()):
+        """
+        Adds content to short-term memory and to the shared long-term memory. Text already stored
+        by any agent is not embedded again; this agent (and `readers`) are added as owners.
+        """
         self.short_term_memory.append(content)
         # Limit short-term memory to the last 100 entries
         if len(self.short_term_memory) > 100:
             self.short_term_memory = self.short_term_memory[-100:]
         # Error handling in case embedding retrieval fails
         try:
-            response = openai.embeddings.create(  # Corrected method name
-                input=content,
-                model="text-embedding-ada-002"
-            )
-            embedding = response['data'][0]['embedding']
-            embedding = np.array(embedding, dtype=np.float32)
+            shared_memory.add(content, owner=self.name, visibility=visibility, readers=readers)
         except Exception as e:
             logging.error(f"Failed to generate embedding for memory: {content}. Error: {str(e)}")
-            return
-
-        if self.long_term_memory_index is None:
-            self.long_term_memory_index = faiss.IndexFlatL2(len(embedding))
-            self.long_term_memory_data = []
-
-        self.long_term_memory_index.add(np.array([embedding]))
-        self.long_term_memory_data.append(content)
-
-    def retrieve_memory(self, query: str):
-        """Retrieves relevant memories using FAISS based on a query."""
-        if self.long_term_memory_index is None:
-            return []
 
+    def retrieve_memory(self, query: str, k: int = 5):
+        """Retrieves relevant memories this agent may read, using FAISS based on a query."""
         try:
-            response = openai.embeddings.create(  # Corrected method name
-                input=query,
-                model="text-embedding-ada-002"
-            )
-            embedding = response['data'][0]['embedding']
-            embedding = np.array(embedding, dtype=np.float32)
-            D, I = self.long_term_memory_index.search(np.array([embedding]), k=5)
-            results = [self.long_term_memory_data[i] for i in I[0] if i < len(self.long_term_memory_data)]
-            return results
+            return shared_memory.search(query, agent=self.name, k=k)
         except Exception as e:
             logging.error(f"Failed to retrieve memory for query: {query}. Error: {str(e)}")
             return []
@@ -447,6 +537,10 @@ class Agent(BaseModel):
         """
         Reflect on recent actions to improve future performance.
         """
+        with span('reflection', agent=self.name):
+            self._reflect()
+
+    def _reflect(self):
         recent_memories = self.short_term_memory[-5:]  # Get the last 5 memories
         reflection_prompt = (
             f"As {self.name}, reflect on your recent actions:\n"
@@ -454,10 +548,8 @@ class Agent(BaseModel):
             + "\nWhat can you learn to improve future actions?"
         )
 
-        response = openai.chat.completions.create(  # Corrected method name
-            model=self.model,
-            messages=[{"role": "system", "content": reflection_prompt}],
-        )
+        with span('llm', purpose='reflection') as phase:
+            response = router.call('reflection', lambda model: self._complete(phase, model, reflection_prompt))
 
         insights = response.choices[0].message.content
         print(Fore.BLUE + f"{self.name} reflection: {insights}")
@@ -469,14 +561,21 @@ class Agent(BaseModel):
             f"Based on your reflection, update your purpose prompt to better achieve your goals.\n"
             f"Current purpose prompt: {self.purpose_prompt}"
         )
-        response = openai.chat.completions.create(  # Corrected method name
-            model=self.model,
-            messages=[{"role": "system", "content": update_prompt}],
-        )
+        with span('llm', purpose='purpose_update') as phase:
+            response = router.call('reflection', lambda model: self._complete(phase, model, update_prompt))
         new_purpose_prompt = response.choices[0].message.content
         print(Fore.BLUE + f"{self.name} updated purpose prompt: {new_purpose_prompt}")
         self.purpose_prompt = new_purpose_prompt
 
+    @staticmethod
+    def _complete(phase, model: str, prompt: str):
+        response = openai.chat.completions.create(
+            model=model,
+            messages=[{"role": "system", "content": prompt}],
+        )
+        phase.record_usage(usage_of(response), model=model)
+        return response
+
     def adjust_behavior(self):
         """
         Adjust behavior based on accumulated rewards.
@@ -497,6 +596,10 @@ class Agent(BaseModel):
         """
         Send a message to another agent.
         """
+        if message_bus is not None:
+            # The recipient lives in another process; enqueue instead of blocking on its embedding call
+            message_bus.send_message(self.name, other_agent.name, message)
+            return
         other_agent.receive_message(self.name, message)
 
     def receive_message(self, sender_name: str, message: str):
@@ -504,53 +607,56 @@ class Agent(BaseModel):
         Receive a message from another agent.
         """
         print(Fore.CYAN + f"{self.name} received a message from {sender_name}: {message}")
-        # Process the message
-        self.add_to_memory(f"Message from {sender_name}: {message}")
+        # Process the message; stored once and readable by both sides of the conversation
+        self.add_to_memory(f"Message from {sender_name}: {message}", readers=[sender_name])
+
+def agent_memory_file(agent_name: str, replica: int = 1) -> str:
+    """Short-term memory file of an agent; further replicas of it (agent_bus.py) each get their own."""
+    base = agent_name.replace(' ', '_').lower()
+    return f"{base}_memory.json" if replica == 1 else f"{base}_memory.{replica}.json"
 
 # Function to save agent memory to a file
-def save_agent_memory(agent: Agent):
-    filename = f"{agent.name.replace(' ', '_').lower()}_memory.json"
+def save_agent_memory(agent: Agent, replica: int = 1):
+    filename = agent_memory_file(agent.name, replica)
+    # Long-term memory is persisted by shared_memory as it is written
     memory_data = {
         'short_term_memory': agent.short_term_memory,
-        'long_term_memory_data': agent.long_term_memory_data,
     }
-    with open(filename, 'w') as f:
-        json.dump(memory_data, f)
+    if agent.legacy_long_term_memory:
+        # Imported entries are embedded lazily; dropping them from the file before that would lose them
+        agent.legacy_long_term_memory = shared_memory.unstored(agent.legacy_long_term_memory, agent.name)
+        if agent.legacy_long_term_memory:
+            memory_data['long_term_memory_data'] = agent.legacy_long_term_memory
+    with span('save_memory', agent=agent.name):
+        with open(filename, 'w') as f:
+            json.dump(memory_data, f)
 
 # Function to load agent memory from a file
-def load_agent_memory(agent: Agent):
-    filename = f"{agent.name.replace(' ', '_').lower()}_memory.json"
+def load_agent_memory(agent: Agent, rebuild_index: bool = False, replica: int = 1):
+    """
+    Loads the agent's saved short-term memory. Long-term entries found in older memory files are
+    queued for the shared memory, which embeds the unseen ones in one batch on first memory use
+    (or now, when `rebuild_index` is set).
+    """
+    filename = agent_memory_file(agent.name, replica)
     try:
         with open(filename, 'r') as f:
             memory_data = json.load(f)
             agent.short_term_memory = memory_data.get('short_term_memory', [])
-            agent.long_term_memory_data = memory_data.get('long_term_memory_data', [])
-            # Rebuild the FAISS index
-            if agent.long_term_memory_data:
-                embeddings = []
-                for content in agent.long_term_memory_data:
-                    response = openai.embeddings.create(  # Corrected method name
-                        input=content,
-                        model="text-embedding-ada-002"
-                    )
-                    embedding = response['data'][0]['embedding']
-                    embeddings.append(embedding)
-                embeddings = np.array(embeddings, dtype=np.float32)
-                agent.long_term_memory_index = faiss.IndexFlatL2(len(embeddings[0]))
-                agent.long_term_memory_index.add(embeddings)
-            else:
-                agent.long_term_memory_index = None
+            agent.legacy_long_term_memory = memory_data.get('long_term_memory_data', [])
+            shared_memory.import_texts(agent.legacy_long_term_memory, agent.name)
     except FileNotFoundError:
         agent.short_term_memory = []
-        agent.long_term_memory_index = None
-        agent.long_term_memory_data = []
+        agent.legacy_long_term_memory = []
+    if rebuild_index:
+        shared_memory.load()
 
 # Email functions (existing)
 def send_email(recipient: str, subject: str, body: str):
     """
     Sends an email to the specified recipient.
     """
-    sender = current_agent.email
+    sender = current_agent.get().email
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
     email = {
@@ -574,13 +680,14 @@ def check_email():
     """
     Checks the agent's inbox for new emails.
     """
-    inbox = email_storage.get(current_agent.email, [])
+    agent = current_agent.get()
+    inbox = email_storage.get(agent.email, [])
     if not inbox:
         print(Fore.YELLOW + "Your inbox is empty.")
         return "Your inbox is empty."
 
     # Display emails
-    print(Fore.CYAN + f"Emails for {current_agent.name}:")
+    print(Fore.CYAN + f"Emails for {agent.name}:")
     for idx, email in enumerate(inbox, 1):
         print(Fore.MAGENTA + f"Email {idx}:")
         print(Fore.MAGENTA + f"From: {email['sender']}")
@@ -627,29 +734,28 @@ def transfer_to_agent(agent_name: str):
     """
     print(Fore.YELLOW + f"Transfer requested to {agent_name}.")
 
-    # Normalize agent names to lowercase without spaces for comparison
-    normalized_agents = {key.lower().replace(' ', ''): agents[key] for key in agents}
-    normalized_agent_name = agent_name.lower().replace(' ', '')
-
-    if normalized_agent_name in normalized_agents:
-        return normalized_agents[normalized_agent_name]
-    else:
+    agent = find_agent(agent_name)
+    if agent is None:
         print(Fore.RED + f"Agent '{agent_name}' not found.")
-        return None
+    return agent
+
+def find_agent(agent_name: str) -> Optional['Agent']:
+    """Looks up an agent by name, ignoring case and spaces."""
+    return agents.find(agent_name)
 
 # List Agents Function
 def list_agents():
     """
     Lists all available agents.
     """
-    available_agents = ', '.join(agents.keys())  # Join the list into a string
+    available_agents = ', '.join(agents.keys())  # Join the list into a string (does not build the agents)
     print(Fore.GREEN + f"Available agents: {available_agents}")
     return available_agents
 
-# Define agents with their Purpose Prompt, tools, and memory
+# Define agents declaratively with their Purpose Prompt and tools; they are built on first use
 
 # CEO Agent
-ceo_agent = Agent(
+ceo_agent_spec = AgentSpec(
     name="CEO Agent",
     email="ceo@company.com",
     purpose_prompt=(
@@ -660,7 +766,6 @@ ceo_agent = Agent(
         "to drive the company towards sustained growth and innovation. "
         "Your professionalism and mastery in leadership enable you to oversee and optimize every facet of the organization."
     ),
-    instructions="",  # Inference Prompt will be dynamically generated
     tools=[
         send_email,          # Communicate strategic decisions and updates
         check_email,         # Monitor incoming communications for critical information
@@ -680,12 +785,13 @@ ceo_agent = Agent(
         upload_image,        # Share visual reports and infographics
         include_image_in_prompt,  # Enhance communications with visual aids
         supervisor_store_data,    # Manage data storage with Supervisor Agent
-        supervisor_retrieve_data  # Access data managed by Supervisor Agent
+        supervisor_retrieve_data, # Access data managed by Supervisor Agent
+        search_company_memory     # Search what every agent has learned in one query
     ],
 )
 
 # Sales Agent
-sales_agent = Agent(
+sales_agent_spec = AgentSpec(
     name="Sales Agent",
     email="sales@company.com",
     purpose_prompt=(
@@ -695,7 +801,6 @@ sales_agent = Agent(
         "and close sales effectively. Your professionalism and in-depth knowledge of sales strategies enable you "
         "to drive the company's revenue growth and expand its market presence."
     ),
-    instructions="",  # Inference Prompt will be dynamically generated
     tools=[
         process_sale,        # Execute and record sales transactions
         send_email,          # Communicate with leads and clients
@@ -719,7 +824,7 @@ sales_agent = Agent(
 )
 
 # Customer Support Agent
-customer_support_agent = Agent(
+customer_support_agent_spec = AgentSpec(
     name="Customer Support Agent",
     email="support@company.com",
     purpose_prompt=(
@@ -728,7 +833,6 @@ customer_support_agent = Agent(
         "Utilizing your extensive toolset, you efficiently handle support tickets, process refunds, and escalate issues when necessary. "
         "Your professionalism and deep understanding of customer service best practices enable you to enhance the company's reputation and customer loyalty."
     ),
-    instructions="",  # Inference Prompt will be dynamically generated
     tools=[
         handle_customer_inquiry,  # Address and resolve customer questions and issues
         execute_refund,           # Process refund requests efficiently
@@ -753,7 +857,7 @@ customer_support_agent = Agent(
 )
 
 # Technical Support Agent
-technical_support_agent = Agent(
+technical_support_agent_spec = AgentSpec(
     name="Technical Support Agent",
     email="techsupport@company.com",
     purpose_prompt=(
@@ -764,7 +868,6 @@ technical_support_agent = Agent(
         "Your professionalism and deep technical knowledge ensure that customers receive prompt and effective support, "
         "maintaining the company's operational excellence and customer satisfaction."
     ),
-    instructions="",  # Inference Prompt will be dynamically generated
     tools=[
         take_screenshot_and_analyze,  # Capture and analyze system screenshots for diagnostics
         escalate_to_human,            # Escalate unresolved technical issues to human experts
@@ -790,7 +893,7 @@ technical_support_agent = Agent(
 )
 
 # Supervisor Agent
-supervisor_agent = Agent(
+supervisor_agent_spec = AgentSpec(
     name="Supervisor Agent",
     email="supervisor@company.com",
     purpose_prompt=(
@@ -801,7 +904,6 @@ supervisor_agent = Agent(
         "and ensure that all operations run smoothly and efficiently. "
         "Your professionalism and comprehensive knowledge empower you to maintain organizational excellence and drive the company's success."
     ),
-    instructions="",  # Inference Prompt will be dynamically generated
     tools=[
         send_email,                  # Communicate with all agents and external stakeholders
         check_email,                 # Monitor communications for oversight and coordination
@@ -822,44 +924,57 @@ supervisor_agent = Agent(
         upload_image,                # Share organizational charts and strategic visuals
         include_image_in_prompt,     # Enhance supervisory communications with visual aids
         supervisor_store_data,       # Manage data storage specifically for supervisory purposes
-        supervisor_retrieve_data     # Access data managed by Supervisor Agent for oversight
+        supervisor_retrieve_data,    # Access data managed by Supervisor Agent for oversight
+        search_company_memory        # Search what every agent has learned in one query
     ],
 )
 
 # Aggregate all agents
-agents = {
-    "CEO Agent": ceo_agent,
-    "Sales Agent": sales_agent,
-    "Customer Support Agent": customer_support_agent,
-    "Technical Support Agent": technical_support_agent,
-    "Supervisor Agent": supervisor_agent,
-}
-
-# Add list_agents to each agent's tools
-for agent in agents.values():
-    agent.tools.append(list_agents)
+AGENT_SPECS = [
+    ceo_agent_spec,
+    sales_agent_spec,
+    customer_support_agent_spec,
+    technical_support_agent_spec,
+    supervisor_agent_spec,
+]
+
+def materialize_agent(spec: AgentSpec) -> Agent:
+    """Builds an agent from its spec and loads its memory (long-term memory is loaded on first use)."""
+    agent = Agent(
+        name=spec.name,
+        email=spec.email,
+        purpose_prompt=spec.purpose_prompt,
+        instructions="",  # Inference Prompt will be dynamically generated
+        tools=spec.tools + [list_agents, read_artifact],  # Add list_agents and read_artifact to each agent's tools
+    )
+    load_agent_memory(agent)
+    return agent
 
+agents = AgentRegistry(AGENT_SPECS, materialize_agent)
 
-# Load memory for each agent
-for agent in agents.values():
-    load_agent_memory(agent)
+# Structures reported after every turn when memory tracking is on (MEMORY_TRACKING, see profiling.py)
+profiler.memory.watch('short_term_memory', lambda: sum(len(a.short_term_memory) for a in agents.materialized().values()))
+profiler.memory.watch('shared_memory_entries', lambda: len(shared_memory))
+profiler.memory.watch('email_storage', lambda: sum(len(inbox) for inbox in list(email_storage.values())))
 
-def execute_tool_call(tool_call, tools_map, agent_name, messages):
-    global current_agent
+def execute_tool_call(tool_call, tools_map, agent_name, messages, checkpoint: Optional[TurnCheckpoint] = None):
     name = tool_call.name  # Use attribute access
     args = json.loads(tool_call.arguments) if tool_call.arguments else {}
     print(Fore.MAGENTA + f"{agent_name} is executing action: {name}({args})")
-    if name in tools_map:
-        result = tools_map[name](**args)
-    else:
-        result = f"Tool '{name}' not found."
 
-    # Log the action
-    logging.info(f"{agent_name} executed {name} with arguments {args} and result: {result}")
+    def call():
+        if name in tools_map:
+            return tools_map[name](**args)
+        return f"Tool '{name}' not found."
 
-    # Agent reflects on the action
-    reflection = f"Executed {name} with arguments {args} and result: {result}"
-    current_agent.add_to_memory(reflection)
+    with span('tool', agent=agent_name, tool=name):
+        # In a checkpointed turn a call completed before a crash returns its recorded result instead of running again
+        result = checkpoint.run_tool(name, tool_call.arguments, call) if checkpoint is not None else call()
+        replayed = checkpoint is not None and checkpoint.replaying
+
+    # Log the action; large arguments and results are truncated or hashed (LOG_PAYLOAD_MODE)
+    logging.info(f"{agent_name} executed {name}",
+                 extra={'agent': agent_name, 'tool': name, 'arguments': bound_payload(args), 'result': bound_payload(result)})
 
     # Handle specific tool responses
     if name == "upload_image_to_gpt":
@@ -873,10 +988,23 @@ def execute_tool_call(tool_call, tools_map, agent_name, messages):
         else:
             tool_content = result  # Error message or other string
 
+    elif isinstance(result, Agent):
+        tool_content = f"Transferred to {result.name}."
+
     else:
         # Ensure tool_content is a string
         tool_content = str(result) if result is not None else "Action failed."
 
+    # Large results (web pages, files, base64 images) are stored as artifacts: the prompt and the
+    # memory get a handle and a short summary, and read_artifact pages through the rest
+    if name != 'read_artifact':
+        tool_content = artifacts.offload(tool_content, name)
+
+    # Agent reflects on the action (a replayed call was already reflected on before the crash)
+    if not replayed:
+        reflection = f"Executed {name} with arguments {args} and result: {tool_content}"
+        current_agent.get().add_to_memory(reflection)
+
     result_message = {
         "role": "function",
         "name": tool_call.name,
@@ -895,6 +1023,7 @@ def execute_tool_call(tool_call, tools_map, agent_name, messages):
 class Response(BaseModel):
     agent: Optional[Agent]
     messages: List[Dict]
+    time_to_first_token: Optional[float] = None  # Seconds until the first streamed token of the turn
 
 # Helper function to trim messages
 def trim_messages(messages: List[Dict], max_messages: int = 50) -> List[Dict]:
@@ -926,14 +1055,19 @@ def summarize_messages(messages: List[Dict], summary_length: int = 5) -> List[Di
     
     # Get the summary from the model
     try:
-        summary_response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes conversations."},
-                {"role": "user", "content": summary_prompt}
-            ],
-            max_tokens=500,  # Adjust based on desired summary length
-        )
+        with span('llm', purpose='summarization') as phase:
+            def summarize(model):
+                response = openai.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant that summarizes conversations."},
+                        {"role": "user", "content": summary_prompt}
+                    ],
+                    max_tokens=500,  # Adjust based on desired summary length
+                )
+                phase.record_usage(usage_of(response), model=model)
+                return response
+            summary_response = router.call('summarization', summarize)
         summary = summary_response.choices[0].message.content.strip()
         
         # Create a summarized message
@@ -951,24 +1085,158 @@ def summarize_messages(messages: List[Dict], summary_length: int = 5) -> List[Di
         return messages
 
 # The main function to run the interaction loop
-def run_full_turn(agent: Agent, messages: List[Dict]) -> Response:
-    global current_agent
-    current_agent = agent
-    num_init_messages = len(messages)
-    messages = messages.copy()
+def emit_event(on_event: Optional[Callable], event_type: str, **data):
+    """Forwards a turn progress event (message, tool_call, tool_output, tool_result, handoff) to the caller's hook."""
+    if on_event is not None:
+        on_event(event_type, data)
 
-    # Include agent's memory in the system prompt
-    if agent.short_term_memory:
-        memory_prompt = "\n".join([f"- {entry}" for entry in agent.short_term_memory[-5:]])
-        messages.insert(1, {"role": "system", "content": f"Your memory:\n{memory_prompt}"})
+STREAM_RESPONSES = os.getenv('STREAM_RESPONSES', 'true').lower() == 'true'
 
-    # Trim or summarize messages to prevent exceeding context length
-    if len(messages) > 100:  # Define a threshold based on testing
-        messages = summarize_messages(messages, summary_length=5)  # Summarize older messages
-    else:
-        messages = trim_messages(messages, max_messages=50)  # Trim to the last 50 messages
+def _close_stream(stream):
+    close = getattr(stream, 'close', None)
+    if close:
+        close()
+
+def _drain_usage(stream, phase, model: str):
+    """Consumes the tail of a stream to record its token usage."""
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                phase.record_usage(usage_of(chunk), model=model)
+    except Exception as e:
+        logging.error(f"Failed to read stream usage. Error: {str(e)}")
+    finally:
+        _close_stream(stream)
+
+def stream_chat_completion(agent: Agent, messages: List[Dict], tool_schemas: List[Dict], on_event: Optional[Callable] = None,
+                           model: Optional[str] = None):
+    """
+    Streams a chat completion, printing and forwarding content chunks as they arrive.
+    Function-call arguments are assembled incrementally. Once the model finishes, only the
+    usage chunk is read before returning, so the tool is dispatched without waiting for the stream to close.
+    Returns the assembled message and the time to first token in seconds.
+    """
+    started = time.perf_counter()
+    time_to_first_token = None
+    content_parts = []
+    call_name = ''
+    call_arguments = []
+
+    model = model or agent.model
+    phase = current_span()
+    stream = openai.chat.completions.create(
+        model=model,
+        messages=messages,
+        functions=tool_schemas,
+        function_call="auto",
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    finished = False
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                if phase is not None:
+                    phase.record_usage(usage_of(chunk), model=model)
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if time_to_first_token is None and (delta.content or delta.function_call):
+                time_to_first_token = time.perf_counter() - started
+            if delta.content:
+                if not content_parts:
+                    print(Fore.CYAN + f"{agent.name}: " + Style.RESET_ALL, end='', flush=True)
+                print(delta.content, end='', flush=True)
+                content_parts.append(delta.content)
+                emit_event(on_event, 'token', agent=agent.name, content=delta.content)
+            if delta.function_call:
+                call_name += delta.function_call.name or ''
+                if delta.function_call.arguments:
+                    call_arguments.append(delta.function_call.arguments)
+            if choice.finish_reason:
+                finished = True
+                break  # Arguments are complete; only the usage chunk is left
+    finally:
+        if finished and phase is not None:
+            # Read inline: the caller closes the llm span right after we return, and the usage belongs on it
+            _drain_usage(stream, phase, model)
+        else:
+            _close_stream(stream)
+
+    if content_parts:
+        print()
+    total = time.perf_counter() - started
+    logging.info(
+        f"{agent.name} completion streamed: time_to_first_token="
+        f"{time_to_first_token if time_to_first_token is not None else total:.3f}s total={total:.3f}s"
+    )
+
+    function_call = SimpleNamespace(name=call_name, arguments=''.join(call_arguments)) if call_name else None
+    message = SimpleNamespace(content=''.join(content_parts) or None, function_call=function_call)
+    return message, time_to_first_token
 
-    # Construct the Inference Prompt
+def reflect_and_save(agent: Agent, session_id: str = 'local'):
+    """Background consolidation after a turn or tool call: reflect, adjust and persist memory."""
+    # Reflection is optional work: over-budget sessions and agents only persist memory
+    if ledger.allow('reflection', session_id, agent.name):
+        agent.self_reflect()
+    agent.adjust_behavior()
+    save_agent_memory(agent)
+
+def schedule_reflection(agent: Agent, session_id: str = 'local', tenant: str = 'default'):
+    """Queues reflect_and_save at reflection priority so it never delays interactive turns."""
+    future = scheduler.submit(reflect_and_save, agent, session_id, priority=REFLECTION, session=session_id, tenant=tenant)
+
+    def log_failure(done):
+        if done.exception() is not None:
+            logging.error(f"Reflection for {agent.name} failed. Error: {str(done.exception())}")
+
+    future.add_done_callback(log_failure)
+    return future
+
+# Memory retrieval runs next to prompt assembly, so its embedding round trip overlaps the other work
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix='memory-retrieval')
+
+def prefetch_memories(agent: Agent, messages: List[Dict]):
+    """Starts retrieve_memory for the latest user message; returns a Future or None."""
+    query = latest_user_message(messages)
+    if not RETRIEVAL_ENABLED or not query or shared_memory.empty():
+        return None
+
+    def retrieve():
+        with span('retrieval', agent=agent.name):
+            return agent.retrieve_memory(query, k=RETRIEVAL_K)
+
+    # Runs in a copy of the caller's context so the retrieval span joins the turn's trace
+    return retrieval_executor.submit(contextvars.copy_context().run, retrieve)
+
+def retrieved_memory_message(agent: Agent, pending, context: List[Dict]) -> Optional[Dict]:
+    """Waits briefly for prefetched memories and returns a system message with the new ones, if any."""
+    if pending is None:
+        return None
+    try:
+        candidates = pending.result(timeout=RETRIEVAL_TIMEOUT)
+    except Exception as e:
+        # A slow or failed lookup must not hold up the turn
+        pending.cancel()
+        increment('gptco_retrieval_timeouts_total', agent=agent.name)
+        logging.warning(f"Memory retrieval for {agent.name} skipped: {type(e).__name__} {str(e)}")
+        return None
+    in_context = agent.short_term_memory[-5:] + [message.get('content') or '' for message in context]
+    selected = select_memories(candidates, in_context, RETRIEVAL_TOKEN_BUDGET, agent=agent.name)
+    if not selected:
+        return None
+    return {"role": "system", "content": "Relevant memories:\n" + "\n".join(f"- {entry}" for entry in selected)}
+
+MAX_HANDOFFS_PER_TURN = int(os.getenv('MAX_HANDOFFS_PER_TURN', '3'))  # Handoffs continued inside one turn before it ends
+
+@functools.lru_cache(maxsize=64)
+def tool_schemas_for(tools: tuple):
+    """Function schemas and the name -> tool map for a tool list, built once per distinct list."""
+    return [function_to_schema(tool) for tool in tools], {tool.__name__: tool for tool in tools}
+
+def build_instructions(agent: Agent) -> str:
+    """The agent's system prompt: its Purpose Prompt plus the Inference Prompt over its own tools."""
     available_tools = [tool.__name__ for tool in agent.tools]
     next_action = agent.purpose_prompt.split('Your primary goal is to ')[-1]
     inference_prompt = (
@@ -976,146 +1244,588 @@ def run_full_turn(agent: Agent, messages: List[Dict]) -> Response:
         f"Based on your next action, which is '{next_action}', "
         f"determine the best tool to execute. Provide a brief rationale for your choice."
     )
+    return f"{agent.purpose_prompt}\n\n{inference_prompt}"
 
-    # Set the agent's instructions to include both the Purpose Prompt and Inference Prompt
-    agent_instructions = f"{agent.purpose_prompt}\n\n{inference_prompt}"
+def build_prompt_header(agent: Agent, pending_memories, context: List[Dict]) -> List[Dict]:
+    """System messages that open the prompt: instructions, short-term memory and retrieved memories."""
+    header = [{"role": "system", "content": build_instructions(agent)}]
+    if agent.short_term_memory:
+        # Include agent's memory in the system prompt
+        memory_prompt = "\n".join([f"- {entry}" for entry in agent.short_term_memory[-5:]])
+        header.append({"role": "system", "content": f"Your memory:\n{memory_prompt}"})
+    retrieved = retrieved_memory_message(agent, pending_memories, context)
+    if retrieved is not None:
+        header.append(retrieved)
+    return header
 
-    while True:
-        # Convert tools to schemas
-        tool_schemas = [function_to_schema(tool) for tool in current_agent.tools]
-        tools_map = {tool.__name__: tool for tool in current_agent.tools}
+def prefetch_handoff(function_call, context: List[Dict]):
+    """
+    Starts warming the target of a transfer_to_agent call while the call itself runs: the agent is
+    built (memory loaded), its tool schemas cached and its memory lookup started.
+    Returns a Future of (agent, pending memories) or None.
+    """
+    try:
+        target_name = json.loads(function_call.arguments or '{}').get('agent_name')
+    except (ValueError, AttributeError):
+        return None
+    if not target_name:
+        return None
 
-        # Get the agent's response
-        try:
-            response = openai.chat.completions.create(
-                model=current_agent.model,  # Use the updated model
-                messages=[{"role": "system", "content": agent_instructions}] + messages,
-                functions=tool_schemas,
-                function_call="auto",
-            )
-        except Exception as e:
-            print(Fore.RED + "An error occurred while communicating with the OpenAI API.")
-            print(f"Error: {str(e)}")
-            return Response(agent=current_agent, messages=messages)
+    def warm():
+        with span('handoff_prefetch', target=target_name):
+            target = find_agent(target_name)
+            if target is None:
+                return None
+            tool_schemas_for(tuple(target.tools))
+            return target, prefetch_memories(target, context)
+
+    return retrieval_executor.submit(contextvars.copy_context().run, warm)
+
+def run_full_turn(agent: Agent, messages: List[Dict], on_event: Optional[Callable] = None,
+                  stream: bool = STREAM_RESPONSES, session_id: str = 'local', tenant: str = 'default',
+                  conversation: Optional[Conversation] = None, checkpoint: Optional[TurnCheckpoint] = None) -> Response:
+    """
+    Runs one turn. `messages` is the context (e.g. `conversation.window()`); the messages produced
+    by the turn are returned and, when a conversation is given, appended to its transcript as they happen.
+    Turns on a conversation are checkpointed step by step; pass a recovered `checkpoint` to resume one.
+    """
+    if checkpoint is None and CHECKPOINT_ENABLED and conversation is not None:
+        checkpoint = TurnCheckpoint(session_id)
+    if checkpoint is not None:
+        checkpoint.start(agent.name, messages, tenant)
+    events_token = turn_events.set(on_event)
+    agent_token = current_agent.set(agent)
+    session_token = current_session_id.set(session_id)
+    try:
+        # Profiled when the session is listed or sampled (see profiling.py and /admin/profiles)
+        with profiler.turn(session_id, agent.name), span('turn', agent=agent.name, session=session_id):
+            response = _run_full_turn(agent, messages, on_event, stream, session_id, tenant, conversation, checkpoint)
+    except Exception:
+        # The failure was reported to the caller; only an interrupted process leaves its log for a resume
+        if checkpoint is not None:
+            checkpoint.finish()
+        raise
+    finally:
+        current_session_id.reset(session_token)
+        current_agent.reset(agent_token)
+        turn_events.reset(events_token)
+    if checkpoint is not None:
+        checkpoint.finish()
+    return response
+
+def _run_full_turn(agent: Agent, messages: List[Dict], on_event: Optional[Callable], stream: bool,
+                   session_id: str, tenant: str, conversation: Optional[Conversation],
+                   checkpoint: Optional[TurnCheckpoint]) -> Response:
+    time_to_first_token = None
+
+    # Look up relevant long-term memories while the rest of the prompt is assembled
+    pending_memories = prefetch_memories(agent, messages)
+
+    # Trim or summarize messages to prevent exceeding context length
+    if len(messages) > 100 and ledger.allow('summarization', session_id, agent.name):  # Define a threshold based on testing
+        context = summarize_messages(messages, summary_length=5)  # Summarize older messages
+    else:
+        context = trim_messages(messages, max_messages=50)  # Trim to the last 50 messages
+
+    # The prompt is assembled once per turn and new messages are appended to it in place,
+    # so each model call costs O(new messages) instead of copying the whole history
+    prompt_messages = build_prompt_header(agent, pending_memories, context)
+    header_size = len(prompt_messages)
+    prompt_messages.extend(context)
+    turn_start = len(prompt_messages)
+    # A resumed turn skips the messages that reached the transcript before the interruption
+    persisted = turn_start + (checkpoint.persisted if checkpoint is not None else 0)
+
+    def persist():
+        # Append only what this turn added since the last call to the session transcript
+        nonlocal persisted
+        if len(prompt_messages) <= persisted:
+            return
+        if conversation is not None:
+            conversation.extend(prompt_messages[persisted:])
+        persisted = len(prompt_messages)
+        if checkpoint is not None:
+            checkpoint.record_persisted(persisted - turn_start)
+
+    llm_calls = 0
+    handoffs = 0
+    while True:
+        persist()
+        # Convert tools to schemas (cached per tool list)
+        tool_schemas, tools_map = tool_schemas_for(tuple(agent.tools))
+
+        # Get the agent's response; the first call of a turn is interactive, later ones continue after a tool
+        priority = INTERACTIVE if not llm_calls else TOOL_CONTINUATION
+        llm_calls += 1
+        # A step completed before an interruption is replayed from the checkpoint instead of calling the model
+        message = checkpoint.next_model_step(agent.name) if checkpoint is not None else None
+        replayed = message is not None
+        if not replayed:
+            try:
+                with span('llm', agent=agent.name, priority=PRIORITY_NAMES[priority]) as phase:
+                    if stream:
+                        message, first_token = scheduler.run(
+                            router.call,
+                            'decision',
+                            lambda model: stream_chat_completion(agent, prompt_messages, tool_schemas, on_event, model),
+                            preferred=agent.model,  # The agent's configured model leads, others are fallbacks
+                            priority=priority, session=session_id, tenant=tenant,
+                        )
+                        if time_to_first_token is None:
+                            time_to_first_token = first_token
+                        if first_token is not None:
+                            phase.set_attribute('time_to_first_token', first_token)
+                    else:
+                        def complete(model):
+                            response = openai.chat.completions.create(
+                                model=model,
+                                messages=prompt_messages,
+                                functions=tool_schemas,
+                                function_call="auto",
+                            )
+                            phase.record_usage(usage_of(response), model=model)
+                            return response
+
+                        response = scheduler.run(
+                            router.call, 'decision', complete, preferred=agent.model,
+                            priority=priority, session=session_id, tenant=tenant,
+                        )
+                        # Access the content of the response properly
+                        message = response.choices[0].message
+            except JobCancelled:
+                raise  # Cancelled while streaming: the job must end as cancelled, not as a finished turn
+            except Exception as e:
+                print(Fore.RED + "An error occurred while communicating with the OpenAI API.")
+                print(f"Error: {str(e)}")
+                break
+            if checkpoint is not None:
+                checkpoint.record_model_step(agent.name, message)
 
-        # Access the content of the response properly
-        message = response.choices[0].message
         if message.content:
-            print(Fore.CYAN + f"{current_agent.name}: " + Style.RESET_ALL + message.content)
-            # Store the content into memory
-            current_agent.add_to_memory(f"{current_agent.name}: {message.content}")
+            if not stream or replayed:
+                print(Fore.CYAN + f"{agent.name}: " + Style.RESET_ALL + message.content)
+            emit_event(on_event, 'message', agent=agent.name, content=message.content)
+            prompt_messages.append({"role": "assistant", "content": message.content})
+            # Store the content into memory (a replayed step was stored before the interruption)
+            if not replayed:
+                agent.add_to_memory(f"{agent.name}: {message.content}")
 
         if message.function_call:
             function_call = message.function_call
-            result = execute_tool_call(function_call, tools_map, current_agent.name, messages)
+            emit_event(on_event, 'tool_call', agent=agent.name, name=function_call.name, arguments=function_call.arguments)
+            # A handoff that continues in this turn warms its target while the transfer runs
+            warming = None
+            if function_call.name == 'transfer_to_agent' and message_bus is None and handoffs < MAX_HANDOFFS_PER_TURN:
+                warming = prefetch_handoff(function_call, context)
+            result = execute_tool_call(function_call, tools_map, agent.name, prompt_messages, checkpoint)
+            emit_event(on_event, 'tool_result', agent=agent.name, name=function_call.name, content=prompt_messages[-1]['content'])
 
             if result:
                 # Agent handoff
                 print(Fore.YELLOW + f"Transferring to {result.name}...\n")
-                current_agent = result  # Update current agent
-                # Inform the agent of the handoff
-                messages.append({
+                emit_event(on_event, 'handoff', source=agent.name, target=result.name)
+                agent = result  # Update current agent
+                current_agent.set(agent)
+                handoffs += 1
+                if message_bus is not None or handoffs > MAX_HANDOFFS_PER_TURN:
+                    # Inform the agent of the handoff; the bus routes the turn to the target's
+                    # process, and past the cap the next user message starts with the new agent
+                    prompt_messages.append({
+                        "role": "system",
+                        "content": f"You have been transferred to {agent.name}. Adopt the new role immediately."
+                    })
+                    break
+
+                # Continue in this turn: swap in the new agent's instructions, memory and retrieved memories
+                pending_memories = None
+                if warming is not None:
+                    try:
+                        warmed = warming.result()
+                        if warmed is not None and warmed[0] is agent:
+                            pending_memories = warmed[1]
+                    except Exception as e:
+                        logging.warning(f"Handoff prefetch for {agent.name} failed. Error: {str(e)}")
+                header = build_prompt_header(agent, pending_memories, context)
+                prompt_messages[:header_size] = header
+                # The header is not part of the transcript; keep the transcript offsets aligned
+                turn_start += len(header) - header_size
+                persisted += len(header) - header_size
+                header_size = len(header)
+                prompt_messages.append({
                     "role": "system",
-                    "content": f"You have been transferred to {current_agent.name}. Adopt the new role immediately."
+                    "content": f"You have been transferred to {agent.name}. Adopt the new role immediately "
+                               f"and continue with the user's request."
                 })
-                break  # Break to start over with the new agent
+                continue
         else:
             break  # No function calls, end the loop
 
-        # Agent self-reflection and behavior adjustment
-        current_agent.self_reflect()
-        current_agent.adjust_behavior()
-
-        # Save agent memory after each turn
-        save_agent_memory(current_agent)
+        # Agent self-reflection, behavior adjustment and memory save run in the background
+        # (steps replayed from a checkpoint were reflected on before the interruption)
+        if checkpoint is None or not checkpoint.replaying:
+            schedule_reflection(agent, session_id, tenant)
 
-    return Response(agent=current_agent, messages=messages[num_init_messages:])
+    persist()
+    if conversation is not None:
+        conversation.set_agent(agent.name)
+    return Response(agent=agent, messages=prompt_messages[turn_start:], time_to_first_token=time_to_first_token)
 
 # Flask app for Agent APIs (Scaling Communication Between Agents)
-app = Flask(__name__)
+SERVER_MODE = os.getenv('SERVER_MODE', 'flask').lower()  # flask, asgi or off
+SERVER_PORT = int(os.getenv('SERVER_PORT', '5000'))
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '1'))  # ASGI worker processes (standalone mode)
+ACTION_WORKERS = int(os.getenv('ACTION_WORKERS', '32'))  # Concurrent actions per batch request
+
+# Actions exposed over HTTP, built once at import instead of on every request
+ACTION_REGISTRY = {
+    'send_real_email': send_real_email,
+    'read_file': read_file,
+    'write_file': write_file,
+    'list_directory': list_directory,
+    'fetch_url': fetch_url,
+    'execute_shell_command': execute_shell_command,
+    'open_application': open_application,
+    'click_at': click_at,
+    'store_data': store_data,
+    'retrieve_data': retrieve_data,
+    'upload_image': upload_image,
+    'include_image_in_prompt': include_image_in_prompt,
+    'upload_image_to_gpt': upload_image_to_gpt,
+    # Add other actions here
+}
 
-# Redirect Flask's logs to a separate file to prevent cluttering the main console
-log = logging.getLogger('werkzeug')
-log.setLevel(logging.ERROR)  # Set to ERROR to reduce verbosity
+action_executor = ThreadPoolExecutor(max_workers=ACTION_WORKERS, thread_name_prefix='agent-action')
 
-@app.route('/agent_action', methods=['POST'])
 def agent_action():
-    data = request.get_json()
+    data = flask.request.get_json()
     action = data.get('action')
     params = data.get('params', {})
     # Execute the action
-    result = execute_agent_action(action, params)
-    return jsonify({'result': result})
+    result = execute_agent_action(action, params, data.get('agent'))
+    return flask.jsonify({'result': result})
+
+def agent_actions():
+    """Runs a batch of actions concurrently and streams one NDJSON line per result as it finishes."""
+    data = flask.request.get_json()
+    actions = data.get('actions', [])
+
+    def generate():
+        for item in run_agent_actions(actions):
+            yield json.dumps(item, default=str) + "\n"
+
+    return flask.Response(flask.stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def scheduler_metrics():
+    """Queue depth, running tasks and wait-time percentiles per priority class."""
+    return flask.jsonify(scheduler.metrics())
+
+def metrics():
+    """Prometheus scrape endpoint: phase latency histograms, token counters and scheduler gauges."""
+    return flask.Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def scheduler_gauges():
+    gauges = []
+    for class_name, stats in scheduler.metrics().items():
+        labels = {'class': class_name}
+        gauges.append(('gptco_scheduler_queue_depth', labels, stats['queue_depth']))
+        gauges.append(('gptco_scheduler_running', labels, stats['running']))
+        gauges.append(('gptco_scheduler_wait_p99_seconds', labels, stats['wait_p99']))
+    return gauges
+
+register_gauges(scheduler_gauges)
+register_gauges(router.gauges)
+
+def usage():
+    """Token and cost totals for this process, grouped by ?by=session|agent|tool|phase|model (default agent)."""
+    group_by = flask.request.args.get('by', 'agent')
+    if group_by not in ('session', 'agent', 'tool', 'phase', 'model'):
+        return flask.jsonify({'error': f"Unknown grouping '{group_by}'."}), 400
+    return flask.jsonify(ledger.summary(group_by))
+
+def admin_profiles():
+    """
+    Profiles of the last ?last=N profiled turns (optionally ?session=), as ?format=json (summaries),
+    pstats (merged cProfile report, ?sort=cumulative|tottime|calls) or collapsed (flame graph input).
+    """
+    args = flask.request.args
+    profiles = profiler.recent(int(args.get('last', 10)), args.get('session'))
+    output_format = args.get('format', 'json')
+    if output_format == 'pstats':
+        return flask.Response(profiler.render_pstats(profiles, sort=args.get('sort', 'cumulative'),
+                                                     limit=int(args.get('limit', 50))), mimetype='text/plain')
+    if output_format == 'collapsed':
+        return flask.Response(profiler.render_collapsed(profiles), mimetype='text/plain')
+    if output_format != 'json':
+        return flask.jsonify({'error': f"Unknown format '{output_format}'."}), 400
+    return flask.jsonify([profile.summary() for profile in profiles])
+
+def admin_profiling():
+    """Shows (GET) or changes (POST {sample_rate, mode, session, enabled, memory_tracking}) the profiling settings."""
+    if flask.request.method == 'POST':
+        data = flask.request.json or {}
+        try:
+            profiler.configure(data.get('sample_rate'), data.get('mode'), data.get('session'), data.get('enabled', True))
+        except ValueError as e:
+            return flask.jsonify({'error': str(e)}), 400
+        if data.get('memory_tracking') is True:
+            profiler.memory.start()
+        elif data.get('memory_tracking') is False:
+            profiler.memory.stop()
+    return flask.jsonify(profiler.settings())
+
+def admin_memory():
+    """Per-turn tracemalloc diffs and watched structure sizes for the last ?last=N turns."""
+    history = list(profiler.memory.history)
+    return flask.jsonify(history[-int(flask.request.args.get('last', 10)):])
+
+def record_span_usage(phase, usage, model):
+    """Forwards every usage block recorded on a telemetry span to the usage ledger."""
+    ledger.record_usage(
+        usage,
+        model,
+        phase=phase.attributes.get('purpose', phase.name),
+        session=phase.attributes.get('session', current_session_id.get()),
+        agent=phase.attributes.get('agent', ''),
+        tool=phase.attributes.get('tool', ''),
+    )
+
+add_usage_listener(record_span_usage)
 
-def execute_agent_action(action, params):
+def execute_agent_action(action, params, agent_name: Optional[str] = None):
     # Map action to function and execute
-    action_map = {
-        'send_real_email': send_real_email,
-        'read_file': read_file,
-        'write_file': write_file,
-        'list_directory': list_directory,
-        'fetch_url': fetch_url,
-        'execute_shell_command': execute_shell_command,
-        'open_application': open_application,
-        'click_at': click_at,
-        'store_data': store_data,
-        'retrieve_data': retrieve_data,
-        'upload_image': upload_image,
-        'include_image_in_prompt': include_image_in_prompt,
-        'upload_image_to_gpt': upload_image_to_gpt,  # Added the new action
-        # Add other actions here
-    }
-    if action in action_map:
-        return action_map[action](**params)
-    else:
+    if action not in ACTION_REGISTRY:
         return f"Action '{action}' not recognized."
+    # Actions run as the named agent (the email sender, the budget owner), by default the Sales Agent
+    token = current_agent.set(find_agent(agent_name or 'Sales Agent'))
+    try:
+        return ACTION_REGISTRY[action](**params)
+    finally:
+        current_agent.reset(token)
+
+def run_batch_item(index: int, item: Dict) -> Dict:
+    """Executes one entry of a batch request and wraps its result or error."""
+    action = item.get('action')
+    outcome = {'index': index, 'id': item.get('id', index), 'action': action}
+    try:
+        outcome['result'] = execute_agent_action(action, item.get('params', {}), item.get('agent'))
+    except Exception as e:
+        outcome['error'] = str(e)
+    return outcome
 
-# Start the Flask app in a separate thread if needed
-import threading
+def run_agent_actions(actions: List[Dict]):
+    """
+    Submits every action to the shared action pool and yields results in completion order.
+    """
+    futures = [action_executor.submit(run_batch_item, index, item) for index, item in enumerate(actions)]
+    for future in as_completed(futures):
+        yield future.result()
+
+def start_server(mode: str = SERVER_MODE):
+    """
+    Starts the agent API in a background thread.
+    'flask' runs the Flask development server, 'asgi' runs the ASGI app (asgi_app.py) under uvicorn,
+    'off' disables the API. For several ASGI worker processes run `python asgi_app.py` instead.
+    """
+    if mode == 'off':
+        return None
+    if mode == 'asgi':
+        from asgi_app import create_app, run_in_thread
+        app = create_app(execute_agent_action, run_batch_item, ACTION_WORKERS, AGENT_LOG_FILE)
+        return run_in_thread(app, port=SERVER_PORT)
+    flask_thread = threading.Thread(target=lambda: get_app().run(port=SERVER_PORT), daemon=True)
+    flask_thread.start()
+    return flask_thread
 
-def start_flask():
-    app.run(port=5000)
+# Asynchronous job API for long agent turns
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))  # Turns running at once; extra jobs wait in the queue
 
-flask_thread = threading.Thread(target=start_flask, daemon=True)
-flask_thread.start()
+job_manager = JobManager(max_workers=JOB_WORKERS)
+
+def run_turn_job(payload: Dict, emit: Callable):
+    """
+    Job handler for a full agent turn.
+    Payload: {"agent": "Sales Agent", "messages": [...]} runs statelessly on the given history;
+    {"session_id": "s1", "message": "..."} appends to the stored session and resumes it with its last agent.
+    """
+    session_id = payload.get('session_id', 'local')
+    conversation = None if 'messages' in payload else conversations.get(session_id)
+    agent_name = payload.get('agent') or (conversation.agent if conversation else None) or 'Sales Agent'
+    agent = find_agent(agent_name)
+    if agent is None:
+        raise ValueError(f"Agent '{agent_name}' not found.")
+    user_message = {"role": "user", "content": payload['message']} if payload.get('message') else None
+    if conversation is not None:
+        if user_message:
+            conversation.append(user_message)
+        messages = conversation.window()
+    else:
+        messages = list(payload['messages']) + ([user_message] if user_message else [])
+    response = run_full_turn(agent, messages, on_event=emit, session_id=session_id,
+                             tenant=payload.get('tenant', 'default'), conversation=conversation)
+    return {'agent': response.agent.name, 'messages': response.messages,
+            'time_to_first_token': response.time_to_first_token}
+
+def resume_interrupted_turns() -> List:
+    """
+    Resubmits the turns a crash or restart left unfinished (see turn_checkpoint.py) as turn jobs.
+    Completed model calls and tool results are replayed from the checkpoint, so only the steps
+    after the interruption run again; the answer lands in the session transcript.
+    Each job carries its own agent and session (context variables), and the interrupted turns of
+    one session run one after another, oldest first, so their transcript appends do not interleave.
+    """
+    by_session: Dict[str, List] = {}
+    for checkpoint in interrupted_turns():
+        start = checkpoint.start_record
+        agent = find_agent(start['agent'])
+        if agent is None:
+            logging.warning(f"Dropping interrupted turn {checkpoint.turn_id}: agent '{start['agent']}' not found.")
+            checkpoint.finish()
+            continue
+        by_session.setdefault(start['session'], []).append((checkpoint, agent))
+        increment('gptco_checkpoint_resumed_turns_total')
+        logging.info(f"Resuming interrupted turn {checkpoint.turn_id} of session {start['session']} "
+                     f"({len(checkpoint.recorded)} recorded steps, log read in {checkpoint.load_seconds * 1000:.1f} ms)")
+
+    def work(emit, session_id, turns):
+        results = []
+        for checkpoint, agent in turns:
+            start = checkpoint.start_record
+            response = run_full_turn(agent, start['messages'], on_event=emit, stream=False,
+                                     session_id=session_id, tenant=start['tenant'],
+                                     conversation=conversations.get(session_id), checkpoint=checkpoint)
+            results.append({'agent': response.agent.name, 'messages': response.messages, 'resumed': checkpoint.turn_id})
+        return results
+
+    return [job_manager.submit('turn', functools.partial(work, session_id=session_id, turns=turns))
+            for session_id, turns in by_session.items()]
+
+_app = None
+_app_lock = threading.Lock()
+
+def get_app():
+    """Builds the Flask app on first use, so sessions without the HTTP API never import Flask."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            app = flask.Flask(__name__)
+
+            # Redirect Flask's logs to a separate file to prevent cluttering the main console
+            log = logging.getLogger('werkzeug')
+            log.setLevel(logging.ERROR)  # Set to ERROR to reduce verbosity
+
+            app.add_url_rule('/agent_action', 'agent_action', agent_action, methods=['POST'])
+            app.add_url_rule('/agent_actions', 'agent_actions', agent_actions, methods=['POST'])
+            app.add_url_rule('/scheduler_metrics', 'scheduler_metrics', scheduler_metrics, methods=['GET'])
+            app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+            app.add_url_rule('/usage', 'usage', usage, methods=['GET'])
+            app.add_url_rule('/admin/profiles', 'admin_profiles', admin_profiles, methods=['GET'])
+            app.add_url_rule('/admin/profiling', 'admin_profiling', admin_profiling, methods=['GET', 'POST'])
+            app.add_url_rule('/admin/memory', 'admin_memory', admin_memory, methods=['GET'])
+            register_job_routes(app, job_manager, {'turn': run_turn_job})
+            _app = app
+        return _app
 
 # Implementing the Screenshot-Analyze-Action Loop
-def screenshot_analyze_action_loop(task_description: str):
+SCREENSHOT_MIN_INTERVAL = float(os.getenv('SCREENSHOT_MIN_INTERVAL', '1.0'))  # Seconds between polls while active
+SCREENSHOT_MAX_INTERVAL = float(os.getenv('SCREENSHOT_MAX_INTERVAL', '15.0'))  # Upper bound while the screen is idle
+SCREENSHOT_CROP_TO_CHANGES = os.getenv('SCREENSHOT_CROP_TO_CHANGES', 'false').lower() == 'true'
+SCREENSHOT_SAVE_FRAMES = os.getenv('SCREENSHOT_SAVE_FRAMES', 'true').lower() == 'true'
+SCREENSHOT_REQUIRE_CONSENT = os.getenv('SCREENSHOT_REQUIRE_CONSENT', 'true').lower() == 'true'  # Ask once before monitoring starts; 'false' opts out
+
+def screenshot_analyze_action_loop(task_description: str, crop_to_changes: bool = SCREENSHOT_CROP_TO_CHANGES):
     """
     Implements the loop: Take screenshot, analyze, perform action, check completion.
     Repeats until the task is complete.
+    Frames are compared before anything is uploaded: unchanged frames are skipped,
+    and the polling interval backs off while the screen is idle.
     """
+    if SCREENSHOT_REQUIRE_CONSENT:
+        consent = input(Fore.YELLOW + "Agent requests to monitor your desktop with screenshots for this task. Do you allow this? (yes/no): ").strip().lower()
+        if consent != 'yes':
+            print(Fore.RED + "Screenshot denied by user.")
+            return
+
+    agent = current_agent.get()
+    differ = FrameDiffer()
+    interval = AdaptiveInterval(SCREENSHOT_MIN_INTERVAL, SCREENSHOT_MAX_INTERVAL)
+    skipped_frames = 0
+
     while True:
-        # Take a screenshot and analyze it
-        result = take_screenshot_and_analyze()
-        print(Fore.GREEN + result)
-
-        # Retrieve the latest description from memory
-        if current_agent.long_term_memory_data:
-            latest_description = current_agent.long_term_memory_data[-1]
-            print(Fore.BLUE + f"Latest Description: {latest_description}")
-
-            # Check if the task is complete
-            if is_task_complete(latest_description):
-                print(Fore.GREEN + "Task is complete.")
-                current_agent.add_to_memory("Task completed successfully.")
-                break
-            else:
-                print(Fore.YELLOW + "Task is not complete. Continuing the loop.")
-                current_agent.add_to_memory("Task not complete. Continuing actions.")
-        else:
-            print(Fore.RED + "No description available to evaluate task completion.")
+        try:
+            screenshot = pyautogui.screenshot()
+        except Exception as e:
+            print(Fore.RED + f"Failed to take screenshot: {e}")
             break
 
-        # Optional: Wait for a short duration before the next iteration
-        time.sleep(2)
+        change = differ.compare(screenshot)
+        if not change.changed:
+            # Nothing new on screen: no upload, no disk write, no memory entry
+            skipped_frames += 1
+            time.sleep(interval.next(changed=False))
+            continue
+
+        if skipped_frames:
+            logging.info(f"Screen changed after {skipped_frames} unchanged frame(s).")
+            skipped_frames = 0
+
+        frame = screenshot
+        region_note = ""
+        if crop_to_changes and change.bbox:
+            frame = screenshot.crop(change.bbox)
+            region_note = f" (changed region {change.bbox})"
+
+        if SCREENSHOT_SAVE_FRAMES:
+            # Nanoseconds: at SCREENSHOT_MIN_INTERVAL below a second, whole seconds would overwrite frames
+            screenshot_path = f"screenshot_{time.time_ns()}.png"
+            frame.save(screenshot_path)
+            print(Fore.GREEN + f"Screenshot saved as {screenshot_path}.")
+
+        # Upload the image to GPT and get the description
+        upload_response = scheduler.run(describe_encoded_image, prepare_pil_image(frame), priority=BATCH)
+        if not isinstance(upload_response, dict):
+            print(Fore.RED + str(upload_response))
+            break
+        latest_description = upload_response.get('choices', [{}])[0].get('message', {}).get('content', "No description available.")
+        agent.add_to_memory(f"Screenshot taken{region_note}: {latest_description}")
+        print(Fore.BLUE + f"Latest Description: {latest_description}")
+
+        # Check if the task is complete
+        if is_task_complete(latest_description):
+            print(Fore.GREEN + "Task is complete.")
+            agent.add_to_memory("Task completed successfully.")
+            break
+        else:
+            print(Fore.YELLOW + "Task is not complete. Continuing the loop.")
+            agent.add_to_memory("Task not complete. Continuing actions.")
+
+        time.sleep(interval.next(changed=True))
 
 # The main loop to run the automated company
 def main():
-    global current_agent
-    # Start with the Sales Agent
-    current_agent = sales_agent
-    messages = []
+    # Structured JSON logs, written by a background thread to a size-rotated file
+    configure_logging(AGENT_LOG_FILE)
+    # Initialize colorama
+    init(autoreset=True)
+
+    # Resume the stored session if there is one, otherwise start with the Sales Agent
+    session_id = os.getenv('SESSION_ID', 'local')
+    conversation = conversations.get(session_id)
+    agent = find_agent(conversation.agent or "Sales Agent") or agents["Sales Agent"]
+    current_agent.set(agent)
+    STARTUP_TIMINGS['first_agent'] = agents.materialize_timings.get(agent.name, 0.0)
+    print(Fore.GREEN + f"Cold start: import {STARTUP_TIMINGS['import'] * 1000:.1f} ms, "
+                       f"first agent {STARTUP_TIMINGS['first_agent'] * 1000:.1f} ms.")
+    logging.info(f"Cold start timings (seconds): {STARTUP_TIMINGS}")
+    if conversation.total:
+        print(Fore.GREEN + f"Resumed session '{session_id}': {conversation.total} messages, talking to {agent.name}.")
+
+    start_server()
+    # Spawn the command workers now so the first execute_shell_command call finds them warm
+    shell_pool.start_in_background()
+    # Finish turns interrupted by the last shutdown or crash, without repeating their completed steps
+    resumed = resume_interrupted_turns()
+    if resumed:
+        print(Fore.GREEN + f"Resuming interrupted turns of {len(resumed)} session(s) in the background.")
 
     print(Fore.GREEN + "Automated Company Started.")
     print("Type 'exit' to terminate the simulation.\n")
@@ -1131,26 +1841,27 @@ def main():
             print(Fore.GREEN + "Terminating the simulation.")
             break
 
-        messages.append({"role": "user", "content": user_input})
+        conversation.append({"role": "user", "content": user_input})
 
         # Check if the user input is a command to start the screenshot-analyze-action loop
         if user_input.lower().startswith("start task:"):
             task_description = user_input[len("start task:"):].strip()
             print(Fore.BLUE + f"Starting task: {task_description}")
-            current_agent.add_to_memory(f"Starting task: {task_description}")
+            agent.add_to_memory(f"Starting task: {task_description}")
             screenshot_analyze_action_loop(task_description)
             continue  # Skip the normal turn after starting the task
 
-        response = run_full_turn(current_agent, messages)
-        messages = response.messages
-        current_agent = response.agent
+        response = run_full_turn(agent, conversation.window(), session_id=session_id, conversation=conversation)
+        if response.time_to_first_token is not None:
+            logging.info(f"Turn time to first token: {response.time_to_first_token:.3f}s")
+        agent = response.agent
+        current_agent.set(agent)
 
-        # Save agent memory after each turn
-        save_agent_memory(current_agent)
+        # Save agent memory, reflect and adjust behavior after each turn, behind interactive work
+        schedule_reflection(agent, session_id)
 
-        # Optional: Handle self-reflection and behavior adjustment after each turn
-        current_agent.self_reflect()
-        current_agent.adjust_behavior()
+# Time from the start of the module import until here
+STARTUP_TIMINGS = {'import': time.perf_counter() - _startup_started}
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,174 @@
+import os
+import io
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Any
+from pydantic import BaseModel
+
+# Image pipeline configuration (override in the .env file)
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '1024'))  # Longest side in pixels
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG').upper()  # JPEG, WEBP or PNG
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '70'))  # Lossy quality for JPEG/WEBP
+IMAGE_CACHE_SIZE = int(os.getenv('IMAGE_CACHE_SIZE', '128'))  # Entries kept per cache
+
+_MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+}
+
+_CHUNK_SIZE = 1 << 16
+
+
+class EncodedImage(BaseModel):
+    digest: str  # SHA-256 of the source content
+    mime_type: str
+    base64: str
+    width: int = 0
+    height: int = 0
+    source_bytes: int = 0
+    encoded_bytes: int = 0
+
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+
+class _LRUCache:
+    """Small thread-safe LRU cache keyed by content hash."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_payload_cache = _LRUCache(IMAGE_CACHE_SIZE)
+_description_cache = _LRUCache(IMAGE_CACHE_SIZE)
+
+
+def file_digest(image_path: str) -> str:
+    """Hashes a file in fixed-size chunks so large images are never read whole."""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_key(digest: str) -> tuple:
+    return (digest, IMAGE_MAX_DIMENSION, IMAGE_FORMAT, IMAGE_QUALITY)
+
+
+def _encode_pil(image, digest: str, source_bytes: int) -> EncodedImage:
+    # Downscale in place (keeps aspect ratio) and recompress to the configured format
+    image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+    if IMAGE_FORMAT == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    save_kwargs = {'optimize': True}
+    if IMAGE_FORMAT in ('JPEG', 'WEBP'):
+        save_kwargs['quality'] = IMAGE_QUALITY
+    image.save(buffer, format=IMAGE_FORMAT, **save_kwargs)
+    raw = buffer.getvalue()
+    return EncodedImage(
+        digest=digest,
+        mime_type=_MIME_TYPES.get(IMAGE_FORMAT, 'application/octet-stream'),
+        base64=base64.b64encode(raw).decode('utf-8'),
+        width=image.width,
+        height=image.height,
+        source_bytes=source_bytes,
+        encoded_bytes=len(raw),
+    )
+
+
+def _encode_raw(image_path: str, digest: str) -> EncodedImage:
+    # Fallback when Pillow is unavailable: ship the original bytes unchanged
+    with open(image_path, 'rb') as f:
+        raw = f.read()
+    extension = os.path.splitext(image_path)[1].lstrip('.').upper()
+    extension = 'JPEG' if extension == 'JPG' else extension
+    return EncodedImage(
+        digest=digest,
+        mime_type=_MIME_TYPES.get(extension, 'application/octet-stream'),
+        base64=base64.b64encode(raw).decode('utf-8'),
+        source_bytes=len(raw),
+        encoded_bytes=len(raw),
+    )
+
+
+def prepare_image(image_path: str) -> EncodedImage:
+    """
+    Downscales, recompresses and Base64-encodes an image file.
+    Results are cached by content hash, so an unchanged file is only encoded once.
+    Raises FileNotFoundError if the image does not exist.
+    """
+    digest = file_digest(image_path)
+    key = _cache_key(digest)
+    cached = _payload_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        from PIL import Image
+    except ImportError:
+        encoded = _encode_raw(image_path, digest)
+    else:
+        with Image.open(image_path) as image:
+            image.load()
+            encoded = _encode_pil(image, digest, os.path.getsize(image_path))
+
+    _payload_cache.put(key, encoded)
+    return encoded
+
+
+def prepare_pil_image(image) -> EncodedImage:
+    """
+    Same as prepare_image, for an in-memory PIL image (e.g. a fresh screenshot).
+    The source image is not modified.
+    """
+    pixels = image.tobytes()
+    digest = hashlib.sha256(pixels).hexdigest()
+    key = _cache_key(digest)
+    cached = _payload_cache.get(key)
+    if cached is not None:
+        return cached
+
+    encoded = _encode_pil(image.copy(), digest, len(pixels))
+    _payload_cache.put(key, encoded)
+    return encoded
+
+
+def get_cached_description(digest: str, prompt: str) -> Optional[Any]:
+    """Returns the model's cached response for this image content and prompt, if any."""
+    return _description_cache.get((digest, prompt))
+
+
+def cache_description(digest: str, prompt: str, description: Any):
+    """Caches the model's response for this image content and prompt."""
+    _description_cache.put((digest, prompt), description)
+
+
+def clear_image_caches():
+    _payload_cache.clear()
+    _description_cache.clear()
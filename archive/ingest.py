@@ -0,0 +1,462 @@
+# Bulk knowledge ingestion into the shared long-term memory.
+#
+# Walks the given directories, parses and chunks files in worker processes, drops chunks
+# that were already seen (content hash), embeds the new ones in large rate-limited batches
+# and adds each batch to the shared memory index in one call. Finished files are recorded
+# in a state file, so an interrupted run resumes with the files it had not finished.
+#
+#   python ingest.py manuals/ tickets/ --agent "Customer Support Agent" --agent "Technical Support Agent"
+#   python ingest.py handbook/ --visibility public --batch-size 1000 --requests-per-minute 500
+#   python ingest.py manuals/ --restart        # forget the state file and ingest everything again
+#
+# Supported files: plain text, Markdown, reStructuredText, HTML, CSV, JSON and JSON Lines
+# (one ticket per line). Each chunk is stored with its relative path as the entry's source, which
+# is left out of the content hash: the same text in two files is embedded once.
+
+import os
+import csv
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from artifact_store import html_to_text
+from shared_memory import content_hash
+
+# Ingestion configuration (override in the .env file or on the command line)
+INGEST_STATE_FILE = os.getenv('INGEST_STATE_FILE', 'ingest_state.jsonl')  # Files already ingested, one JSON line each
+INGEST_EXTENSIONS = os.getenv('INGEST_EXTENSIONS', '.txt,.md,.rst,.html,.htm,.csv,.json,.jsonl,.log').split(',')
+INGEST_CHUNK_CHARS = int(os.getenv('INGEST_CHUNK_CHARS', '1500'))  # Target chunk size in characters
+INGEST_CHUNK_OVERLAP = int(os.getenv('INGEST_CHUNK_OVERLAP', '200'))  # Characters repeated between neighbouring chunks
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(os.cpu_count() or 2)))  # Parsing processes
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '500'))  # Chunks per embeddings request and index add
+INGEST_EMBED_CONCURRENCY = int(os.getenv('INGEST_EMBED_CONCURRENCY', '4'))  # Embedding batches in flight
+INGEST_REQUESTS_PER_MINUTE = float(os.getenv('INGEST_REQUESTS_PER_MINUTE', '300'))
+INGEST_TOKENS_PER_MINUTE = float(os.getenv('INGEST_TOKENS_PER_MINUTE', '1000000'))
+INGEST_RETRIES = int(os.getenv('INGEST_RETRIES', '5'))  # Attempts per batch on rate limits and outages
+INGEST_MAX_FILE_BYTES = int(os.getenv('INGEST_MAX_FILE_BYTES', str(50 * 1024 * 1024)))  # Larger files are skipped
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# --- Parsing and chunking (runs in worker processes) --------------------------------------
+
+def _flatten(value, prefix: str = '') -> List[str]:
+    """'key: value' lines for a JSON document, nested keys joined with dots."""
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            lines.extend(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return lines
+    if isinstance(value, list):
+        lines = []
+        for item in value:
+            lines.extend(_flatten(item, prefix))
+        return lines
+    if value is None or value == '':
+        return []
+    return [f"{prefix}: {value}" if prefix else str(value)]
+
+
+def parse_document(path: str, raw: str) -> List[str]:
+    """Splits a file into documents (sections of text) according to its type."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.html', '.htm'):
+        title, text = html_to_text(raw)
+        return [f"{title}\n{text}" if title else text]
+    if extension == '.jsonl':
+        documents = []
+        for line in raw.splitlines():
+            try:
+                documents.append("\n".join(_flatten(json.loads(line))))
+            except ValueError:
+                continue
+        return documents
+    if extension == '.json':
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return [raw]
+        items = data if isinstance(data, list) else [data]
+        return ["\n".join(_flatten(item)) for item in items]
+    if extension == '.csv':
+        rows = csv.DictReader(raw.splitlines())
+        return ["\n".join(f"{key}: {value}" for key, value in row.items() if key and value) for row in rows]
+    return [raw]
+
+
+def chunk_text(text: str, size: int = INGEST_CHUNK_CHARS, overlap: int = INGEST_CHUNK_OVERLAP) -> List[str]:
+    """
+    Packs paragraphs into chunks of about `size` characters. Paragraphs longer than that are cut at
+    whitespace, and each chunk after the first starts with the last `overlap` characters of the previous one.
+    """
+    paragraphs = [' '.join(p.split()) for p in text.replace('\r\n', '\n').split('\n\n')]
+    pieces = []
+    for paragraph in paragraphs:
+        while len(paragraph) > size:
+            cut = paragraph.rfind(' ', size // 2, size)
+            cut = cut if cut > 0 else size
+            pieces.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        if paragraph:
+            pieces.append(paragraph)
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > size:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ''
+            current = tail[tail.find(' ') + 1:] if ' ' in tail else tail
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def parse_file(path: str, root: str, size: int, overlap: int) -> Tuple[str, str, List[Tuple[str, str, str]], Optional[str]]:
+    """Worker: reads and chunks one file. Returns (path, file hash, [(chunk hash, chunk, source)], error)."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        file_hash = hashlib.sha256(data).hexdigest()
+        raw = data.decode('utf-8', errors='replace')
+        source = os.path.relpath(path, root)
+        chunks = []
+        for document in parse_document(path, raw):
+            for chunk in chunk_text(document, size, overlap):
+                # The same hash SharedMemory dedupes on, so a chunk stored by an earlier run is recognized
+                chunks.append((content_hash(chunk), chunk, source))
+        return path, file_hash, chunks, None
+    except Exception as e:
+        return path, '', [], f"{type(e).__name__}: {str(e)}"
+
+
+def walk(paths: List[str], extensions: List[str]) -> Iterator[Tuple[str, str]]:
+    """(file, root) for every file with a supported extension under `paths`, in a stable order."""
+    wanted = {extension.lower() for extension in extensions if extension}
+    for path in paths:
+        root = os.path.abspath(path)
+        if os.path.isfile(root):
+            yield root, os.path.dirname(root)
+            continue
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = sorted(d for d in subdirectories if not d.startswith('.'))
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in wanted:
+                    yield os.path.join(directory, name), root
+
+
+# --- Rate limiting and progress ------------------------------------------------------------
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute; `acquire` blocks until both allow the request."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.limits = (requests_per_minute / 60.0, tokens_per_minute / 60.0)
+        self.available = [requests_per_minute, tokens_per_minute]
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for i, rate in enumerate(self.limits):
+                    self.available[i] = min(rate * 60.0, self.available[i] + (now - self.updated) * rate)
+                self.updated = now
+                # A request larger than a full bucket is let through once the bucket is full
+                needed = (1, min(tokens, self.limits[1] * 60.0))
+                waits = [(need - have) / rate for need, have, rate in zip(needed, self.available, self.limits) if have < need]
+                if not waits:
+                    self.available[0] -= needed[0]
+                    self.available[1] -= needed[1]
+                    return
+            time.sleep(max(waits))
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    return sum(len(text) for text in texts) // 4 + len(texts)
+
+
+class Progress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files_total = 0
+        self.files_done = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.chunks = 0
+        self.duplicates = 0
+        self.embedded = 0
+        self.requests = 0
+        self.retries = 0
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def summary(self) -> Dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'files_total': self.files_total, 'files_done': self.files_done, 'files_skipped': self.files_skipped,
+            'files_failed': self.files_failed,
+            'chunks': self.chunks, 'duplicates': self.duplicates, 'embedded': self.embedded,
+            'embedding_requests': self.requests, 'retries': self.retries,
+            'documents_per_second': round(self.files_done / elapsed, 2),
+            'chunks_per_second': round(self.chunks / elapsed, 2),
+        }
+
+    def report(self, force: bool = False, interval: float = 5.0):
+        now = time.perf_counter()
+        if not force and now - self._last_report < interval:
+            return
+        self._last_report = now
+        s = self.summary()
+        print(f"{s['files_done']}/{s['files_total']} files, {s['chunks']} chunks ({s['duplicates']} duplicate), "
+              f"{s['embedded']} embedded in {s['embedding_requests']} requests, "
+              f"{s['documents_per_second']:.1f} docs/s, {s['chunks_per_second']:.1f} chunks/s", flush=True)
+
+
+# --- Pipeline -------------------------------------------------------------------------------
+
+class IngestState:
+    """Append-only record of finished files, keyed by path and validated by size and mtime."""
+
+    def __init__(self, path: str = INGEST_STATE_FILE):
+        self.path = path
+        self.done: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A torn last line from an interrupted run
+                    self.done[record['path']] = record
+        self._file = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_done(self, path: str) -> bool:
+        record = self.done.get(path)
+        return record is not None and tuple(record['signature']) == self.signature(path)
+
+    def mark_done(self, path: str, file_hash: str, chunks: int):
+        record = {'path': path, 'signature': list(self.signature(path)), 'sha256': file_hash,
+                  'chunks': chunks, 'time': time.time()}
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.done[path] = record
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Ingestor:
+    """
+    Streams parsed files from the worker processes into batches of unseen chunks. Each batch is
+    embedded with one rate-limited request and added to shared memory in one call, on a small
+    thread pool so parsing, embedding and indexing overlap. A file is marked done in the state
+    file once every batch holding one of its chunks has been stored.
+    """
+
+    def __init__(self, memory, embed, agents: List[str], visibility: str, state: IngestState,
+                 batch_size: int = INGEST_BATCH_SIZE, concurrency: int = INGEST_EMBED_CONCURRENCY,
+                 limiter: Optional[RateLimiter] = None, retries: int = INGEST_RETRIES):
+        self.memory = memory
+        self.embed = embed
+        self.agents = agents
+        self.visibility = visibility
+        self.state = state
+        self.batch_size = batch_size
+        self.limiter = limiter or RateLimiter(INGEST_REQUESTS_PER_MINUTE, INGEST_TOKENS_PER_MINUTE)
+        self.retries = retries
+        self.progress = Progress()
+        self.seen = set()
+        self.batch: List[Tuple[str, str, str]] = []  # (chunk, source, file path)
+        self.outstanding: Dict[str, int] = {}  # Chunks of a file not yet stored
+        self.file_info: Dict[str, Tuple[str, int]] = {}
+        self.embedders = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ingest-embed')
+        self.in_flight = deque()
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: List[str], agent: Optional[str]):
+        """The batch's embeddings request, paced by the limiter and retried on rate limits and outages."""
+        from model_router import is_overload_error
+        for attempt in range(self.retries):
+            self.limiter.acquire(estimate_tokens(texts))
+            try:
+                vectors = self.embed(texts, agent, batch_size=len(texts))
+                with self._lock:
+                    self.progress.requests += 1
+                return vectors
+            except Exception as e:
+                if attempt == self.retries - 1 or not is_overload_error(e):
+                    raise
+                with self._lock:
+                    self.progress.retries += 1
+                delay = min(2 ** attempt, 60)
+                logging.warning(f"Embedding batch of {len(texts)} failed ({type(e).__name__}); retrying in {delay}s")
+                time.sleep(delay)
+
+    def _store(self, batch: List[Tuple[str, str, str]]):
+        texts = [text for text, _, _ in batch]
+        sources = [source for _, source, _ in batch]
+        added = self.memory.add_many(texts, self.agents[0], self.visibility, readers=self.agents[1:],
+                                     embed=self._embed, sources=sources)
+        with self._lock:
+            self.progress.embedded += added
+            finished = []
+            for _, _, path in batch:
+                self.outstanding[path] -= 1
+                if self.outstanding[path] == 0:
+                    finished.append(path)
+        for path in finished:
+            self._finish_file(path)
+
+    def _finish_file(self, path: str):
+        with self._lock:
+            file_hash, chunks = self.file_info.pop(path)
+            self.outstanding.pop(path, None)
+            self.progress.files_done += 1
+        self.state.mark_done(path, file_hash, chunks)
+
+    def _flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        # Bounded: at most `concurrency` batches are embedding while parsing continues
+        while len(self.in_flight) >= self.concurrency:
+            self.in_flight.popleft().result()
+        self.in_flight.append(self.embedders.submit(self._store, batch))
+
+    def add_file(self, path: str, file_hash: str, chunks: List[Tuple[str, str, str]]):
+        fresh = []
+        for digest, text, source in chunks:
+            if digest in self.seen:
+                self.progress.duplicates += 1
+                continue
+            self.seen.add(digest)
+            if self.memory.contains(digest):
+                # Stored by an earlier run: not embedded again, but still sent so these agents become owners
+                self.progress.duplicates += 1
+            fresh.append((text, source))
+        with self._lock:
+            self.progress.chunks += len(chunks)
+            self.file_info[path] = (file_hash, len(chunks))
+            if fresh:
+                self.outstanding[path] = len(fresh)
+        if not fresh:
+            self._finish_file(path)
+            return
+        for text, source in fresh:
+            self.batch.append((text, source, path))
+            if len(self.batch) >= self.batch_size:
+                self._flush()
+
+    def run(self, paths: List[str], extensions: List[str] = INGEST_EXTENSIONS, workers: int = INGEST_WORKERS,
+            chunk_chars: int = INGEST_CHUNK_CHARS, overlap: int = INGEST_CHUNK_OVERLAP) -> Dict:
+        files = []
+        for path, root in walk(paths, extensions):
+            self.progress.files_total += 1
+            if self.state.is_done(path):
+                self.progress.files_skipped += 1
+            elif os.path.getsize(path) > INGEST_MAX_FILE_BYTES:
+                logging.warning(f"Skipping {path}: larger than INGEST_MAX_FILE_BYTES")
+                self.progress.files_failed += 1
+            else:
+                files.append((path, root))
+        if self.progress.files_skipped:
+            print(f"Resuming: {self.progress.files_skipped} file(s) already ingested.")
+        # Spawned rather than forked: the parent already runs threads (embedding, telemetry)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as parsers:
+            pending = set()
+            queue = iter(files)
+            while True:
+                # Keep a bounded number of files parsing so memory stays flat on large trees
+                for path, root in queue:
+                    pending.add(parsers.submit(parse_file, path, root, chunk_chars, overlap))
+                    if len(pending) >= workers * 4:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, file_hash, chunks, error = future.result()
+                    if error:
+                        logging.warning(f"Could not ingest {path}: {error}")
+                        self.progress.files_failed += 1
+                        continue
+                    self.add_file(path, file_hash, chunks)
+                self.progress.report()
+        self._flush()
+        while self.in_flight:
+            self.in_flight.popleft().result()
+        self.embedders.shutdown()
+        self.state.close()
+        self.progress.report(force=True)
+        return self.progress.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest documents into the agents' shared long-term memory.")
+    parser.add_argument('paths', nargs='+', help="Files or directories to ingest")
+    parser.add_argument('--agent', action='append', dest='agents',
+                        help="Agent that owns the entries (repeatable; default Customer Support Agent)")
+    parser.add_argument('--visibility', choices=['private', 'public'], default='private')
+    parser.add_argument('--extensions', default=','.join(INGEST_EXTENSIONS))
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help="Parsing processes")
+    parser.add_argument('--chunk-chars', type=int, default=INGEST_CHUNK_CHARS)
+    parser.add_argument('--overlap', type=int, default=INGEST_CHUNK_OVERLAP)
+    parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE, help="Chunks per embeddings request")
+    parser.add_argument('--concurrency', type=int, default=INGEST_EMBED_CONCURRENCY, help="Embedding requests in flight")
+    parser.add_argument('--requests-per-minute', type=float, default=INGEST_REQUESTS_PER_MINUTE)
+    parser.add_argument('--tokens-per-minute', type=float, default=INGEST_TOKENS_PER_MINUTE)
+    parser.add_argument('--state', default=INGEST_STATE_FILE, help="Progress file used to resume")
+    parser.add_argument('--restart', action='store_true', help="Ignore the progress file and ingest every file")
+    parser.add_argument('--json', help="Write the final report to this file")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.state):
+        os.remove(args.state)
+    sys.path.insert(0, HERE)
+    import gptco  # After argument parsing, so --help stays fast
+
+    agents = args.agents or ['Customer Support Agent']
+    unknown = [name for name in agents if gptco.find_agent(name) is None]
+    if unknown:
+        parser.error(f"Unknown agent(s): {', '.join(unknown)}")
+    ingestor = Ingestor(
+        gptco.shared_memory, gptco.embed_texts, agents, args.visibility, IngestState(args.state),
+        batch_size=args.batch_size, concurrency=args.concurrency,
+        limiter=RateLimiter(args.requests_per_minute, args.tokens_per_minute),
+    )
+    report = ingestor.run(args.paths, args.extensions.split(','), args.workers, args.chunk_chars, args.overlap)
+    gptco.shared_memory.close()
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Any
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED, EXPIRED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job when it has been cancelled or its deadline has passed."""
+
+
+class Job:
+    """
+    A unit of long-running work (an agent turn or a multi-LLM pipeline).
+    The work function receives `emit(event_type, data)`; every call records a
+    progress event and is also the point where cancellation and deadlines take effect.
+    """
+
+    def __init__(self, kind: str, timeout: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.deadline = self.created_at + timeout if timeout else None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._cancel_requested = False
+        self._condition = threading.Condition()
+
+    def _add_event(self, event_type: str, data: Any):
+        with self._condition:
+            self.events.append({
+                'id': len(self.events),
+                'type': event_type,
+                'data': data,
+                'time': time.time(),
+            })
+            self._condition.notify_all()
+
+    def _past_deadline(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
+
+    def emit(self, event_type: str, data: Any = None):
+        """Records a progress event; raises JobCancelled if the job should stop."""
+        if self._cancel_requested:
+            raise JobCancelled("Job cancelled.")
+        if self._past_deadline():
+            raise JobCancelled("Job deadline exceeded.")
+        self._add_event(event_type, data)
+
+    def cancel(self) -> bool:
+        """Requests cancellation. Queued jobs never start; running jobs stop at their next event."""
+        # Under the same lock as the QUEUED -> RUNNING transition in JobManager._run
+        with self._condition:
+            if self.status in TERMINAL_STATES:
+                return False
+            self._cancel_requested = True
+            if self.status == QUEUED:
+                self._finish(CANCELLED, error="Job cancelled.")
+        return True
+
+    def _finish(self, status: str, result: Any = None, error: Optional[str] = None):
+        with self._condition:
+            if self.status in TERMINAL_STATES:
+                return
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+        self._add_event(status, {'result': result, 'error': error})
+
+    def snapshot(self) -> Dict:
+        if self.status in (QUEUED, RUNNING) and self._past_deadline():
+            # The worker thread may still be blocked in a call; report the expiry right away
+            self._finish(EXPIRED, error="Job deadline exceeded.")
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'deadline': self.deadline,
+            'result': self.result,
+            'error': self.error,
+            'events': len(self.events),
+        }
+
+    def wait_for_events(self, after: int, timeout: float) -> list:
+        """Blocks until there are events past index `after`, the job ends, or the timeout passes."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: len(self.events) > after or self.status in TERMINAL_STATES,
+                timeout=timeout,
+            )
+            return self.events[after:]
+
+
+class JobManager:
+    """Runs jobs on a bounded worker pool and keeps the most recent ones for polling."""
+
+    def __init__(self, max_workers: int = 4, max_retained: int = 1000):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.max_retained = max_retained
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, work: Callable[[Callable], Any], timeout: Optional[float] = None) -> Job:
+        """Queues `work(emit)` and returns the job immediately."""
+        job = Job(kind, timeout=timeout)
+        with self._lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_retained:
+                self.jobs.popitem(last=False)
+        self.executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job: Job, work: Callable):
+        with job._condition:
+            if job.status != QUEUED:
+                return  # Cancelled while waiting in the queue
+            if job._past_deadline():
+                job._finish(EXPIRED, error="Job deadline exceeded before it started.")
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+        try:
+            job.emit('started', {'kind': job.kind})
+            result = work(job.emit)
+        except JobCancelled as e:
+            job._finish(EXPIRED if job._past_deadline() and not job._cancel_requested else CANCELLED, error=str(e))
+        except Exception as e:
+            logging.error(f"Job {job.id} ({job.kind}) failed. Error: {str(e)}")
+            job._finish(FAILED, error=str(e))
+        else:
+            if job._past_deadline():
+                job._finish(EXPIRED, error="Job deadline exceeded.")
+            else:
+                job._finish(SUCCEEDED, result=result)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+
+def sse_events(job: Job, last_event_id: int = -1, heartbeat: float = 15.0):
+    """Yields Server-Sent Events for a job until it reaches a terminal state."""
+    after = last_event_id + 1
+    while True:
+        events = job.wait_for_events(after, timeout=heartbeat)
+        if not events:
+            if job.status in TERMINAL_STATES:
+                return
+            job.snapshot()  # Surfaces an expired deadline
+            yield ": keep-alive\n\n"
+            continue
+        for event in events:
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        after = events[-1]['id'] + 1
+        if events[-1]['type'] in TERMINAL_STATES:
+            return
+
+
+def register_job_routes(app, manager: JobManager, handlers: Dict[str, Callable], decorate: Callable = None):
+    """
+    Adds the job API to a Flask app:
+      POST   /jobs                 submit {"kind", "payload", "timeout"} -> job ID
+      GET    /jobs/<id>            poll status and result
+      GET    /jobs/<id>/events     stream progress events (SSE, honours Last-Event-ID)
+      DELETE /jobs/<id>            cancel
+    `handlers` maps a job kind to `handler(payload, emit)`.
+    """
+    from flask import Response, request, jsonify, stream_with_context
+
+    decorate = decorate or (lambda view: view)
+
+    def submit_job():
+        data = request.get_json() or {}
+        kind = data.get('kind')
+        if kind not in handlers:
+            return jsonify({'error': f"Unknown job kind '{kind}'.", 'kinds': list(handlers)}), 400
+        payload = data.get('payload', {})
+        handler = handlers[kind]
+        job = manager.submit(kind, lambda emit: handler(payload, emit), timeout=data.get('timeout'))
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f"/jobs/{job.id}",
+            'events_url': f"/jobs/{job.id}/events",
+        }), 202
+
+    def job_status(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found.'}), 404
+        return jsonify(json.loads(json.dumps(job.snapshot(), default=str)))
+
+    def job_events(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found.'}), 404
+        last_event_id = int(request.headers.get('Last-Event-ID', request.args.get('last_event_id', -1)))
+        return Response(stream_with_context(sse_events(job, last_event_id)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+
+    def cancel_job(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found.'}), 404
+        job.cancel()
+        return jsonify({'job_id': job.id, 'status': job.status})
+
+    app.add_url_rule('/jobs', 'submit_job', decorate(submit_job), methods=['POST'])
+    app.add_url_rule('/jobs/<job_id>', 'job_status', decorate(job_status), methods=['GET'])
+    app.add_url_rule('/jobs/<job_id>/events', 'job_events', decorate(job_events), methods=['GET'])
+    app.add_url_rule('/jobs/<job_id>', 'cancel_job', decorate(cancel_job), methods=['DELETE'])
@@ -0,0 +1,50 @@
+# Locust load profile for the agent HTTP API.
+#
+# Start the API (ideally in replay mode so no live calls are made), then run Locust:
+#
+#   REPLAY_MODE=replay REPLAY_FIXTURE=bench_fixture.jsonl python asgi_app.py --port 5000
+#   locust -f locustfile.py --host http://localhost:5000 --users 50 --spawn-rate 10 --run-time 2m --headless
+#
+# The mix is weighted towards cheap read-only actions, with occasional writes
+# and batched requests, which is roughly what the agents generate.
+
+import os
+import uuid
+
+from locust import HttpUser, task, between
+
+LOAD_TEST_DIRECTORY = os.getenv('LOAD_TEST_DIRECTORY', '.')
+LOAD_TEST_URL = os.getenv('LOAD_TEST_URL', 'https://example.com')
+
+
+class AgentActionUser(HttpUser):
+    wait_time = between(0.1, 1.0)
+
+    def on_start(self):
+        self.key = f"locust-{uuid.uuid4().hex[:8]}"
+
+    @task(10)
+    def list_directory(self):
+        self.client.post('/agent_action', json={'action': 'list_directory', 'params': {'directory_path': LOAD_TEST_DIRECTORY}},
+                         name='/agent_action list_directory')
+
+    @task(5)
+    def store_and_retrieve(self):
+        self.client.post('/agent_action', json={'action': 'store_data', 'params': {'key': self.key, 'value': 'pro'}},
+                         name='/agent_action store_data')
+        self.client.post('/agent_action', json={'action': 'retrieve_data', 'params': {'key': self.key}},
+                         name='/agent_action retrieve_data')
+
+    @task(2)
+    def fetch_url(self):
+        self.client.post('/agent_action', json={'action': 'fetch_url', 'params': {'url': LOAD_TEST_URL}},
+                         name='/agent_action fetch_url')
+
+    @task(2)
+    def batch(self):
+        actions = [
+            {'action': 'list_directory', 'params': {'directory_path': LOAD_TEST_DIRECTORY}},
+            {'action': 'retrieve_data', 'params': {'key': self.key}},
+            {'action': 'fetch_url', 'params': {'url': LOAD_TEST_URL}},
+        ]
+        self.client.post('/agent_actions', json={'actions': actions}, name='/agent_actions')
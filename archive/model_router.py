@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from jobs import JobCancelled
+from usage_ledger import MODEL_PRICES
+from telemetry import current_span, increment, observe
+
+# Routing configuration (override in the .env file)
+ROUTER_MAX_IN_FLIGHT = int(os.getenv('ROUTER_MAX_IN_FLIGHT', '8'))  # Concurrent calls per model before it counts as overloaded
+ROUTER_MAX_FAILURE_RATE = float(os.getenv('ROUTER_MAX_FAILURE_RATE', '0.5'))  # Recent failure rate that takes a model out of rotation
+ROUTER_COOLDOWN = float(os.getenv('ROUTER_COOLDOWN', '30'))  # Seconds a model is skipped after a rate limit or outage
+ROUTER_EWMA_ALPHA = float(os.getenv('ROUTER_EWMA_ALPHA', '0.2'))  # Weight of the newest latency/failure sample
+ROUTER_MIN_SAMPLES = int(os.getenv('ROUTER_MIN_SAMPLES', '5'))  # Samples needed before latency and failures count
+
+# Task class -> candidate models, selection mode and latency budget (seconds).
+# 'quality' takes the first healthy candidate in order; 'cost' takes the cheapest healthy one.
+# Override with ROUTER_POLICY as JSON, e.g. {"classification": {"models": ["gpt-4o-mini"]}}.
+DEFAULT_POLICY = {
+    'decision': {'models': ['gpt-4o', 'gpt-4o-mini'], 'mode': 'quality', 'latency_budget': 20.0},
+    'vision': {'models': ['gpt-4o', 'gpt-4o-mini'], 'mode': 'quality', 'latency_budget': 30.0},
+    'reflection': {'models': ['gpt-4o-mini', 'gpt-4o'], 'mode': 'cost', 'latency_budget': 30.0},
+    'summarization': {'models': ['gpt-4o-mini', 'gpt-4o'], 'mode': 'cost', 'latency_budget': 30.0},
+    'classification': {'models': ['gpt-4o-mini', 'gpt-4o'], 'mode': 'cost', 'latency_budget': 5.0},
+    'extraction': {'models': ['gpt-4o-mini', 'gpt-4o'], 'mode': 'cost', 'latency_budget': 10.0},
+}
+
+# Errors that mean "try another model" rather than "the request is wrong"
+OVERLOAD_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+OVERLOAD_ERROR_NAMES = {'RateLimitError', 'APITimeoutError', 'APIConnectionError', 'InternalServerError',
+                        'ServiceUnavailableError', 'Timeout', 'ConnectionError', 'ReadTimeout'}
+
+
+def load_policy() -> Dict[str, Dict]:
+    policy = {name: dict(entry) for name, entry in DEFAULT_POLICY.items()}
+    for name, entry in json.loads(os.getenv('ROUTER_POLICY', '{}')).items():
+        policy.setdefault(name, {'models': [], 'mode': 'quality', 'latency_budget': 30.0}).update(entry)
+    return policy
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """True for rate limits, timeouts and server-side failures (SDK or requests errors)."""
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status in OVERLOAD_STATUS_CODES or type(error).__name__ in OVERLOAD_ERROR_NAMES
+
+
+class ModelStats:
+    def __init__(self):
+        self.latency = None  # EWMA of successful call latency in seconds
+        self.failure_rate = 0.0  # EWMA of failures (1) and successes (0)
+        self.samples = 0
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            'latency_ewma': self.latency or 0.0,
+            'failure_rate': self.failure_rate,
+            'samples': self.samples,
+            'in_flight': self.in_flight,
+            'cooling_down': self.cooldown_until > time.monotonic(),
+        }
+
+
+class ModelRouter:
+    """
+    Picks a model per call from the caller's task class. Candidates that are cooling down
+    after a rate limit, failing, saturated with in-flight calls or slower than the class's
+    latency budget are skipped, so routing falls back to the next model under overload.
+    Each decision is logged, counted in gptco_route_total and tagged on the current span.
+    """
+
+    def __init__(self, policy: Optional[Dict[str, Dict]] = None, max_in_flight: int = ROUTER_MAX_IN_FLIGHT):
+        self.policy = policy or load_policy()
+        self.max_in_flight = max_in_flight
+        self.stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, task_class: str, preferred: Optional[str] = None) -> List[str]:
+        entry = self.policy.get(task_class) or self.policy['decision']
+        models = list(entry['models'])
+        if preferred:
+            # An explicitly configured model (e.g. Agent.model) leads its class
+            models = [preferred] + [model for model in models if model != preferred]
+        if entry.get('mode') == 'cost':
+            models.sort(key=lambda model: sum(MODEL_PRICES.get(model, (0.0, 0.0))))
+        return models
+
+    def _skip_reason(self, model: str, latency_budget: float, now: float) -> Optional[str]:
+        stats = self.stats.get(model)
+        if stats is None:
+            return None
+        if stats.cooldown_until > now:
+            return 'cooling_down'
+        if stats.in_flight >= self.max_in_flight:
+            return 'overloaded'
+        if stats.samples >= ROUTER_MIN_SAMPLES:
+            if stats.failure_rate > ROUTER_MAX_FAILURE_RATE:
+                return 'failing'
+            if stats.latency is not None and stats.latency > latency_budget:
+                return 'slow'
+        return None
+
+    def choose(self, task_class: str, preferred: Optional[str] = None, exclude=()) -> Tuple[str, str]:
+        """Returns (model, reason). The reason is 'policy' or why the earlier candidates were skipped."""
+        entry = self.policy.get(task_class) or self.policy['decision']
+        models = [model for model in self.candidates(task_class, preferred) if model not in exclude]
+        if not models:
+            models = self.candidates(task_class, preferred)
+        now = time.monotonic()
+        skipped = []
+        with self._lock:
+            for model in models:
+                reason = self._skip_reason(model, entry.get('latency_budget', 30.0), now)
+                if reason is None:
+                    return model, ('policy' if not skipped and not exclude else f"fallback:{(skipped or ['error'])[0]}")
+                skipped.append(reason)
+        # Everything is unhealthy: use the least loaded candidate rather than failing outright
+        model = min(models, key=lambda name: self.stats[name].in_flight if name in self.stats else 0)
+        return model, 'fallback:all_unhealthy'
+
+    @contextmanager
+    def route(self, task_class: str, preferred: Optional[str] = None, exclude=()):
+        """Chooses a model and records the call's latency and outcome against it."""
+        model, reason = self.choose(task_class, preferred, exclude)
+        logging.info(f"Routed {task_class} call to {model} ({reason})")
+        increment('gptco_route_total', task=task_class, model=model, reason=reason)
+        active = current_span()
+        if active is not None:
+            active.set_attribute('model', model)
+            active.set_attribute('route.task', task_class)
+            active.set_attribute('route.reason', reason)
+        with self._lock:
+            stats = self.stats.setdefault(model, ModelStats())
+            stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            yield model
+        except JobCancelled:
+            # The caller gave up; that says nothing about the model's latency or health
+            self._release(model)
+            raise
+        except BaseException as e:
+            self._record(model, None, e)
+            raise
+        else:
+            latency = time.perf_counter() - started
+            self._record(model, latency, None)
+            observe('gptco_route_latency_seconds', latency, task=task_class, model=model)
+
+    def call(self, task_class: str, func: Callable[[str], object], preferred: Optional[str] = None):
+        """Runs `func(model)`, moving on to the next candidate when a model is overloaded."""
+        tried = []
+        while True:
+            try:
+                with self.route(task_class, preferred, exclude=tuple(tried)) as model:
+                    tried.append(model)
+                    return func(model)
+            except Exception as e:
+                remaining = [name for name in self.candidates(task_class, preferred) if name not in tried]
+                if not is_overload_error(e) or not remaining:
+                    raise
+                logging.warning(f"{tried[-1]} overloaded for {task_class} ({type(e).__name__}); falling back.")
+
+    def _release(self, model: str):
+        with self._lock:
+            self.stats[model].in_flight -= 1
+
+    def _record(self, model: str, latency: Optional[float], error: Optional[BaseException]):
+        with self._lock:
+            stats = self.stats[model]
+            stats.in_flight -= 1
+            stats.samples += 1
+            failed = 1.0 if error is not None else 0.0
+            stats.failure_rate += ROUTER_EWMA_ALPHA * (failed - stats.failure_rate)
+            if latency is not None:
+                stats.latency = latency if stats.latency is None else stats.latency + ROUTER_EWMA_ALPHA * (latency - stats.latency)
+            if error is not None and is_overload_error(error):
+                stats.cooldown_until = time.monotonic() + ROUTER_COOLDOWN
+
+    def metrics(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {model: stats.snapshot() for model, stats in self.stats.items()}
+
+    def gauges(self):
+        gauges = []
+        for model, stats in self.metrics().items():
+            labels = {'model': model}
+            gauges.append(('gptco_model_latency_ewma_seconds', labels, stats['latency_ewma']))
+            gauges.append(('gptco_model_failure_rate', labels, stats['failure_rate']))
+            gauges.append(('gptco_model_in_flight', labels, stats['in_flight']))
+        return gauges
+
+
+router = ModelRouter()
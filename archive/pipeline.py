@@ -0,0 +1,168 @@
+import time
+import logging
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Any
+
+
+class PipelineError(Exception):
+    """Raised when a stage fails after exhausting its retries."""
+
+
+class Stage:
+    """
+    One step of a pipeline. `func` is called with keyword arguments named after `inputs`,
+    which are either pipeline inputs or the names of earlier stages. Cached stages are keyed
+    on `cache_inputs` (default: all inputs), e.g. to key on a digest instead of a large payload.
+    """
+
+    def __init__(self, name: str, func: Callable, inputs: Optional[List[str]] = None, retries: int = 0,
+                 retry_delay: float = 0.5, cache: bool = False, cache_inputs: Optional[List[str]] = None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs or [])
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.cache = cache
+        self.cache_inputs = list(cache_inputs) if cache_inputs is not None else self.inputs
+
+    def cache_key(self, kwargs: Dict[str, Any]):
+        return self.name, repr(sorted((dep, kwargs[dep]) for dep in self.cache_inputs))
+
+
+class PipelineResult:
+    def __init__(self, values: Dict[str, Any], timings: Dict[str, float], attempts: Dict[str, int],
+                 cache_hits: List[str], wall_time: float):
+        self.values = values
+        self.timings = timings  # Seconds spent in each stage (0 for cache hits)
+        self.attempts = attempts
+        self.cache_hits = cache_hits
+        self.wall_time = wall_time
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+class Pipeline:
+    """
+    Small DAG executor: stages whose inputs are ready run concurrently on a shared pool,
+    so wall time follows the critical path instead of the sum of all stages.
+    """
+
+    def __init__(self, stages: List[Stage], max_workers: int = 8, cache_size: int = 256):
+        self.stages = OrderedDict((stage.name, stage) for stage in stages)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline')
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done or name not in self.stages:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a cycle through stage '{name}'.")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return True, self._cache[key]
+        return False, None
+
+    def _cache_put(self, key, value):
+        with self._cache_lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _run_stage(self, stage: Stage, kwargs: Dict):
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                value = stage.func(**kwargs)
+                return value, time.perf_counter() - started, attempt
+            except Exception as e:
+                if attempt > stage.retries:
+                    raise PipelineError(f"Stage '{stage.name}' failed after {attempt} attempt(s): {e}") from e
+                logging.warning(f"Stage '{stage.name}' attempt {attempt} failed: {e}. Retrying.")
+                time.sleep(stage.retry_delay * attempt)
+
+    def run(self, inputs: Dict[str, Any], on_event: Optional[Callable] = None) -> PipelineResult:
+        missing = {dep for stage in self.stages.values() for dep in stage.inputs
+                   if dep not in self.stages and dep not in inputs}
+        if missing:
+            raise ValueError(f"Missing pipeline inputs: {sorted(missing)}")
+
+        started = time.perf_counter()
+        values = dict(inputs)
+        timings, attempts, cache_hits = {}, {}, []
+        pending = dict(self.stages)
+        running = {}
+
+        def emit(status, name, **data):
+            if on_event:
+                on_event('stage', dict(name=name, status=status, **data))
+
+        def launch_ready():
+            for name, stage in list(pending.items()):
+                if not all(dep in values for dep in stage.inputs):
+                    continue
+                del pending[name]
+                kwargs = {dep: values[dep] for dep in stage.inputs}
+                if stage.cache:
+                    key = stage.cache_key(kwargs)
+                    hit, value = self._cache_get(key)
+                    if hit:
+                        values[name] = value
+                        timings[name] = 0.0
+                        attempts[name] = 0
+                        cache_hits.append(name)
+                        emit('cached', name)
+                        return True  # New value available, look for more ready stages
+                emit('running', name)
+                running[self.executor.submit(self._run_stage, stage, kwargs)] = (stage, kwargs)
+            return False
+
+        while launch_ready():
+            pass
+
+        try:
+            while running:
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stage, kwargs = running.pop(future)
+                    value, duration, attempt = future.result()
+                    values[stage.name] = value
+                    timings[stage.name] = duration
+                    attempts[stage.name] = attempt
+                    if stage.cache:
+                        self._cache_put(stage.cache_key(kwargs), value)
+                    emit('done', stage.name, seconds=round(duration, 3))
+                while launch_ready():
+                    pass
+        finally:
+            for future in running:
+                future.cancel()
+
+        wall_time = time.perf_counter() - started
+        logging.info(
+            f"Pipeline finished in {wall_time:.3f}s; stage timings: "
+            + ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.items())
+        )
+        return PipelineResult(values, timings, attempts, cache_hits, wall_time)
@@ -0,0 +1,268 @@
+import io
+import os
+import sys
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from telemetry import increment
+
+# Profiling configuration (override in the .env file)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))  # Fraction of turns profiled (0 = only listed sessions)
+PROFILE_SESSIONS = [s for s in os.getenv('PROFILE_SESSIONS', '').split(',') if s]  # Sessions whose turns are always profiled
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')  # cprofile (deterministic, pstats) or sampling (collapsed stacks)
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))  # Seconds between stack samples
+PROFILE_HISTORY = int(os.getenv('PROFILE_HISTORY', '20'))  # Profiled turns kept for the admin endpoint
+MEMORY_TRACKING = os.getenv('MEMORY_TRACKING', 'false').lower() == 'true'  # tracemalloc diff after every turn
+MEMORY_TRACKING_FRAMES = int(os.getenv('MEMORY_TRACKING_FRAMES', '10'))
+MEMORY_TOP_LINES = int(os.getenv('MEMORY_TOP_LINES', '10'))  # Allocation sites reported per turn
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a helper thread and counts
+    collapsed stacks (root first, `;`-separated), the input format of flamegraph.pl and speedscope.
+    Overhead is independent of how many calls the turn makes.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='turn-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class TurnProfile:
+    def __init__(self, session: str, agent: str, mode: str):
+        self.session = session
+        self.agent = agent
+        self.mode = mode
+        self.started = time.time()
+        self.duration = 0.0
+        self.stats: Optional[pstats.Stats] = None  # cprofile mode
+        self.stacks: Counter = Counter()  # sampling mode
+
+    def summary(self) -> Dict:
+        return {'session': self.session, 'agent': self.agent, 'mode': self.mode,
+                'started': self.started, 'duration': round(self.duration, 4),
+                'samples': sum(self.stacks.values()) if self.mode == 'sampling' else None}
+
+
+class MemoryTracker:
+    """
+    Takes a tracemalloc snapshot after each turn and diffs it against the previous one, together with
+    the sizes of watched structures (agent memories, mailboxes), so growth shows up per turn.
+    """
+
+    def __init__(self, frames: int = MEMORY_TRACKING_FRAMES):
+        self.frames = frames
+        self.watched: Dict[str, Callable[[], int]] = {}
+        self.history = deque(maxlen=PROFILE_HISTORY)
+        self._previous = None
+        self._previous_sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        with self._lock:
+            self._previous = None
+        tracemalloc.stop()
+
+    def watch(self, name: str, size: Callable[[], int]):
+        """Adds a structure to report on after every turn; `size` returns its current item count."""
+        self.watched[name] = size
+
+    def record(self, session: str, agent: str) -> Optional[Dict]:
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        sizes = {}
+        for name, size in self.watched.items():
+            try:
+                sizes[name] = size()
+            except Exception as e:
+                logging.warning(f"Memory watch '{name}' failed. Error: {str(e)}")
+        with self._lock:
+            previous, self._previous = self._previous, snapshot
+            previous_sizes, self._previous_sizes = self._previous_sizes, sizes
+        current, peak = tracemalloc.get_traced_memory()
+        entry = {
+            'session': session,
+            'agent': agent,
+            'time': time.time(),
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'structures': {name: {'size': value, 'delta': value - previous_sizes.get(name, value)}
+                           for name, value in sizes.items()},
+            'top_growth': [],
+        }
+        if previous is not None:
+            for stat in snapshot.compare_to(previous, 'traceback')[:MEMORY_TOP_LINES]:
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                entry['top_growth'].append({
+                    'site': f"{frame.filename}:{frame.lineno}",
+                    'size_diff': stat.size_diff,
+                    'count_diff': stat.count_diff,
+                    'traceback': [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+                })
+        self.history.append(entry)
+        return entry
+
+
+class TurnProfiler:
+    """
+    Decides per turn whether to profile (listed sessions always, others at `sample_rate`), keeps the
+    last `history` profiles, and renders them as pstats text or collapsed stacks for the admin endpoint.
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, sessions: List[str] = PROFILE_SESSIONS,
+                 mode: str = PROFILE_MODE, history: int = PROFILE_HISTORY):
+        self.sample_rate = sample_rate
+        self.sessions = set(sessions)
+        self.mode = mode
+        self.profiles = deque(maxlen=history)
+        self.memory = MemoryTracker()
+        self._lock = threading.Lock()
+        if MEMORY_TRACKING:
+            self.memory.start()
+
+    def configure(self, sample_rate: float = None, mode: str = None, session: str = None, enabled: bool = True):
+        """Changes profiling at runtime: the sample rate, the mode, or whether one session is always profiled."""
+        if mode is not None:
+            if mode not in ('cprofile', 'sampling'):
+                raise ValueError(f"Unknown profiling mode '{mode}'.")
+            self.mode = mode
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if session is not None:
+            with self._lock:
+                if enabled:
+                    self.sessions.add(session)
+                else:
+                    self.sessions.discard(session)
+
+    def settings(self) -> Dict:
+        return {'sample_rate': self.sample_rate, 'mode': self.mode, 'sessions': sorted(self.sessions),
+                'memory_tracking': self.memory.enabled, 'profiles': len(self.profiles)}
+
+    def should_profile(self, session: str) -> bool:
+        return session in self.sessions or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def turn(self, session: str, agent: str):
+        """Wraps one turn; profiles it when selected and records the memory diff when tracking is on."""
+        if not self.should_profile(session):
+            try:
+                yield None
+            finally:
+                self.memory.record(session, agent)
+            return
+        profile = TurnProfile(session, agent, self.mode)
+        if profile.mode == 'sampling':
+            collector = SamplingProfiler(threading.get_ident())
+        else:
+            collector = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            # Another profiler (a debugger, or a nested turn) may already hold the thread's hook
+            if profile.mode == 'cprofile':
+                collector.enable()
+            else:
+                collector.start()
+        except ValueError as e:
+            logging.warning(f"Turn profiling skipped. Error: {str(e)}")
+            try:
+                yield None
+            finally:
+                self.memory.record(session, agent)
+            return
+        try:
+            yield profile
+        finally:
+            if profile.mode == 'cprofile':
+                collector.disable()
+                profile.stats = pstats.Stats(collector)
+            else:
+                collector.stop()
+                profile.stacks = collector.stacks
+            profile.duration = time.perf_counter() - started
+            with self._lock:
+                self.profiles.append(profile)
+            increment('gptco_profiled_turns_total', mode=profile.mode)
+            self.memory.record(session, agent)
+
+    def recent(self, last: int = None, session: str = None) -> List[TurnProfile]:
+        with self._lock:
+            profiles = [p for p in self.profiles if session is None or p.session == session]
+        return profiles[-last:] if last else profiles
+
+    def render_pstats(self, profiles: List[TurnProfile], sort: str = 'cumulative', limit: int = 50) -> str:
+        """Merged pstats report of the cProfile-mode turns."""
+        recorded = [profile.stats for profile in profiles if profile.stats is not None]
+        if not recorded:
+            return "No cProfile turns recorded.\n"
+        output = io.StringIO()
+        stats = pstats.Stats(stream=output)
+        for profile_stats in recorded:
+            stats.add(profile_stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def render_collapsed(self, profiles: List[TurnProfile]) -> str:
+        """Merged collapsed stacks, one `frame;frame;frame count` line per stack."""
+        stacks = Counter()
+        for profile in profiles:
+            if profile.stacks:
+                stacks.update(profile.stacks)
+            elif profile.stats is not None:
+                # cProfile keeps caller -> callee edges only: emit them as two-frame stacks weighted by inline time (us)
+                for (filename, line, name), (_, _, inline, _, callers) in profile.stats.stats.items():
+                    callee = f"{name} ({os.path.basename(filename)}:{line})"
+                    for (c_file, c_line, c_name), caller_stats in callers.items():
+                        share = inline * (caller_stats[0] / max(sum(c[0] for c in callers.values()), 1))
+                        stacks[f"{c_name} ({os.path.basename(c_file)}:{c_line});{callee}"] += int(share * 1e6)
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common() if count)
+
+
+profiler = TurnProfiler()
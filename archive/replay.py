@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Record/replay configuration (override in the .env file)
+REPLAY_MODE = os.getenv('REPLAY_MODE', 'off')  # off | record | replay
+REPLAY_FIXTURE = os.getenv('REPLAY_FIXTURE', 'session_fixture.jsonl')
+REPLAY_STRICT = os.getenv('REPLAY_STRICT', 'false').lower() == 'true'  # Fail on requests that were not recorded
+REPLAY_SPEED = float(os.getenv('REPLAY_SPEED', '0'))  # 0 replays at full speed, 1.0 at recorded latency
+
+# SDK attributes that lead to a recorded `create` call
+SDK_NAMESPACES = {'chat', 'completions', 'embeddings', 'images', 'Completion', 'ChatCompletion', 'Embedding', 'Image'}
+
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode when a request has no recorded interaction."""
+
+
+class ReplayedError(Exception):
+    """An API error captured while recording, raised again on replay."""
+
+    def __init__(self, error_type: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+        self.status_code = status_code
+
+
+class ReplayObject(dict):
+    """Recorded response: a dict that also allows attribute access, like the SDK objects it stands in for."""
+
+    def __getattr__(self, name):
+        try:
+            return wrap(self[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key):
+        return wrap(dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        return wrap(dict.get(self, key, default))
+
+
+def wrap(value):
+    if isinstance(value, dict) and not isinstance(value, ReplayObject):
+        return ReplayObject(value)
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    return value
+
+
+def to_plain(value):
+    """Converts SDK responses (pydantic models, OpenAIObject dicts) into JSON-serializable data."""
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def request_key(kind: str, request: Dict) -> str:
+    canonical = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(f"{kind}:{canonical}".encode('utf-8')).hexdigest()[:16]
+
+
+class Recorder:
+    """
+    Captures LLM, embedding, HTTP and SMTP interactions into a JSONL fixture (record mode)
+    and serves them back without touching the network (replay mode).
+    Replayed requests are matched by a hash of the request; when concurrency reorders
+    calls so that no exact match exists, the next unused interaction of the same kind is
+    used unless `strict` is set.
+    """
+
+    def __init__(self, path: str = REPLAY_FIXTURE, mode: str = REPLAY_MODE, strict: bool = REPLAY_STRICT,
+                 speed: float = REPLAY_SPEED):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown replay mode '{mode}'.")
+        self.path = path
+        self.mode = mode
+        self.strict = strict
+        self.speed = speed
+        self.outbox = []  # Emails "sent" during replay
+        self.fallbacks = 0  # Replays served by kind order instead of an exact request match
+        self._lock = threading.Lock()
+        self._installed = {}  # (module name, attribute) -> original object
+        if mode == 'record':
+            self._file = open(path, 'w')
+        else:
+            self._load(path)
+
+    def _load(self, path: str):
+        with open(path) as f:
+            self._entries = [json.loads(line) for line in f if line.strip()]
+        self._by_key = {}
+        self._by_kind = {}
+        for index, entry in enumerate(self._entries):
+            self._by_key.setdefault((entry['kind'], entry['key']), deque()).append(index)
+            self._by_kind.setdefault(entry['kind'], deque()).append(index)
+        self._used = set()
+        logging.info(f"Loaded {len(self._entries)} recorded interactions from {path}")
+
+    def _take(self, kind: str, key: str) -> Dict:
+        with self._lock:
+            for queue in (self._by_key.get((kind, key)), None if self.strict else self._by_kind.get(kind)):
+                while queue:
+                    index = queue.popleft()
+                    if index not in self._used:
+                        self._used.add(index)
+                        if queue is not self._by_key.get((kind, key)):
+                            self.fallbacks += 1
+                        return self._entries[index]
+        raise ReplayMiss(f"No recorded {kind} interaction for request {key}.")
+
+    def _write(self, entry: Dict):
+        with self._lock:
+            self._file.write(json.dumps(entry, default=str) + "\n")
+            self._file.flush()
+
+    def call(self, kind: str, request: Dict, live: Callable, stream: bool = False):
+        """Runs `live()` and records it, or replays the recorded result for `request`."""
+        key = request_key(kind, request)
+        if self.mode == 'replay':
+            entry = self._take(kind, key)
+            if self.speed:
+                time.sleep(entry.get('elapsed', 0.0) / self.speed)
+            if 'error' in entry:
+                error = entry['error']
+                raise ReplayedError(error['type'], error['message'], error.get('status_code'))
+            if 'stream' in entry:
+                return ReplayStream(entry['stream'])
+            return wrap(entry['response'])
+
+        started = time.perf_counter()
+        entry = {'kind': kind, 'key': key, 'request': request}
+        try:
+            result = live()
+        except Exception as e:
+            status = getattr(e, 'status_code', None) or getattr(getattr(e, 'response', None), 'status_code', None)
+            entry.update(elapsed=time.perf_counter() - started,
+                         error={'type': type(e).__name__, 'message': str(e), 'status_code': status})
+            self._write(entry)
+            raise
+        if stream:
+            return RecordingStream(result, self, entry, started)
+        entry.update(elapsed=time.perf_counter() - started, response=to_plain(result))
+        self._write(entry)
+        return result
+
+    def install(self, module):
+        """Routes the module's `openai`, `requests` and `smtplib` globals through this recorder."""
+        for name, proxy in (('openai', SDKProxy), ('requests', RequestsProxy), ('smtplib', SMTPProxy)):
+            if hasattr(module, name) and (module.__name__, name) not in self._installed:
+                original = getattr(module, name)
+                self._installed[(module.__name__, name)] = (module, original)
+                setattr(module, name, proxy(self, original))
+
+    def uninstall(self):
+        for (_, name), (module, original) in self._installed.items():
+            setattr(module, name, original)
+        self._installed.clear()
+
+    def close(self):
+        self.uninstall()
+        if self.mode == 'record':
+            self._file.close()
+
+
+class ReplayStream:
+    def __init__(self, chunks):
+        self._chunks = iter(wrap(chunks))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks = iter(())
+
+
+class RecordingStream:
+    """Passes a live stream through and records its chunks once it is exhausted or closed."""
+
+    def __init__(self, stream, recorder: Recorder, entry: Dict, started: float):
+        self._stream = stream
+        self._iterator = iter(stream)
+        self._recorder = recorder
+        self._entry = entry
+        self._started = started
+        self._chunks = []
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._finish()
+            raise
+        self._chunks.append(to_plain(chunk))
+        return chunk
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._entry.update(elapsed=time.perf_counter() - self._started, stream=self._chunks)
+            self._recorder._write(self._entry)
+
+    def close(self):
+        self._finish()
+        close = getattr(self._stream, 'close', None)
+        if close:
+            close()
+
+
+class SDKProxy:
+    """Stands in for the `openai` module; every `...create(**kwargs)` call is recorded or replayed."""
+
+    def __init__(self, recorder: Recorder, real, path=()):
+        object.__setattr__(self, '_recorder', recorder)
+        object.__setattr__(self, '_real', real)
+        object.__setattr__(self, '_path', path)
+
+    def __getattr__(self, name):
+        path = self._path + (name,)
+        if name == 'create' and self._path:
+            return lambda **kwargs: self._create(path, kwargs)
+        if not self._path and name not in SDK_NAMESPACES:
+            return getattr(self._real, name)
+        return SDKProxy(self._recorder, self._real, path)
+
+    def __setattr__(self, name, value):
+        setattr(self._real, name, value)
+
+    def _create(self, path, kwargs):
+        kind = 'embedding' if any('mbedding' in part for part in path) else 'image' if any(
+            part in ('Image', 'images') for part in path) else 'llm'
+
+        def live():
+            target = self._real
+            for part in path:
+                target = getattr(target, part)
+            return target(**kwargs)
+
+        request = dict(kwargs, endpoint='.'.join(path[:-1]))
+        return self._recorder.call(kind, request, live, stream=bool(kwargs.get('stream')))
+
+
+class ReplayHTTPResponse:
+    def __init__(self, recorded: Dict, requests_module):
+        self.status_code = recorded['status_code']
+        self.text = recorded['text']
+        self.content = self.text.encode('utf-8')
+        self.headers = recorded.get('headers', {})
+        self.url = recorded.get('url')
+        self._requests = requests_module
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise self._requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class RequestsProxy:
+    """Stands in for `requests`; GET/POST calls are recorded or replayed (headers are never stored)."""
+
+    def __init__(self, recorder: Recorder, real):
+        self._recorder = recorder
+        self._real = real
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        request = {'method': method, 'url': url, 'params': kwargs.get('params'), 'json': kwargs.get('json'),
+                   'data': kwargs.get('data')}
+        if self._recorder.mode == 'replay':
+            try:
+                return ReplayHTTPResponse(self._recorder.call('http', request, None), self._real)
+            except (ReplayedError, ReplayMiss) as e:
+                # Offline there is no network: unrecorded or failed requests surface as request errors
+                raise self._real.RequestException(str(e)) from None
+
+        # Record mode: hand back the live response and store a plain copy of it
+        holder = {}
+
+        def live():
+            response = holder['response'] = self._real.request(method, url, **kwargs)
+            return {'status_code': response.status_code, 'text': response.text,
+                    'headers': dict(response.headers), 'url': response.url}
+
+        self._recorder.call('http', request, live)
+        return holder['response']
+
+
+class SMTPProxy:
+    """Stands in for `smtplib`; sent mail is recorded, and nothing leaves the process on replay."""
+
+    def __init__(self, recorder: Recorder, real):
+        self._recorder = recorder
+        self._real = real
+
+    def __getattr__(self, name):
+        if name in ('SMTP', 'SMTP_SSL'):
+            return lambda *args, **kwargs: RecordingSMTP(self._recorder, self._real, name, args, kwargs)
+        return getattr(self._real, name)
+
+
+class RecordingSMTP:
+    def __init__(self, recorder: Recorder, real, class_name: str, args, kwargs):
+        self._recorder = recorder
+        self._server = getattr(real, class_name)(*args, **kwargs) if recorder.mode == 'record' else None
+
+    def __getattr__(self, name):
+        if self._server is not None:
+            return getattr(self._server, name)
+        # Replay: connection management is a no-op
+        return lambda *args, **kwargs: None
+
+    def sendmail(self, from_addr, to_addrs, msg, *args, **kwargs):
+        request = {'from': from_addr, 'to': to_addrs, 'msg': msg}
+        if self._recorder.mode == 'replay':
+            self._recorder.outbox.append(request)
+            return {}
+        return self._recorder.call('smtp', request, lambda: self._server.sendmail(from_addr, to_addrs, msg, *args, **kwargs))
+
+    def send_message(self, msg, from_addr=None, to_addrs=None, *args, **kwargs):
+        return self.sendmail(from_addr or msg['From'], to_addrs or msg['To'], msg.as_string())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+
+
+_recorder = None
+
+
+def get_recorder() -> Optional[Recorder]:
+    """The process-wide recorder configured by REPLAY_MODE, or None when record/replay is off."""
+    global _recorder
+    if _recorder is None and REPLAY_MODE in ('record', 'replay'):
+        _recorder = Recorder()
+        logging.info(f"Record/replay enabled: {REPLAY_MODE} {REPLAY_FIXTURE}")
+    return _recorder
+
+
+def install_from_env(module):
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.install(module)
+    return recorder
@@ -0,0 +1,63 @@
+import os
+import re
+from typing import Dict, Iterable, List
+
+from telemetry import increment
+
+# Retrieval configuration (override in the .env file)
+RETRIEVAL_ENABLED = os.getenv('RETRIEVAL_ENABLED', 'true').lower() == 'true'
+RETRIEVAL_K = int(os.getenv('RETRIEVAL_K', '5'))  # Memories fetched from the FAISS index per turn
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv('RETRIEVAL_TOKEN_BUDGET', '500'))  # Prompt tokens spent on retrieved memories
+RETRIEVAL_TIMEOUT = float(os.getenv('RETRIEVAL_TIMEOUT', '2.0'))  # Seconds the turn waits for retrieval once the prompt is ready
+RETRIEVAL_WORKERS = int(os.getenv('RETRIEVAL_WORKERS', '8'))
+
+_MIN_OVERLAP_CHARS = 20  # Shorter strings are not treated as containing each other
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), good enough for budgeting without a tokenizer."""
+    return len(text) // 4 + 1
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def latest_user_message(messages: List[Dict]) -> str:
+    for message in reversed(messages):
+        if message.get('role') == 'user' and message.get('content'):
+            return message['content']
+    return ''
+
+
+def select_memories(candidates: Iterable[str], context: Iterable[str], budget_tokens: int = RETRIEVAL_TOKEN_BUDGET,
+                    agent: str = None) -> List[str]:
+    """
+    Keeps retrieved memories that add something to the prompt: exact and containment duplicates of
+    text already in context (or of each other) are dropped, and the rest are taken in rank order
+    until the token budget is spent. Outcomes are counted in gptco_retrieval_results_total.
+    """
+    seen = [_normalize(text) for text in context if text]
+    selected = []
+    spent = 0
+    for candidate in candidates:
+        normalized = _normalize(candidate)
+        duplicate = not normalized or any(
+            normalized == existing
+            or (len(normalized) >= _MIN_OVERLAP_CHARS and normalized in existing)
+            or (len(existing) >= _MIN_OVERLAP_CHARS and existing in normalized)
+            for existing in seen
+        )
+        if duplicate:
+            increment('gptco_retrieval_results_total', outcome='duplicate', agent=agent)
+            continue
+        cost = estimate_tokens(candidate)
+        if spent + cost > budget_tokens:
+            increment('gptco_retrieval_results_total', outcome='over_budget', agent=agent)
+            continue
+        selected.append(candidate)
+        seen.append(normalized)
+        spent += cost
+        increment('gptco_retrieval_results_total', outcome='inserted', agent=agent)
+    increment('gptco_retrieval_turns_total', hit='true' if selected else 'false', agent=agent)
+    return selected
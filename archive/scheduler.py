@@ -0,0 +1,193 @@
+import os
+import time
+import logging
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# Priority classes, highest first
+INTERACTIVE = 0  # A user is waiting on this turn
+TOOL_CONTINUATION = 1  # Follow-up model calls after a tool result
+REFLECTION = 2  # Self-reflection, memory consolidation, summaries
+BATCH = 3  # Background loops such as screenshot analysis
+
+PRIORITY_NAMES = {
+    INTERACTIVE: 'interactive',
+    TOOL_CONTINUATION: 'tool_continuation',
+    REFLECTION: 'reflection',
+    BATCH: 'batch',
+}
+
+# Concurrent tasks allowed per class (override in the .env file)
+DEFAULT_CLASS_LIMITS = {
+    INTERACTIVE: int(os.getenv('SCHEDULER_INTERACTIVE_LIMIT', '8')),
+    TOOL_CONTINUATION: int(os.getenv('SCHEDULER_TOOL_CONTINUATION_LIMIT', '8')),
+    REFLECTION: int(os.getenv('SCHEDULER_REFLECTION_LIMIT', '2')),
+    BATCH: int(os.getenv('SCHEDULER_BATCH_LIMIT', '1')),
+}
+
+_WAIT_SAMPLES = 1000  # Recent wait times kept per class for percentiles
+
+
+class _Task:
+    def __init__(self, func, args, kwargs, priority, session, tenant):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.session = session
+        self.tenant = tenant
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        # Runs in the submitter's context so trace spans and session state carry over
+        self.context = contextvars.copy_context()
+
+
+class _FairQueue:
+    """
+    Two-level weighted fair queue for one priority class: tenants share the class by
+    weight, and sessions share their tenant by weight. Each tenant and session carries
+    a virtual clock that advances by 1/weight per task served; the lowest clock is served
+    next. Flows that were idle rejoin at the current minimum so they cannot bank credit.
+    """
+
+    def __init__(self):
+        self.tenants = {}  # tenant -> {'clock': float, 'sessions': {session -> {'clock', 'tasks'}}}
+        self.depth = 0
+
+    @staticmethod
+    def _min_clock(flows):
+        active = [flow['clock'] for flow in flows.values() if flow.get('depth', 0) > 0]
+        return min(active) if active else 0.0
+
+    def push(self, task: _Task):
+        tenant = self.tenants.get(task.tenant)
+        if tenant is None or tenant['depth'] == 0:
+            floor = self._min_clock(self.tenants)
+            tenant = self.tenants.setdefault(task.tenant, {'clock': floor, 'depth': 0, 'sessions': {}})
+            tenant['clock'] = max(tenant['clock'], floor)
+        session = tenant['sessions'].get(task.session)
+        if session is None or session['depth'] == 0:
+            floor = self._min_clock(tenant['sessions'])
+            session = tenant['sessions'].setdefault(task.session, {'clock': floor, 'depth': 0, 'tasks': deque()})
+            session['clock'] = max(session['clock'], floor)
+        session['tasks'].append(task)
+        session['depth'] += 1
+        tenant['depth'] += 1
+        self.depth += 1
+
+    def pop(self, tenant_weights: Dict[str, float], session_weights: Dict[str, float]) -> _Task:
+        tenant_name, tenant = min(
+            ((name, flow) for name, flow in self.tenants.items() if flow['depth'] > 0),
+            key=lambda item: item[1]['clock'],
+        )
+        session_name, session = min(
+            ((name, flow) for name, flow in tenant['sessions'].items() if flow['depth'] > 0),
+            key=lambda item: item[1]['clock'],
+        )
+        task = session['tasks'].popleft()
+        session['depth'] -= 1
+        tenant['depth'] -= 1
+        self.depth -= 1
+        tenant['clock'] += 1.0 / tenant_weights.get(tenant_name, 1.0)
+        session['clock'] += 1.0 / session_weights.get(session_name, 1.0)
+        # Forget idle sessions so long-running processes do not accumulate them
+        if session['depth'] == 0:
+            del tenant['sessions'][session_name]
+        return task
+
+
+class Scheduler:
+    """
+    Admits agent work by priority class with per-class concurrency limits and
+    weighted fair queuing across tenants and sessions inside each class.
+    Background classes are capped, so interactive turns always find a free slot.
+    """
+
+    def __init__(self, class_limits: Optional[Dict[int, int]] = None,
+                 tenant_weights: Optional[Dict[str, float]] = None,
+                 session_weights: Optional[Dict[str, float]] = None):
+        self.class_limits = dict(DEFAULT_CLASS_LIMITS)
+        self.class_limits.update(class_limits or {})
+        self.tenant_weights = dict(tenant_weights or {})
+        self.session_weights = dict(session_weights or {})
+        self.queues = {priority: _FairQueue() for priority in self.class_limits}
+        self.running = {priority: 0 for priority in self.class_limits}
+        self.completed = {priority: 0 for priority in self.class_limits}
+        self.wait_times = {priority: deque(maxlen=_WAIT_SAMPLES) for priority in self.class_limits}
+        self.executor = ThreadPoolExecutor(max_workers=sum(self.class_limits.values()), thread_name_prefix='scheduler')
+        self._condition = threading.Condition()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='scheduler-dispatch', daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, func: Callable, *args, priority: int = INTERACTIVE, session: str = 'default',
+               tenant: str = 'default', **kwargs) -> Future:
+        """Queues `func(*args, **kwargs)` and returns a Future for its result."""
+        task = _Task(func, args, kwargs, priority, session, tenant)
+        with self._condition:
+            self.queues[priority].push(task)
+            self._condition.notify()
+        return task.future
+
+    def run(self, func: Callable, *args, priority: int = INTERACTIVE, session: str = 'default',
+            tenant: str = 'default', **kwargs):
+        """Submits and waits for the result."""
+        return self.submit(func, *args, priority=priority, session=session, tenant=tenant, **kwargs).result()
+
+    def _next_task(self) -> Optional[_Task]:
+        for priority in sorted(self.queues):
+            if self.queues[priority].depth and self.running[priority] < self.class_limits[priority]:
+                return self.queues[priority].pop(self.tenant_weights, self.session_weights)
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                task = self._next_task()
+                while task is None:
+                    self._condition.wait()
+                    task = self._next_task()
+                self.running[task.priority] += 1
+                self.wait_times[task.priority].append(time.perf_counter() - task.enqueued_at)
+            self.executor.submit(self._execute, task)
+
+    def _execute(self, task: _Task):
+        if task.future.set_running_or_notify_cancel():
+            try:
+                task.future.set_result(task.context.run(task.func, *task.args, **task.kwargs))
+            except BaseException as e:
+                task.future.set_exception(e)
+        with self._condition:
+            self.running[task.priority] -= 1
+            self.completed[task.priority] += 1
+            self._condition.notify()
+
+    def metrics(self) -> Dict:
+        """Queue depth, running tasks and wait-time percentiles (seconds) per priority class."""
+        with self._condition:
+            snapshot = {}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self.wait_times[priority])
+
+                def percentile(fraction):
+                    return waits[min(len(waits) - 1, int(fraction * len(waits)))] if waits else 0.0
+
+                snapshot[name] = {
+                    'queue_depth': self.queues[priority].depth,
+                    'running': self.running[priority],
+                    'limit': self.class_limits[priority],
+                    'completed': self.completed[priority],
+                    'wait_p50': percentile(0.50),
+                    'wait_p99': percentile(0.99),
+                    'wait_max': waits[-1] if waits else 0.0,
+                }
+            return snapshot
+
+    def log_metrics(self):
+        for name, stats in self.metrics().items():
+            logging.info(
+                f"Scheduler {name}: depth={stats['queue_depth']} running={stats['running']}/{stats['limit']} "
+                f"wait_p50={stats['wait_p50']:.3f}s wait_p99={stats['wait_p99']:.3f}s"
+            )
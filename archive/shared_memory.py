@@ -0,0 +1,334 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from lazy_import import LazyModule
+
+faiss = LazyModule('faiss')
+np = LazyModule('numpy')
+
+# Shared memory configuration (override in the .env file)
+SHARED_MEMORY_FILE = os.getenv('SHARED_MEMORY_FILE', 'shared_memory.jsonl')  # Append-only log of entries and their vectors
+SHARED_MEMORY_VISIBILITY = os.getenv('SHARED_MEMORY_VISIBILITY', 'private')  # Default for new entries: private or public
+SHARED_MEMORY_READ_ALL = [name for name in os.getenv('SHARED_MEMORY_READ_ALL', 'CEO Agent,Supervisor Agent').split(',') if name]
+SHARED_MEMORY_OVERFETCH = int(os.getenv('SHARED_MEMORY_OVERFETCH', '4'))  # Candidates per result fetched before visibility filtering
+
+VISIBILITIES = ('private', 'public')
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def _encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode('ascii')
+
+
+def _decode_vector(data: str):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+class SharedMemory:
+    """
+    One long-term memory for the whole company. Each distinct text is embedded and stored once,
+    in a single FAISS index; every entry records the agents that own it and a visibility
+    (`private`: owners only, `public`: every agent). Agents search through a filtered view, and
+    agents in SHARED_MEMORY_READ_ALL see everything. Entries and their vectors are appended to
+    SHARED_MEMORY_FILE, so a restart rebuilds the index without calling the embeddings API.
+    An entry may name its `source` (e.g. the ingested file); it is kept out of the content hash,
+    so the same text from two sources is stored once, and is shown in front of search results.
+
+    `embed(texts, agent)` returns one vector per text; it is called with batches, never per entry.
+    """
+
+    def __init__(self, embed: Callable[[List[str], Optional[str]], object], path: str = SHARED_MEMORY_FILE,
+                 read_all: Iterable[str] = SHARED_MEMORY_READ_ALL):
+        self.embed = embed
+        self.path = path
+        self.read_all = set(read_all)
+        self.index = None
+        self.texts: List[str] = []
+        self.owners: List[set] = []
+        self.visibility: List[str] = []
+        self.sources: List[Optional[str]] = []
+        self.by_hash: Dict[str, int] = {}
+        self._pending: List[tuple] = []  # (text, owner, visibility) imported from legacy per-agent files
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._file = None
+        self._offset = 0  # Bytes of the log applied so far
+        # Set when another process owns the log (agent_bus workers): writes are handed to
+        # `writer(texts, owner, visibility, readers, sources)` and the index catches up by reading the log
+        self.writer: Optional[Callable] = None
+
+    # --- Loading and persistence ----------------------------------------------------------
+
+    def _ensure_loaded(self):
+        # With a writer set another process appends to the log, so every use catches up with its new lines
+        if self._loaded and self.writer is None:
+            return
+        with self._lock:
+            if self._loaded and self.writer is None:
+                return
+            first = not self._loaded
+            added = self._read_log()
+            if first and added:
+                logging.info(f"Loaded {added} shared memory entries from {self.path}")
+            self._loaded = True
+
+    def _read_log(self) -> int:
+        """Applies the log's complete lines past the last read; returns how many entries were added."""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # A line still being written is read once it is complete
+        self._offset += end
+        vectors = []
+        for line in data[:end].decode('utf-8').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.warning(f"Skipping unreadable shared memory line in {self.path}")
+                continue
+            entry_id = self.by_hash.get(record['hash'])
+            if entry_id is None:
+                if 'vector' not in record:
+                    continue
+                vectors.append(_decode_vector(record['vector']))
+                self._append_entry(record['hash'], record['text'], record['owner'], record['visibility'],
+                                   record.get('source'))
+            else:
+                self._merge_entry(entry_id, record.get('owner'), record.get('visibility'))
+        if vectors:
+            if self.index is None:
+                self.index = faiss.IndexFlatL2(len(vectors[0]))
+            self.index.add(np.vstack(vectors))
+        return len(vectors)
+
+    def _write(self, records: List[Dict]):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a')
+        self._file.write(''.join(json.dumps(record) + "\n" for record in records))
+        self._file.flush()
+
+    def _append_entry(self, digest: str, text: str, owner: str, visibility: str, source: Optional[str] = None) -> int:
+        entry_id = len(self.texts)
+        self.by_hash[digest] = entry_id
+        self.texts.append(text)
+        self.owners.append({owner} if owner else set())
+        self.visibility.append(visibility)
+        self.sources.append(source)
+        return entry_id
+
+    def _render(self, entry_id: int) -> str:
+        source = self.sources[entry_id]
+        return f"[{source}] {self.texts[entry_id]}" if source else self.texts[entry_id]
+
+    def _merge_entry(self, entry_id: int, owner: Optional[str], visibility: Optional[str]) -> bool:
+        """Adds an owner or widens visibility; returns True when the entry changed."""
+        changed = False
+        if owner and owner not in self.owners[entry_id]:
+            self.owners[entry_id].add(owner)
+            changed = True
+        if visibility == 'public' and self.visibility[entry_id] != 'public':
+            self.visibility[entry_id] = 'public'
+            changed = True
+        return changed
+
+    # --- Writing --------------------------------------------------------------------------
+
+    def add(self, text: str, owner: str, visibility: str = SHARED_MEMORY_VISIBILITY, readers: Iterable[str] = ()):
+        """Stores `text` for `owner` (and `readers`, e.g. the other side of a message); embeds only unseen text."""
+        self.add_many([text], owner, visibility, readers)
+
+    def add_many(self, texts: List[str], owner: str, visibility: str = SHARED_MEMORY_VISIBILITY,
+                 readers: Iterable[str] = (), embed: Optional[Callable] = None,
+                 sources: Optional[List[Optional[str]]] = None) -> int:
+        """
+        Stores a batch with one embedding call for its unseen texts and one index add; returns how
+        many entries were new. `embed` replaces the store's embedder for this call (e.g. rate-limited);
+        `sources` gives each text's source, recorded when the text is first stored.
+        """
+        if visibility not in VISIBILITIES:
+            raise ValueError(f"Unknown visibility '{visibility}'.")
+        if self.writer is not None:
+            self.writer(list(texts), owner, visibility, list(readers), sources)
+            return 0
+        self.load()
+        owners = [owner] + [reader for reader in readers if reader != owner]
+        with self._lock:
+            new = {}
+            records = []
+            for text, source in zip(texts, sources or [None] * len(texts)):
+                digest = content_hash(text)
+                entry_id = self.by_hash.get(digest)
+                if entry_id is None:
+                    new.setdefault(digest, (text, source))
+                    continue
+                for name in owners:
+                    if self._merge_entry(entry_id, name, visibility):
+                        records.append({'hash': digest, 'owner': name, 'visibility': self.visibility[entry_id]})
+            if records:
+                self._write(records)
+        if not new:
+            return 0
+        # The embedding call runs outside the lock; another thread may store the same text meanwhile
+        vectors = (embed or self.embed)([text for text, _ in new.values()], owner)
+        with self._lock:
+            records = []
+            added = []
+            for (digest, (text, source)), vector in zip(new.items(), vectors):
+                entry_id = self.by_hash.get(digest)
+                if entry_id is None:
+                    entry_id = self._append_entry(digest, text, owner, visibility, source)
+                    record = {'hash': digest, 'text': text, 'owner': owner, 'visibility': visibility,
+                              'vector': _encode_vector(vector)}
+                    if source:
+                        record['source'] = source
+                    records.append(record)
+                    added.append(vector)
+                for name in owners:
+                    if self._merge_entry(entry_id, name, visibility):
+                        records.append({'hash': digest, 'owner': name, 'visibility': self.visibility[entry_id]})
+            if added:
+                matrix = np.asarray(added, dtype=np.float32)
+                if self.index is None:
+                    self.index = faiss.IndexFlatL2(matrix.shape[1])
+                self.index.add(matrix)
+            self._write(records)
+        return len(added)
+
+    def import_texts(self, texts: List[str], owner: str, visibility: str = SHARED_MEMORY_VISIBILITY):
+        """Queues texts from a legacy per-agent memory file; unseen ones are embedded in one batch on first use."""
+        with self._lock:
+            self._pending.extend((text, owner, visibility) for text in texts)
+
+    def _embed_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        by_owner: Dict[tuple, List[str]] = {}
+        for text, owner, visibility in pending:
+            by_owner.setdefault((owner, visibility), []).append(text)
+        groups = list(by_owner.items())
+        for done, ((owner, visibility), texts) in enumerate(groups):
+            try:
+                self.add_many(texts, owner, visibility)
+            except Exception:
+                # Queue this batch and the ones not tried yet again, so a failed embedding call loses nothing
+                with self._lock:
+                    self._pending[:0] = [(text, *key) for key, batch in groups[done:] for text in batch]
+                raise
+
+    # --- Searching ------------------------------------------------------------------------
+
+    def can_read(self, entry_id: int, agent: Optional[str]) -> bool:
+        return (agent is None or agent in self.read_all or self.visibility[entry_id] == 'public'
+                or agent in self.owners[entry_id])
+
+    def _search(self, vectors, k: int, agent: Optional[str], owners: Optional[set] = None) -> List[List[int]]:
+        """Nearest visible entry IDs per query vector, over-fetching and widening until k pass the filter."""
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return [[] for _ in range(len(vectors))]
+            total = self.index.ntotal
+            fetch = min(total, k if agent is None and owners is None else k * SHARED_MEMORY_OVERFETCH)
+            while True:
+                _, ids = self.index.search(vectors, fetch)
+                results = []
+                for row in ids:
+                    visible = [int(i) for i in row if 0 <= i < total and self.can_read(int(i), agent)
+                               and (owners is None or self.owners[int(i)] & owners)]
+                    results.append(visible)
+                if fetch >= total or all(len(visible) >= k for visible in results):
+                    return results
+                fetch = min(total, fetch * 2)
+
+    def search(self, query: str, agent: Optional[str] = None, k: int = 5) -> List[str]:
+        """The k nearest entries `agent` may read (all entries when agent is None)."""
+        return self.search_many([query], agent, k)[0]
+
+    def search_many(self, queries: List[str], agent: Optional[str] = None, k: int = 5) -> List[List[str]]:
+        """Several queries with one embeddings call and one index search."""
+        self.load()
+        if not queries or self.index is None:
+            return [[] for _ in queries]
+        vectors = np.asarray(self.embed(queries, agent), dtype=np.float32)
+        return [[self._render(i) for i in ids[:k]] for ids in self._search(vectors, k, agent)]
+
+    def search_by_owner(self, query: str, owners: Optional[Iterable[str]] = None, k: int = 3) -> Dict[str, List[str]]:
+        """
+        Cross-agent lookup: the top k entries per owning agent from a single embedding and index search,
+        instead of one search per agent. Restrict to some agents with `owners`.
+        """
+        self.load()
+        if self.index is None:
+            return {}
+        wanted = set(owners) if owners else None
+        vector = np.asarray(self.embed([query], None), dtype=np.float32)
+        owner_count = len(wanted) if wanted else len(set().union(*self.owners))
+        candidates = max(owner_count, 1) * k * SHARED_MEMORY_OVERFETCH
+        results: Dict[str, List[str]] = {}
+        for i in self._search(vector, candidates, None, wanted)[0]:
+            for owner in sorted(self.owners[i]):
+                if (wanted is None or owner in wanted) and len(results.setdefault(owner, [])) < k:
+                    results[owner].append(self._render(i))
+        return results
+
+    def load(self):
+        """Loads the log and embeds queued legacy entries now instead of on first use."""
+        self._ensure_loaded()
+        self._embed_pending()
+
+    # --- Introspection --------------------------------------------------------------------
+
+    def contains(self, digest: str) -> bool:
+        """True when an entry with this content hash is stored."""
+        self._ensure_loaded()
+        return digest in self.by_hash
+
+    def unstored(self, texts: List[str], owner: str) -> List[str]:
+        """The texts not yet stored with `owner` among their owners, e.g. legacy entries still queued."""
+        self._ensure_loaded()
+        with self._lock:
+            missing = []
+            for text in texts:
+                entry_id = self.by_hash.get(content_hash(text))
+                if entry_id is None or owner not in self.owners[entry_id]:
+                    missing.append(text)
+            return missing
+
+    def empty(self) -> bool:
+        """True when nothing is stored or queued; cheap before the log has been loaded."""
+        if not self._loaded:
+            return not self._pending and not os.path.exists(self.path)
+        if self.writer is not None:
+            self._ensure_loaded()
+        return not self.texts and not self._pending
+
+    def entries_for(self, agent: str) -> List[str]:
+        """Texts `agent` owns, in insertion order."""
+        self._ensure_loaded()
+        with self._lock:
+            return [self._render(i) for i, owners in enumerate(self.owners) if agent in owners]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            references = sum(len(owners) for owners in self.owners)
+            return {'entries': len(self.texts), 'owner_references': references,
+                    'public': self.visibility.count('public'), 'pending': len(self._pending)}
+
+    def __len__(self) -> int:
+        return len(self.texts) + len(self._pending)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,362 @@
+# Warm, restricted worker processes for the execute_shell_command tool.
+#
+# Commands are parsed with shlex and checked against an allow-list on argv[0]; nothing
+# runs through a shell. Workers are spawned once, with a scrubbed environment, a fixed
+# working directory and resource limits, and then reused. Simple forms of the allowed
+# commands (echo, pwd, whoami, ls) run inside the worker without spawning anything;
+# other invocations are executed from the worker with their output streamed back chunk
+# by chunk. Output is capped in bytes, every command has a deadline, and a pool-wide
+# limit bounds how many commands run at once across all agents.
+
+import os
+import sys
+import json
+import time
+import shlex
+import queue
+import getpass
+import logging
+import threading
+import selectors
+import subprocess
+from typing import Callable, List, Optional
+
+# Shell pool configuration (override in the .env file)
+SHELL_ALLOWED_COMMANDS = [name for name in os.getenv('SHELL_ALLOWED_COMMANDS', 'ls,echo,pwd,whoami').split(',') if name]
+SHELL_WORKERS = int(os.getenv('SHELL_WORKERS', '2'))  # Worker processes, i.e. commands running at once across agents
+SHELL_TIMEOUT = float(os.getenv('SHELL_TIMEOUT', '5'))  # Seconds per command
+SHELL_MAX_OUTPUT_BYTES = int(os.getenv('SHELL_MAX_OUTPUT_BYTES', '65536'))  # Output kept per command
+SHELL_QUEUE_TIMEOUT = float(os.getenv('SHELL_QUEUE_TIMEOUT', '10'))  # Seconds to wait for a free worker
+SHELL_WORKDIR = os.getenv('SHELL_WORKDIR', os.getcwd())
+SHELL_MEMORY_LIMIT_MB = int(os.getenv('SHELL_MEMORY_LIMIT_MB', '512'))  # Address space limit per worker (POSIX)
+
+# Characters that only mean something to a shell; argv is never passed to one, so unquoted they are rejected
+SHELL_OPERATORS = (';', '|', '&', '>', '<', '`', '$(')
+
+_CHUNK_BYTES = 4096
+_ENV_KEEP = ('PATH', 'LANG', 'LC_ALL', 'HOME', 'USER', 'SYSTEMROOT', 'TZ')
+
+
+class CommandRejected(ValueError):
+    """The command failed parsing or the allow-list check."""
+
+
+class ShellResult:
+    def __init__(self, argv: List[str], timeout: float = SHELL_TIMEOUT, max_bytes: int = SHELL_MAX_OUTPUT_BYTES):
+        self.argv = argv
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.exit_code = None
+        self.truncated = False
+        self.timed_out = False
+        self.duration = 0.0
+
+    @property
+    def output(self) -> str:
+        return ''.join(text for _, text in self.chunks)
+
+    def text(self) -> str:
+        """Output plus status notes, as returned to the model."""
+        notes = []
+        if self.exit_code not in (0, None):
+            notes.append(f"[exit code {self.exit_code}]")
+        if self.truncated:
+            notes.append(f"[output truncated at {self.max_bytes} bytes]")
+        if self.timed_out:
+            notes.append(f"[timed out after {self.timeout:g}s]")
+        output = self.output
+        return output + ("\n" if output and notes and not output.endswith("\n") else "") + " ".join(notes)
+
+
+def _unquoted_operator(command: str) -> Optional[str]:
+    """The first shell operator outside quotes, or None. Quoted ones are plain text in argv."""
+    quote = None
+    i = 0
+    while i < len(command):
+        char = command[i]
+        if quote:
+            if char == quote:
+                quote = None
+            elif char == '\\' and quote == '"':
+                i += 1
+        elif char in ('"', "'"):
+            quote = char
+        elif char == '\\':
+            i += 1
+        else:
+            for operator in SHELL_OPERATORS:
+                if command.startswith(operator, i):
+                    return operator
+        i += 1
+    return None
+
+
+def parse_command(command: str, allowed: List[str] = None) -> List[str]:
+    """Splits a command into argv and enforces the allow-list on the program name."""
+    allowed = SHELL_ALLOWED_COMMANDS if allowed is None else allowed
+    try:
+        argv = shlex.split(command)
+    except ValueError as e:
+        raise CommandRejected(f"Could not parse command: {e}")
+    if not argv:
+        raise CommandRejected("Empty command.")
+    if argv[0] not in allowed:
+        raise CommandRejected("Command not allowed for safety reasons.")
+    if _unquoted_operator(command):
+        raise CommandRejected("Shell operators (pipes, redirects, command chaining) are not supported.")
+    return argv
+
+
+# --- Worker process -------------------------------------------------------------------
+
+def _restricted_env() -> dict:
+    # Secrets (API keys, SMTP credentials) never reach the workers or the commands they run
+    return {name: os.environ[name] for name in _ENV_KEEP if name in os.environ}
+
+
+def _limit_resources():
+    try:
+        import resource
+        limit = SHELL_MEMORY_LIMIT_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))  # Commands may not write files
+    except (ImportError, ValueError, OSError):
+        pass  # Not available on this platform
+
+
+def _builtin(argv: List[str]) -> Optional[str]:
+    """Runs common forms of the default commands in-process; returns None to fall back to exec."""
+    name, args = argv[0], argv[1:]
+    if name == 'echo':
+        if args[:1] == ['-n']:
+            return ' '.join(args[1:])
+        if any(arg.startswith('-') for arg in args[:1]):
+            return None
+        return ' '.join(args) + "\n"
+    if name == 'pwd' and not args:
+        return os.getcwd() + "\n"
+    if name == 'whoami' and not args:
+        return getpass.getuser() + "\n"
+    if name == 'ls':
+        show_all = '-a' in args
+        paths = [arg for arg in args if arg not in ('-a', '-1')]
+        if any(path.startswith('-') for path in paths):
+            return None
+        lines = []
+        for path in paths or ['.']:
+            entries = sorted(os.listdir(path)) if os.path.isdir(path) else [path] if os.path.exists(path) else None
+            if entries is None:
+                lines.append(f"ls: cannot access '{path}': No such file or directory")
+                continue
+            if len(paths) > 1:
+                lines.append(f"{path}:")
+            lines.extend(entry for entry in entries if show_all or not entry.startswith('.'))
+        return "\n".join(lines) + "\n" if lines else ""
+    return None
+
+
+def _exec_streaming(send, argv: List[str], timeout: float, max_bytes: int):
+    """Executes argv (no shell) and forwards stdout/stderr chunks until exit, deadline or byte cap."""
+    deadline = time.monotonic() + timeout
+    sent = 0
+    truncated = timed_out = False
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ, 'stdout')
+    selector.register(process.stderr, selectors.EVENT_READ, 'stderr')
+    open_streams = 2
+    try:
+        while open_streams:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(timeout=remaining):
+                chunk = os.read(key.fileobj.fileno(), _CHUNK_BYTES)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    open_streams -= 1
+                    continue
+                if sent + len(chunk) > max_bytes:
+                    chunk = chunk[:max_bytes - sent]
+                    truncated = True
+                sent += len(chunk)
+                if chunk:
+                    send(chunk=chunk.decode('utf-8', 'replace'), stream=key.data)
+                if truncated:
+                    break
+            if truncated:
+                break
+        if not (truncated or timed_out):
+            process.wait(max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        timed_out = True
+    finally:
+        selector.close()
+        if process.poll() is None:
+            process.kill()
+        exit_code = process.wait()
+    return exit_code, truncated, timed_out
+
+
+def worker_main():
+    """Worker loop over stdin/stdout, one JSON request per line; replies are chunk lines then a done line."""
+    _limit_resources()
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+
+    def send(**message):
+        stdout.write(json.dumps(message).encode('utf-8') + b"\n")
+        stdout.flush()
+
+    for line in stdin:
+        request = json.loads(line)
+        argv, timeout, max_bytes = request['argv'], request['timeout'], request['max_bytes']
+        try:
+            output = _builtin(argv)
+            if output is not None:
+                data = output.encode('utf-8')
+                if data:
+                    send(chunk=data[:max_bytes].decode('utf-8', 'ignore'), stream='stdout')
+                send(done=0, truncated=len(data) > max_bytes, timed_out=False)
+            else:
+                exit_code, truncated, timed_out = _exec_streaming(send, argv, timeout, max_bytes)
+                send(done=exit_code, truncated=truncated, timed_out=timed_out)
+        except Exception as e:
+            send(chunk=f"{argv[0]}: {e}\n", stream='stderr')
+            send(done=127 if isinstance(e, FileNotFoundError) else 1, truncated=False, timed_out=False)
+
+
+# --- Parent side ----------------------------------------------------------------------
+
+class _Worker:
+    """A long-lived `python -I shell_pool.py --worker` process with a scrubbed environment."""
+
+    def __init__(self, workdir: str):
+        self.process = subprocess.Popen([sys.executable, '-I', os.path.abspath(__file__), '--worker'],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        cwd=workdir, env=_restricted_env())
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.process.stdout, selectors.EVENT_READ)
+        self._buffer = b''
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def send(self, request: dict):
+        self.process.stdin.write(json.dumps(request).encode('utf-8') + b"\n")
+        self.process.stdin.flush()
+
+    def receive(self, timeout: float) -> Optional[dict]:
+        """Next reply line, or None when the deadline passes first."""
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            if not self.selector.select(max(0.0, deadline - time.monotonic())):
+                return None
+            data = os.read(self.process.stdout.fileno(), 65536)
+            if not data:
+                raise EOFError("shell worker exited")
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def kill(self):
+        self.selector.close()
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+class ShellPool:
+    """
+    Pre-spawned command workers shared by all agents. `run` blocks for a free worker (up to
+    SHELL_QUEUE_TIMEOUT), so at most `size` commands execute at once; output chunks are passed
+    to `on_output(stream, text)` as they arrive. A worker that misses its deadline is killed and
+    replaced in the background.
+    """
+
+    def __init__(self, size: int = SHELL_WORKERS, workdir: str = SHELL_WORKDIR):
+        self.size = size
+        self.workdir = workdir
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Spawns the workers (idempotent). Call early, e.g. at startup, to keep spawn cost off the first tool call."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._idle.put(_Worker(self.workdir))
+
+    def start_in_background(self):
+        threading.Thread(target=self.start, name='shell-pool-start', daemon=True).start()
+
+    def _replace(self, worker: _Worker):
+        worker.kill()
+        threading.Thread(target=lambda: self._idle.put(_Worker(self.workdir)), daemon=True).start()
+
+    def run(self, command: str, on_output: Optional[Callable[[str, str], None]] = None,
+            timeout: float = SHELL_TIMEOUT, max_bytes: int = SHELL_MAX_OUTPUT_BYTES) -> ShellResult:
+        argv = parse_command(command)
+        self.start()
+        result = ShellResult(argv, timeout, max_bytes)
+        try:
+            worker = self._idle.get(timeout=SHELL_QUEUE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"All {self.size} shell workers are busy.")
+        started = time.monotonic()
+        healthy = False
+        try:
+            if not worker.alive():
+                raise BrokenPipeError("shell worker exited")
+            worker.send({'argv': argv, 'timeout': timeout, 'max_bytes': max_bytes})
+            # Leave the worker a grace period to enforce the deadline itself before it is killed
+            deadline = started + timeout + 2.0
+            while True:
+                message = worker.receive(deadline - time.monotonic())
+                if message is None:
+                    result.timed_out = True
+                    break
+                if 'chunk' in message:
+                    result.chunks.append((message['stream'], message['chunk']))
+                    if on_output is not None:
+                        on_output(message['stream'], message['chunk'])
+                else:
+                    result.exit_code = message['done']
+                    result.truncated = message['truncated']
+                    result.timed_out = message['timed_out']
+                    healthy = True
+                    break
+        except (EOFError, OSError) as e:
+            logging.error(f"Shell worker failed while running {argv[0]}. Error: {str(e)}")
+            result.exit_code = result.exit_code if result.exit_code is not None else -1
+        finally:
+            result.duration = time.monotonic() - started
+            if healthy:
+                self._idle.put(worker)
+            else:
+                self._replace(worker)
+        return result
+
+    def stop(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.kill()
+
+
+shell_pool = ShellPool()
+
+
+if __name__ == '__main__' and sys.argv[1:] == ['--worker']:
+    worker_main()
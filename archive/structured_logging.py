@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+import logging.handlers
+from typing import Optional
+
+from telemetry import current_span
+
+# Logging configuration (override in the .env file)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # Rotate the log file at this size
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))  # Rotated files kept next to the log
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Records buffered for the writer; overflow is dropped
+LOG_PAYLOAD_LIMIT = int(os.getenv('LOG_PAYLOAD_LIMIT', '2000'))  # Characters kept from tool arguments and results
+LOG_PAYLOAD_MODE = os.getenv('LOG_PAYLOAD_MODE', 'truncate')  # truncate | hash
+
+# Attributes every LogRecord has; anything else was passed through `extra` and is logged as a field
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+_CONTEXT_FIELDS = ('session', 'agent', 'tool')
+
+_listener = None
+_queue_handler = None
+_configure_lock = threading.Lock()
+
+
+def bound_payload(value, limit: int = LOG_PAYLOAD_LIMIT, mode: str = LOG_PAYLOAD_MODE) -> str:
+    """
+    Keeps large payloads (fetched pages, file contents) out of the logs.
+    'truncate' keeps the first `limit` characters, 'hash' replaces the payload with its digest;
+    both record the original length.
+    """
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return text
+    if mode == 'hash':
+        return f"<{len(text)} chars sha256:{hashlib.sha256(text.encode('utf-8', 'replace')).hexdigest()[:16]}>"
+    return f"{text[:limit]}... <truncated, {len(text)} chars>"
+
+
+class ContextFilter(logging.Filter):
+    """Stamps session, agent and tool from the active telemetry span onto a record before it is queued."""
+
+    def filter(self, record):
+        active = current_span()
+        for field in _CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, active.attributes.get(field) if active is not None else None)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, context fields and `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the writer falls behind and the queue is full, records are dropped and counted."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(filename: str, level: str = LOG_LEVEL, max_bytes: int = LOG_MAX_BYTES,
+                      backup_count: int = LOG_BACKUP_COUNT) -> Optional[DroppingQueueHandler]:
+    """
+    Routes the root logger through a bounded queue to a background thread that writes JSON
+    lines to a size-rotated file. Call once from an entry point; later calls are no-ops.
+    """
+    global _listener, _queue_handler
+    with _configure_lock:
+        if _listener is not None:
+            return _queue_handler
+        file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count)
+        file_handler.setFormatter(JsonFormatter())
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(ContextFilter())
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _queue_handler
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    with _configure_lock:
+        if _listener is None:
+            return
+        if _queue_handler.dropped:
+            # Logged while the queue handler and writer are still in place, so it reaches the log file
+            logging.warning(f"Dropped {_queue_handler.dropped} log records while the writer was behind.")
+        _listener.stop()
+        _listener = None
+        logging.getLogger().removeHandler(_queue_handler)
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import atexit
+import random
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Telemetry configuration (override in the .env file)
+OTLP_SPANS_FILE = os.getenv('OTLP_SPANS_FILE', '')  # Append spans as OTLP/JSON lines when set
+OTLP_FLUSH_EVERY = int(os.getenv('OTLP_FLUSH_EVERY', '64'))  # Spans buffered before a file write
+
+# Latency buckets in seconds, from fast tool calls to slow multi-step completions
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+# (metric name, sorted label items) -> Histogram / float
+_histograms: Dict[Tuple[str, tuple], Histogram] = {}
+_counters: Dict[Tuple[str, tuple], float] = {}
+_gauge_callbacks: List[Callable] = []
+_usage_listeners: List[Callable] = []
+_span_listeners: List[Callable] = []
+_span_buffer: List[Dict] = []
+
+
+def _key(name: str, labels: Dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def observe(name: str, value: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+def increment(name: str, value: float = 1.0, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def register_gauges(callback: Callable[[], List[Tuple[str, Dict, float]]]):
+    """Adds a callback returning [(metric name, labels, value)] that is sampled on every scrape."""
+    _gauge_callbacks.append(callback)
+
+
+def add_span_listener(callback: Callable[['Span', float], None]):
+    """Adds a callback(span, duration_seconds) invoked when any span ends, e.g. to collect raw latencies."""
+    _span_listeners.append(callback)
+
+
+def add_usage_listener(callback: Callable[['Span', object, Optional[str]], None]):
+    """Adds a callback(span, usage, model) invoked for every usage block recorded on a span."""
+    _usage_listeners.append(callback)
+
+
+class Span:
+    def __init__(self, name: str, attributes: Dict, parent: Optional['Span']):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.trace_id = parent.trace_id if parent else '%032x' % random.getrandbits(128)
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent else None
+        # Agent and tool labels are inherited so nested phases are attributed correctly
+        for label in ('agent', 'tool', 'session'):
+            if label not in self.attributes and parent and label in parent.attributes:
+                self.attributes[label] = parent.attributes[label]
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_usage(self, usage, model: Optional[str] = None):
+        """Records token counts from a completion or embedding response's `usage`."""
+        if usage is None:
+            return
+        read = (lambda field: usage.get(field)) if isinstance(usage, dict) else (lambda field: getattr(usage, field, None))
+        labels = {'phase': self.name, 'agent': self.attributes.get('agent'), 'model': model}
+        for field, kind in (('prompt_tokens', 'prompt'), ('completion_tokens', 'completion')):
+            tokens = read(field)
+            if tokens:
+                if self.name == 'embedding' and kind == 'prompt':
+                    kind = 'embedding'
+                self.attributes[f'tokens.{kind}'] = self.attributes.get(f'tokens.{kind}', 0) + tokens
+                increment('gptco_tokens_total', tokens, kind=kind, **labels)
+        for listener in _usage_listeners:
+            try:
+                listener(self, usage, model)
+            except Exception as e:
+                logging.error(f"Usage listener failed. Error: {str(e)}")
+
+
+def usage_of(response):
+    """Returns the `usage` block of an API response (SDK object or plain dict), if any."""
+    if isinstance(response, dict):
+        return response.get('usage')
+    return getattr(response, 'usage', None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times a phase of the agent loop (llm, embedding, reflection, save_memory, tool, turn).
+    The duration goes into the gptco_phase_seconds histogram labelled by phase, agent and tool,
+    and the span is exported to OTLP_SPANS_FILE when configured.
+    """
+    parent = _current_span.get()
+    active = Span(name, attributes, parent)
+    token = _current_span.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.error = str(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        duration = time.perf_counter() - active.started
+        observe('gptco_phase_seconds', duration, phase=name,
+                agent=active.attributes.get('agent'), tool=active.attributes.get('tool'))
+        for listener in _span_listeners:
+            listener(active, duration)
+        if OTLP_SPANS_FILE:
+            _buffer_span(active, active.start_ns + int(duration * 1e9))
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _buffer_span(active: Span, end_ns: int):
+    record = {
+        'traceId': active.trace_id,
+        'spanId': active.span_id,
+        'name': active.name,
+        'kind': 1,  # SPAN_KIND_INTERNAL
+        'startTimeUnixNano': str(active.start_ns),
+        'endTimeUnixNano': str(end_ns),
+        'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in active.attributes.items()],
+        'status': {'code': 2, 'message': active.error} if active.error else {'code': 1},
+    }
+    if active.parent_id:
+        record['parentSpanId'] = active.parent_id
+    with _lock:
+        _span_buffer.append(record)
+        full = len(_span_buffer) >= OTLP_FLUSH_EVERY
+    if full:
+        flush_spans()
+
+
+def flush_spans():
+    """Writes buffered spans to OTLP_SPANS_FILE as one OTLP/JSON export request per line."""
+    with _lock:
+        if not _span_buffer or not OTLP_SPANS_FILE:
+            return
+        spans = list(_span_buffer)
+        _span_buffer.clear()
+    export = {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'gptco'}}]},
+            'scopeSpans': [{'scope': {'name': 'gptco'}, 'spans': spans}],
+        }]
+    }
+    try:
+        with open(OTLP_SPANS_FILE, 'a') as f:
+            f.write(json.dumps(export) + "\n")
+    except OSError as e:
+        logging.error(f"Failed to export spans to {OTLP_SPANS_FILE}. Error: {str(e)}")
+
+
+atexit.register(flush_spans)
+
+
+def _format_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+def render_prometheus() -> str:
+    """Renders all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        histograms = {key: (list(h.counts), h.total, h.count, h.buckets) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    for name in sorted({key[0] for key in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for name in sorted({key[0] for key in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    gauges = {}
+    for callback in _gauge_callbacks:
+        try:
+            for name, labels, value in callback():
+                gauges.setdefault(name, []).append((tuple(sorted(labels.items())), value))
+        except Exception as e:
+            logging.error(f"Gauge callback failed. Error: {str(e)}")
+    for name in sorted(gauges):
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in gauges[name]:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,43 @@
+import os
+import sys
+import hashlib
+
+import pytest
+
+# The modules live next to this package (archive/), not in an installed distribution
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_memory import SharedMemory  # noqa: E402  (numpy and faiss load on first use)
+
+
+class FakeEmbedder:
+    """Deterministic 8-dimensional vectors from the text's digest; records the texts sent per call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, agent=None, batch_size=None):
+        self.calls.append(list(texts))
+        return [[int(hashlib.md5(text.encode()).hexdigest()[i:i + 2], 16) / 255 for i in range(0, 16, 2)]
+                for text in texts]
+
+    @property
+    def embedded(self):
+        return sum(len(call) for call in self.calls)
+
+
+class RateLimitError(Exception):
+    """Named and coded like the SDK's, so the router treats it as an overload."""
+    status_code = 429
+
+
+@pytest.fixture
+def embed():
+    return FakeEmbedder()
+
+
+@pytest.fixture
+def memory(tmp_path, embed):
+    store = SharedMemory(embed, path=str(tmp_path / 'shared.jsonl'), read_all=['CEO Agent'])
+    yield store
+    store.close()
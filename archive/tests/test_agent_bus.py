@@ -0,0 +1,62 @@
+import sys
+import queue
+import types
+import contextvars
+
+import agent_bus
+import structured_logging
+from agent_bus import BusClient, agent_worker
+
+
+class Agent:
+    def __init__(self, name):
+        self.name = name
+        self.received = []
+
+    def receive_message(self, sender, body):
+        self.received.append((sender, body))
+
+
+def _worker_env(monkeypatch, tmp_path):
+    """A stand-in gptco holding one agent; records which replica's memory file was saved."""
+    module = types.ModuleType('gptco')
+    module.AGENT_LOG_FILE = str(tmp_path / 'agent.log')
+    module.agents = {'Sales Agent': Agent('Sales Agent')}
+    module.shared_memory = types.SimpleNamespace(writer=None)
+    module.current_agent = contextvars.ContextVar('current_agent')
+    module.saved = []
+    module.loaded = []
+    module.save_agent_memory = lambda agent, replica=1: module.saved.append(replica)
+    module.load_agent_memory = lambda agent, replica=1: module.loaded.append(replica)
+    monkeypatch.setitem(sys.modules, 'gptco', module)
+    monkeypatch.setattr(structured_logging, 'configure_logging', lambda path: None)
+    client = BusClient({'Sales Agent': queue.Queue()}, queue.Queue(), queue.Queue())
+    return module, client
+
+
+def test_stop_waits_for_the_rest_of_the_batch_and_hands_back_extra_stops(monkeypatch, tmp_path):
+    gptco, client = _worker_env(monkeypatch, tmp_path)
+    client.send_batch('Sales Agent', [
+        {'kind': 'message', 'sender': 'CEO Agent', 'body': 'first'},
+        {'kind': 'stop'},
+        {'kind': 'message', 'sender': 'CEO Agent', 'body': 'second'},
+        {'kind': 'stop'},
+        {'kind': 'stop'},
+    ])
+    agent_worker('Sales Agent', client, replica=2)
+
+    assert [body for _, body in gptco.agents['Sales Agent'].received] == ['first', 'second']
+    assert gptco.saved == [2] and gptco.loaded == [2]
+    remaining = agent_bus._drain(client.mailboxes['Sales Agent'], 10)
+    assert remaining == [{'kind': 'stop'}, {'kind': 'stop'}]
+
+
+def test_workers_hand_long_term_writes_to_the_memory_owner(monkeypatch, tmp_path):
+    gptco, client = _worker_env(monkeypatch, tmp_path)
+    client.send('Sales Agent', {'kind': 'stop'})
+    agent_worker('Sales Agent', client)
+
+    gptco.shared_memory.writer(['a fact'], 'Sales Agent', 'private', [], None)
+    [request] = client.memory.get_nowait()
+    assert request['kind'] == 'write' and request['texts'] == ['a fact'] and request['owner'] == 'Sales Agent'
+    assert gptco.loaded == []  # The first replica keeps the memory file gptco loaded on import
@@ -0,0 +1,50 @@
+import conversation_store
+from conversation_store import Conversation, ConversationStore, read_tail
+
+
+def _message(index):
+    return {'role': 'user', 'content': f"message {index}"}
+
+
+def test_window_keeps_the_latest_messages_and_the_file_keeps_all(tmp_path):
+    conversation = Conversation('s1', str(tmp_path), window=3)
+    conversation.extend([_message(i) for i in range(5)])
+    conversation.append(_message(5))
+    assert [m['content'] for m in conversation.window()] == ['message 3', 'message 4', 'message 5']
+    conversation.close()
+    assert len(read_tail(conversation.path, 100)) == 6 and conversation.total == 6
+
+
+def test_resume_reads_only_the_tail_and_restores_the_agent(tmp_path):
+    conversation = Conversation('user@example.com', str(tmp_path), window=2)
+    conversation.extend([_message(i) for i in range(4)])
+    conversation.set_agent('Customer Support Agent')
+    conversation.close()
+
+    resumed = Conversation('user@example.com', str(tmp_path), window=2)
+    assert resumed.window() == [_message(2), _message(3)]
+    assert resumed.agent == 'Customer Support Agent' and resumed.total == 4
+
+
+def test_read_tail_spans_blocks_and_skips_a_torn_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_store, '_READ_BLOCK', 16)
+    path = tmp_path / 'log.jsonl'
+    conversation = Conversation('log', str(tmp_path), window=10)
+    conversation.extend([_message(i) for i in range(20)])
+    conversation.close()
+    assert read_tail(str(path), 3) == [_message(17), _message(18), _message(19)]
+    with open(path, 'a') as f:
+        f.write('{"role": "assis')
+    assert read_tail(str(path), 2) == [_message(19)]
+
+
+def test_store_reuses_open_sessions_and_evicts_the_least_recent(tmp_path):
+    store = ConversationStore(str(tmp_path), window=5, cache_size=2)
+    first = store.get('a')
+    first.append(_message(0))
+    assert store.get('a') is first
+    store.get('b')
+    store.get('c')  # Evicts 'a', which is closed but stays on disk
+    assert first._file is None and store.exists('a') and not store.exists('b')
+    assert store.get('a') is not first and store.get('a').window() == [_message(0)]
+    store.close()
@@ -0,0 +1,100 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('faiss')
+
+from ingest import IngestState, Ingestor, RateLimiter, chunk_text, parse_document, parse_file
+from shared_memory import content_hash
+
+AGENTS = ['Customer Support Agent', 'Technical Support Agent']
+
+
+def _ingest(tmp_path, memory, embed, paths):
+    ingestor = Ingestor(memory, embed, AGENTS, 'private', IngestState(str(tmp_path / 'state.jsonl')),
+                        batch_size=8, concurrency=2, limiter=RateLimiter(60000, 1e9))
+    return ingestor.run([str(path) for path in paths], workers=1)
+
+
+def _manual(index):
+    return "\n\n".join(f"Section {j} of manual {index}. Hold the reset button for ten seconds." for j in range(3))
+
+
+def test_chunks_carry_the_store_hash_and_their_source(tmp_path):
+    (tmp_path / 'docs').mkdir()
+    path = tmp_path / 'docs' / 'manual.md'
+    path.write_text(_manual(1))
+    _, file_hash, chunks, error = parse_file(str(path), str(tmp_path), size=80, overlap=0)
+    assert error is None and file_hash and len(chunks) == 3
+    for digest, chunk, source in chunks:
+        assert digest == content_hash(chunk) and source == 'docs/manual.md'
+
+
+def test_duplicates_within_a_run_are_embedded_once(tmp_path, memory, embed):
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.md').write_text(_manual(1))
+    (docs / 'copy.md').write_text(_manual(1))
+    report = _ingest(tmp_path, memory, embed, [docs])
+    assert report['files_done'] == 2 and report['duplicates'] == report['chunks'] // 2
+    assert embed.embedded == report['embedded'] == len(memory)
+    assert all(text.startswith('[a.md] ') for text in memory.entries_for(AGENTS[1]))
+
+
+def test_content_stored_by_an_earlier_run_is_not_embedded_again(tmp_path, memory, embed):
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    (docs / 'a.md').write_text(_manual(1))
+    first = _ingest(tmp_path, memory, embed, [docs])
+    embed.calls.clear()
+
+    (docs / 'moved.md').write_text(_manual(1))
+    second = _ingest(tmp_path, memory, embed, [docs])
+    assert second['files_skipped'] == 1 and second['files_done'] == 1
+    assert second['duplicates'] == first['chunks'] and second['embedded'] == 0
+    assert embed.calls == []
+
+
+def test_resume_skips_finished_files_and_reingests_changed_ones(tmp_path, memory, embed):
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    for index in range(3):
+        (docs / f'manual{index}.md').write_text(_manual(index))
+    _ingest(tmp_path, memory, embed, [docs])
+    embed.calls.clear()
+
+    assert _ingest(tmp_path, memory, embed, [docs])['files_skipped'] == 3
+    assert embed.calls == []
+
+    with open(docs / 'manual1.md', 'a') as f:
+        f.write("\n\nAppendix: firmware updates void the warranty.")
+    report = _ingest(tmp_path, memory, embed, [docs])
+    assert report['files_skipped'] == 2 and report['files_done'] == 1
+    assert report['embedded'] == embed.embedded == 1
+
+
+def test_interrupted_run_resumes_with_unfinished_files(tmp_path, memory, embed):
+    docs = tmp_path / 'docs'
+    docs.mkdir()
+    for index in range(2):
+        (docs / f'manual{index}.md').write_text(_manual(index))
+    # The first run finished manual0.md before it was interrupted
+    state = IngestState(str(tmp_path / 'state.jsonl'))
+    state.mark_done(str(docs / 'manual0.md'), 'hash', 3)
+    state.close()
+    report = _ingest(tmp_path, memory, embed, [docs])
+    assert report['files_skipped'] == 1 and report['files_done'] == 1
+    assert all(text.startswith('[manual1.md] ') for text in memory.entries_for(AGENTS[0]))
+
+
+def test_structured_files_split_into_documents():
+    assert parse_document('t.jsonl', '{"id": 1, "customer": {"name": "A"}}\nnot json\n{"id": 2}') == [
+        "id: 1\ncustomer.name: A", "id: 2"]
+    assert parse_document('t.csv', "id,issue\n1,refund\n2,") == ["id: 1\nissue: refund", "id: 2"]
+
+
+def test_chunk_text_packs_paragraphs_and_overlaps():
+    chunks = chunk_text("a b c " * 100, size=50, overlap=10)
+    # Each chunk holds up to `size` characters of new text after the carried-over overlap
+    assert len(chunks) > 1 and all(len(chunk) <= 50 + 10 for chunk in chunks)
+    assert chunks[1].split('\n')[0] in chunks[0][-10:]
+    assert chunk_text("one\n\ntwo", size=50, overlap=0) == ["one\ntwo"]
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from jobs import CANCELLED, QUEUED, RUNNING, SUCCEEDED, Job, JobCancelled, JobManager
+
+
+def _wait(job, timeout=5):
+    for _ in range(100):
+        if job.status not in (QUEUED, RUNNING):
+            return job.status
+        job.wait_for_events(len(job.events), 0.05)
+    return job.status
+
+
+def test_running_job_stops_at_its_next_event_when_cancelled():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    proceed = threading.Event()
+
+    def work(emit):
+        started.set()
+        proceed.wait(5)
+        emit('token', 'late')
+        return 'finished'
+
+    job = manager.submit('turn', work)
+    assert started.wait(5)
+    assert job.cancel()
+    proceed.set()
+    assert _wait(job) == CANCELLED and job.result is None
+
+
+def test_queued_job_never_starts_after_cancel():
+    manager = JobManager(max_workers=1)
+    gate = threading.Event()
+    blocker = manager.submit('turn', lambda emit: gate.wait(5))
+    ran = []
+    queued = manager.submit('turn', lambda emit: ran.append(1))
+    assert queued.cancel() and queued.status == CANCELLED
+    gate.set()
+    assert _wait(blocker) == SUCCEEDED
+    assert ran == [] and queued.status == CANCELLED
+
+
+def test_emit_raises_once_cancel_is_requested():
+    job = Job('turn')
+    job.status = RUNNING
+    job.cancel()
+    with pytest.raises(JobCancelled):
+        job.emit('token')
@@ -0,0 +1,88 @@
+import pytest
+
+import model_router
+from jobs import JobCancelled
+from model_router import ModelRouter
+from tests.conftest import RateLimitError
+
+POLICY = {
+    'decision': {'models': ['big', 'small'], 'mode': 'quality', 'latency_budget': 1.0},
+    'classification': {'models': ['gpt-4o', 'gpt-4o-mini'], 'mode': 'cost', 'latency_budget': 1.0},
+}
+
+
+def test_quality_mode_keeps_order_and_cost_mode_sorts_by_price():
+    router = ModelRouter(POLICY)
+    assert router.choose('decision') == ('big', 'policy')
+    assert router.choose('classification')[0] == 'gpt-4o-mini'
+    assert router.choose('decision', preferred='small') == ('small', 'policy')
+
+
+def test_overload_falls_back_and_cools_the_model_down():
+    router = ModelRouter(POLICY)
+    calls = []
+
+    def func(model):
+        calls.append(model)
+        if model == 'big':
+            raise RateLimitError()
+        return model
+
+    assert router.call('decision', func) == 'small'
+    assert calls == ['big', 'small']
+    assert router.metrics()['big']['cooling_down']
+    # Later calls skip the cooling model without trying it first
+    assert router.choose('decision') == ('small', 'fallback:cooling_down')
+
+
+def test_other_errors_are_not_retried_on_another_model():
+    router = ModelRouter(POLICY)
+    calls = []
+
+    def func(model):
+        calls.append(model)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        router.call('decision', func)
+    assert calls == ['big']
+
+
+def test_latency_ewma_over_budget_marks_the_model_slow():
+    router = ModelRouter(POLICY)
+    for latency in [2.0] * model_router.ROUTER_MIN_SAMPLES:
+        router.stats.setdefault('big', model_router.ModelStats()).in_flight += 1
+        router._record('big', latency, None)
+    assert router.metrics()['big']['latency_ewma'] == pytest.approx(2.0)
+    assert router.choose('decision') == ('small', 'fallback:slow')
+
+
+def test_ewma_weights_the_newest_sample():
+    router = ModelRouter(POLICY)
+    stats = router.stats.setdefault('big', model_router.ModelStats())
+    stats.in_flight = 2
+    router._record('big', 1.0, None)
+    router._record('big', 3.0, None)
+    assert stats.latency == pytest.approx(1.0 + model_router.ROUTER_EWMA_ALPHA * 2.0)
+    assert stats.in_flight == 0
+
+
+def test_all_unhealthy_uses_the_least_loaded_candidate():
+    router = ModelRouter(POLICY, max_in_flight=1)
+    for model, in_flight in (('big', 3), ('small', 1)):
+        router.stats.setdefault(model, model_router.ModelStats()).in_flight = in_flight
+    assert router.choose('decision') == ('small', 'fallback:all_unhealthy')
+
+
+def test_cancelled_calls_leave_the_model_stats_alone():
+    router = ModelRouter(POLICY)
+
+    def func(model):
+        raise JobCancelled("Job cancelled.")
+
+    with pytest.raises(JobCancelled):
+        router.call('decision', func)
+    stats = router.metrics()['big']
+    assert stats['in_flight'] == 0
+    assert stats['failure_rate'] == 0
+    assert stats['samples'] == 0
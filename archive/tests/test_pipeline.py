@@ -0,0 +1,90 @@
+import time
+import threading
+
+import pytest
+
+from pipeline import Pipeline, PipelineError, Stage
+
+
+def test_independent_stages_run_concurrently_before_their_dependents():
+    barrier = threading.Barrier(2, timeout=5)
+    order = []
+
+    def leaf(name):
+        def run(goal):
+            barrier.wait()  # Deadlocks (and times out) unless both leaves run at once
+            order.append(name)
+            return f"{name}:{goal}"
+        return run
+
+    def join(a, b):
+        order.append('join')
+        return f"{a}+{b}"
+
+    pipeline = Pipeline([
+        Stage('join', join, inputs=['a', 'b']),
+        Stage('a', leaf('a'), inputs=['goal']),
+        Stage('b', leaf('b'), inputs=['goal']),
+    ])
+    result = pipeline.run({'goal': 'g'})
+    assert result['join'] == 'a:g+b:g'
+    assert order[-1] == 'join' and sorted(order[:2]) == ['a', 'b']
+
+
+def test_failed_stage_is_retried_then_raises():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise RuntimeError("transient")
+        return 'ok'
+
+    result = Pipeline([Stage('flaky', flaky, retries=1, retry_delay=0)]).run({})
+    assert result['flaky'] == 'ok' and result.attempts['flaky'] == 2
+
+    def broken():
+        raise RuntimeError("down")
+
+    with pytest.raises(PipelineError, match="'broken' failed after 2 attempt"):
+        Pipeline([Stage('broken', broken, retries=1, retry_delay=0)]).run({})
+
+
+def test_failure_stops_dependents():
+    ran = []
+
+    def broken(x):
+        raise RuntimeError("down")
+
+    pipeline = Pipeline([
+        Stage('broken', broken, inputs=['x']),
+        Stage('after', lambda broken: ran.append(broken), inputs=['broken']),
+    ])
+    with pytest.raises(PipelineError):
+        pipeline.run({'x': 1})
+    assert ran == []
+
+
+def test_cycles_and_missing_inputs_are_rejected():
+    with pytest.raises(ValueError, match='cycle'):
+        Pipeline([Stage('a', lambda b: b, inputs=['b']), Stage('b', lambda a: a, inputs=['a'])])
+    with pytest.raises(ValueError, match='Missing pipeline inputs'):
+        Pipeline([Stage('a', lambda goal: goal, inputs=['goal'])]).run({})
+
+
+def test_cache_hits_skip_the_stage_and_respect_cache_inputs():
+    calls = []
+
+    def vision(goal, image, digest):
+        calls.append(image)
+        time.sleep(0.01)
+        return f"{goal}:{image}"
+
+    pipeline = Pipeline([Stage('vision', vision, inputs=['goal', 'image', 'digest'], cache=True,
+                               cache_inputs=['goal', 'digest'])])
+    first = pipeline.run({'goal': 'g', 'image': 'frame-1', 'digest': 'd1'})
+    again = pipeline.run({'goal': 'g', 'image': 'frame-1', 'digest': 'd1'})
+    changed = pipeline.run({'goal': 'g', 'image': 'frame-2', 'digest': 'd2'})
+    assert again.cache_hits == ['vision'] and again.timings['vision'] == 0.0
+    assert changed['vision'] == 'g:frame-2' and first['vision'] == 'g:frame-1'
+    assert calls == ['frame-1', 'frame-2']
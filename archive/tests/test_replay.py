@@ -0,0 +1,90 @@
+import types
+
+import pytest
+
+from replay import Recorder, ReplayedError, ReplayMiss
+from tests.conftest import RateLimitError
+
+
+class FakeCompletions:
+    """Stands in for the SDK's chat.completions resource."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if kwargs.get('messages') == 'overloaded':
+            raise RateLimitError("slow down")
+        if kwargs.get('stream'):
+            return iter([{'delta': 'Hel'}, {'delta': 'lo'}])
+        return {'choices': [{'message': {'content': f"echo {kwargs['messages']}"}}], 'usage': {'total_tokens': 3}}
+
+
+def _module(completions):
+    sdk = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions), api_key='key')
+    return types.SimpleNamespace(__name__='fake_agent', openai=sdk)
+
+
+def _record(path):
+    completions = FakeCompletions()
+    module = _module(completions)
+    recorder = Recorder(str(path), mode='record')
+    recorder.install(module)
+    module.openai.chat.completions.create(model='m', messages='hi')
+    assert list(module.openai.chat.completions.create(model='m', messages='story', stream=True)) == [
+        {'delta': 'Hel'}, {'delta': 'lo'}]
+    with pytest.raises(RateLimitError):
+        module.openai.chat.completions.create(model='m', messages='overloaded')
+    recorder.close()
+    return completions
+
+
+def test_replay_serves_recorded_responses_streams_and_errors_offline(tmp_path):
+    fixture = tmp_path / 'session.jsonl'
+    assert _record(fixture).calls == 3
+
+    live = FakeCompletions()
+    module = _module(live)
+    recorder = Recorder(str(fixture), mode='replay')
+    recorder.install(module)
+    response = module.openai.chat.completions.create(model='m', messages='hi')
+    assert response.choices[0].message.content == 'echo hi' and response['usage']['total_tokens'] == 3
+    assert [chunk.delta for chunk in module.openai.chat.completions.create(model='m', messages='story', stream=True)] == [
+        'Hel', 'lo']
+    with pytest.raises(ReplayedError) as error:
+        module.openai.chat.completions.create(model='m', messages='overloaded')
+    assert error.value.status_code == 429
+    assert live.calls == 0 and recorder.fallbacks == 0
+
+    recorder.uninstall()
+    assert module.openai.chat.completions is live
+
+
+def test_unmatched_requests_fall_back_by_kind_unless_strict(tmp_path):
+    fixture = tmp_path / 'session.jsonl'
+    _record(fixture)
+
+    lenient = Recorder(str(fixture), mode='replay')
+    assert lenient.call('llm', {'messages': 'reordered'}, None)['choices'][0]['message']['content'] == 'echo hi'
+    assert lenient.fallbacks == 1
+
+    strict = Recorder(str(fixture), mode='replay', strict=True)
+    with pytest.raises(ReplayMiss):
+        strict.call('llm', {'messages': 'reordered'}, None)
+
+
+def test_smtp_is_not_contacted_on_replay(tmp_path):
+    fixture = tmp_path / 'session.jsonl'
+    fixture.write_text('')
+    recorder = Recorder(str(fixture), mode='replay')
+
+    def refuse(*args, **kwargs):
+        raise AssertionError("SMTP contacted during replay")
+
+    module = types.SimpleNamespace(__name__='mailer', smtplib=types.SimpleNamespace(SMTP=refuse))
+    recorder.install(module)
+    with module.smtplib.SMTP('smtp.example.com', 587) as server:
+        server.starttls()
+        server.sendmail('a@example.com', ['b@example.com'], 'body')
+    assert recorder.outbox == [{'from': 'a@example.com', 'to': ['b@example.com'], 'msg': 'body'}]
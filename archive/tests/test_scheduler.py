@@ -0,0 +1,85 @@
+import threading
+import contextvars
+
+from scheduler import BATCH, INTERACTIVE, REFLECTION, Scheduler, _FairQueue, _Task
+
+
+def _task(session, tenant='default', priority=INTERACTIVE):
+    return _Task(lambda: None, (), {}, priority, session, tenant)
+
+
+def _drain(queue, tenant_weights=None, session_weights=None):
+    order = []
+    while queue.depth:
+        task = queue.pop(tenant_weights or {}, session_weights or {})
+        order.append((task.tenant, task.session))
+    return order
+
+
+def test_sessions_are_served_round_robin():
+    queue = _FairQueue()
+    for _ in range(3):
+        queue.push(_task('a'))
+    queue.push(_task('b'))
+    order = [session for _, session in _drain(queue)]
+    assert order[:2] in (['a', 'b'], ['b', 'a'])
+    assert order.count('a') == 3 and order.count('b') == 1
+
+
+def test_session_weights_share_the_class():
+    queue = _FairQueue()
+    for _ in range(6):
+        queue.push(_task('heavy'))
+        queue.push(_task('light'))
+    order = [session for _, session in _drain(queue, session_weights={'heavy': 2.0})]
+    # Weight 2 gets two slots for every one of weight 1 while both are backlogged
+    assert order[:6].count('heavy') == 4
+
+
+def test_tenants_share_before_sessions():
+    queue = _FairQueue()
+    for session in ('s1', 's2', 's3'):
+        queue.push(_task(session, tenant='big'))
+    queue.push(_task('t1', tenant='small'))
+    tenants = [tenant for tenant, _ in _drain(queue)]
+    assert tenants.index('small') <= 1
+
+
+def test_idle_session_cannot_bank_credit():
+    queue = _FairQueue()
+    for _ in range(4):
+        queue.push(_task('busy'))
+    _drain(queue)
+    for _ in range(2):
+        queue.push(_task('busy'))
+    queue.push(_task('new'))
+    order = [session for _, session in _drain(queue)]
+    assert order.index('new') <= 1
+
+
+def test_class_limit_queues_work_and_context_carries_over():
+    scheduler = Scheduler(class_limits={INTERACTIVE: 1, REFLECTION: 1, BATCH: 1})
+    gate = threading.Event()
+    started = threading.Event()
+    order = []
+
+    def blocker():
+        started.set()
+        gate.wait(5)
+
+    # Occupy the only interactive slot, then queue more interactive work behind it
+    first = scheduler.submit(blocker, priority=INTERACTIVE)
+    assert started.wait(5)
+    queued = [scheduler.submit(order.append, name, priority=INTERACTIVE, session=name) for name in ('x', 'y')]
+    assert scheduler.metrics()['interactive']['queue_depth'] == 2 and order == []
+    # Other classes have their own slots and are not held up by the full interactive class
+    assert scheduler.run(lambda: 'done', priority=BATCH) == 'done'
+    gate.set()
+    for future in [first] + queued:
+        future.result(5)
+    assert sorted(order) == ['x', 'y']
+
+    marker = contextvars.ContextVar('marker', default=None)
+    marker.set('caller')
+    assert scheduler.run(marker.get, priority=REFLECTION) == 'caller'
+    assert scheduler.metrics()['interactive']['completed'] == 3
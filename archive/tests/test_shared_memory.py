@@ -0,0 +1,92 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('faiss')
+
+from shared_memory import SharedMemory, content_hash
+from tests.conftest import FakeEmbedder
+
+
+def test_private_entries_are_only_visible_to_owners_readers_and_read_all(memory):
+    memory.add("refund policy is 30 days", 'Sales Agent', 'private', readers=['Support Agent'])
+    memory.add("office opens at nine", 'HR Agent', 'public')
+    assert memory.search("policy", agent='Sales Agent', k=5) == memory.search("policy", agent='Support Agent', k=5)
+    assert "refund policy is 30 days" in memory.search("policy", agent='Support Agent', k=5)
+    assert memory.search("policy", agent='Marketing Agent', k=5) == ["office opens at nine"]
+    assert len(memory.search("policy", agent='CEO Agent', k=5)) == 2
+    assert memory.entries_for('HR Agent') == ["office opens at nine"]
+
+
+def test_same_text_is_embedded_once_and_gains_owners(memory, embed):
+    assert memory.add_many(["a fact", "another fact"], 'Sales Agent', 'private') == 2
+    # Whitespace differences hash the same
+    assert memory.add_many(["a   fact\n"], 'Support Agent', 'private') == 0
+    assert sum(len(call) for call in embed.calls) == 2
+    assert memory.entries_for('Support Agent') == ["a fact"]
+    assert memory.stats()['entries'] == 2
+
+
+def test_sharing_publicly_widens_visibility(memory):
+    memory.add("launch date is friday", 'Sales Agent', 'private')
+    assert memory.search("launch", agent='Marketing Agent') == []
+    memory.add("launch date is friday", 'Sales Agent', 'public')
+    assert memory.search("launch", agent='Marketing Agent') == ["launch date is friday"]
+
+
+def test_sources_stay_out_of_the_hash_and_show_in_results(memory, embed):
+    memory.add_many(["reset with the pin"], 'Support Agent', 'private', sources=['manuals/router.md'])
+    assert memory.contains(content_hash("reset with the pin"))
+    assert memory.add_many(["reset with the pin"], 'Support Agent', 'private', sources=['copy.md']) == 0
+    assert memory.search("reset", agent='Support Agent') == ["[manuals/router.md] reset with the pin"]
+    assert len(embed.calls) == 2  # One for the add, one for the query
+
+
+def test_restart_rebuilds_the_index_without_embedding(tmp_path, memory, embed):
+    memory.add("kept across restarts", 'Sales Agent', 'private', readers=['Support Agent'])
+    memory.add_many(["from a file"], 'Support Agent', 'public', sources=['docs/a.md'])
+    memory.close()
+    reloaded_embed = FakeEmbedder()
+    reloaded = SharedMemory(reloaded_embed, path=memory.path, read_all=[])
+    assert reloaded.entries_for('Support Agent') == ["kept across restarts", "[docs/a.md] from a file"]
+    assert reloaded_embed.calls == []
+    assert reloaded.search("x", agent='Marketing Agent', k=5) == ["[docs/a.md] from a file"]
+
+
+def test_search_by_owner_groups_results_per_agent(memory):
+    memory.add_many(["s1", "s2"], 'Sales Agent', 'private')
+    memory.add("t1", 'Support Agent', 'private')
+    results = memory.search_by_owner("query", k=1)
+    assert set(results) == {'Sales Agent', 'Support Agent'}
+    assert results['Support Agent'] == ["t1"] and len(results['Sales Agent']) == 1
+
+
+def test_failed_import_embedding_keeps_the_texts_queued(memory, embed):
+    def unavailable(texts, agent=None):
+        raise ConnectionError("embeddings down")
+
+    memory.import_texts(["old fact", "older fact"], 'Sales Agent')
+    memory.embed = unavailable
+    with pytest.raises(ConnectionError):
+        memory.load()
+    assert memory.stats()['pending'] == 2
+    assert memory.unstored(["old fact", "older fact"], 'Sales Agent') == ["old fact", "older fact"]
+    memory.embed = embed
+    memory.load()
+    assert memory.stats()['pending'] == 0
+    assert memory.unstored(["old fact", "older fact"], 'Sales Agent') == []
+
+
+def test_a_reader_follows_the_log_written_by_the_owner(tmp_path, embed):
+    path = str(tmp_path / 'shared.jsonl')
+    owner = SharedMemory(embed, path=path)
+    reader = SharedMemory(embed, path=path)
+    reader.writer = lambda texts, name, visibility, readers, sources: owner.add_many(texts, name, visibility, readers,
+                                                                                     sources=sources)
+    assert reader.search("anything", agent='Sales Agent') == []
+    assert reader.add_many(["a fact"], 'Sales Agent', 'private') == 0
+    assert reader.search("fact", agent='Sales Agent') == ["a fact"]
+    owner.add("office opens at nine", 'HR Agent', 'public')
+    assert "office opens at nine" in reader.search("office", agent='Sales Agent')
+    assert not reader._file  # Only the owner appends to the log
+    owner.close()
+    reader.close()
@@ -0,0 +1,71 @@
+import sys
+
+import pytest
+
+from shell_pool import CommandRejected, ShellPool, ShellResult, _builtin, parse_command
+
+ALLOWED = ['echo', 'ls', 'pwd', 'whoami']
+
+
+@pytest.mark.parametrize('command', [
+    'echo a; rm -rf /',
+    'echo a && echo b',
+    'ls | wc -l',
+    'echo a > out.txt',
+    'echo `id`',
+    'echo $(id)',
+    'echo a &',
+])
+def test_unquoted_shell_operators_are_rejected(command):
+    with pytest.raises(CommandRejected, match='Shell operators'):
+        parse_command(command, ALLOWED)
+
+
+@pytest.mark.parametrize('command, argv', [
+    ('echo "a;b"', ['echo', 'a;b']),
+    ("echo 'x | y' z", ['echo', 'x | y', 'z']),
+    (r'echo a\;b', ['echo', 'a;b']),
+    ('echo "$(id)"', ['echo', '$(id)']),
+])
+def test_quoted_operators_are_plain_arguments(command, argv):
+    assert parse_command(command, ALLOWED) == argv
+
+
+@pytest.mark.parametrize('command, message', [
+    ('rm -rf /', 'not allowed'),
+    ('/bin/echo hi', 'not allowed'),
+    ('', 'Empty command'),
+    ('echo "unterminated', 'Could not parse'),
+])
+def test_disallowed_or_malformed_commands_are_rejected(command, message):
+    with pytest.raises(CommandRejected, match=message):
+        parse_command(command, ALLOWED)
+
+
+def test_builtins_answer_simple_forms_and_defer_the_rest():
+    assert _builtin(['echo', 'a;b', 'c']) == "a;b c\n"
+    assert _builtin(['echo', '-n', 'x']) == "x"
+    assert _builtin(['echo', '-e', 'x']) is None
+    assert _builtin(['ls', '--color']) is None
+
+
+def test_result_text_notes_exit_code_truncation_and_timeout():
+    result = ShellResult(['echo'], timeout=1, max_bytes=4)
+    result.chunks = [('stdout', 'abcd')]
+    result.exit_code, result.truncated, result.timed_out = 2, True, True
+    assert result.text() == "abcd\n[exit code 2] [output truncated at 4 bytes] [timed out after 1s]"
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="workers use POSIX pipes")
+def test_pool_runs_allowed_commands_in_its_workdir(tmp_path):
+    (tmp_path / 'note.txt').write_text('x')
+    pool = ShellPool(size=1, workdir=str(tmp_path))
+    try:
+        streamed = []
+        result = pool.run('echo "a;b"', on_output=lambda stream, text: streamed.append(text))
+        assert result.exit_code == 0 and result.output == "a;b\n" and streamed == ["a;b\n"]
+        assert pool.run('ls').output == "note.txt\n"
+        with pytest.raises(CommandRejected):
+            pool.run('ls; cat /etc/passwd')
+    finally:
+        pool.stop()
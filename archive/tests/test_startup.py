@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from bench_startup import DEFERRED_MODULES, ENTRY_POINTS, measure_once
+
+# Optional time budget per entry point, e.g. STARTUP_BUDGET_MS=400 in CI
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '0'))
+
+
+@pytest.mark.parametrize('module', ENTRY_POINTS)
+def test_entry_points_import_without_deferred_subsystems(module):
+    try:
+        total_ms, entries = measure_once(module)
+    except RuntimeError as e:
+        error = str(e).splitlines()[-1]
+        # A missing deferred subsystem must not stop the import; anything else is this environment
+        assert not any(f"No module named '{name}'" in error for name in DEFERRED_MODULES), error
+        pytest.skip(f"{module} cannot be imported here: {error}")
+    imported = {name.split('.')[0] for name, _, _, _ in entries}
+    assert not imported & set(DEFERRED_MODULES)
+    if STARTUP_BUDGET_MS:
+        assert total_ms <= STARTUP_BUDGET_MS
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+
+import pytest
+
+from turn_checkpoint import (INTERRUPTED_TOOL_RESULT, TurnCheckpoint, current_idempotency_key, idempotency_key,
+                             interrupted_turns, read_checkpoint)
+
+
+class Message:
+    def __init__(self, content=None, function_call=None):
+        self.content = content
+        self.function_call = function_call
+
+
+class Call:
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = arguments
+
+
+def _crash(turn):
+    """Simulates the process dying: the log stays behind and a fresh process reads it."""
+    turn._file.close()
+    turn._file = None
+    return interrupted_turns(os.path.dirname(turn.path))
+
+
+def _run_turn(turn, tools):
+    """A two-step turn: a model call that picks send_email, the tool call, then a final model answer."""
+    turn.start('Sales Agent', [{'role': 'user', 'content': 'mail the client'}], 'default')
+    message = turn.next_model_step('Sales Agent')
+    if message is None:
+        message = Message(function_call=Call('send_email', '{"to": "a@b.c"}'))
+        turn.record_model_step('Sales Agent', message)
+    result = turn.run_tool(message.function_call.name, message.function_call.arguments, tools['send_email'])
+    return message, result
+
+
+def test_completed_steps_replay_without_calling_the_model_or_tool(tmp_path):
+    sent = []
+    tools = {'send_email': lambda: sent.append('mail') or 'sent'}
+    turn = TurnCheckpoint('session-1', directory=str(tmp_path))
+    _run_turn(turn, tools)
+    [resumed] = _crash(turn)
+
+    message, result = _run_turn(resumed, tools)
+    assert sent == ['mail']
+    assert result == 'sent' and message.function_call.name == 'send_email'
+    assert resumed.replayed_steps == 2 and resumed.replaying
+    # The next model call has no record and runs live
+    assert resumed.next_model_step('Sales Agent') is None and not resumed.replaying
+
+
+def test_interrupted_side_effect_tool_is_not_repeated(tmp_path):
+    sent = []
+
+    def crash_mid_send():
+        sent.append('mail')
+        raise KeyboardInterrupt  # Process killed after the mail left, before the result was written
+
+    turn = TurnCheckpoint('session-1', directory=str(tmp_path))
+    with pytest.raises(KeyboardInterrupt):
+        _run_turn(turn, {'send_email': crash_mid_send})
+    [resumed] = _crash(turn)
+
+    _, result = _run_turn(resumed, {'send_email': lambda: sent.append('again')})
+    assert result == INTERRUPTED_TOOL_RESULT and sent == ['mail']
+    tool_records = [record for record in read_checkpoint(resumed.path) if record['type'] == 'tool']
+    assert tool_records[-1]['interrupted'] is True
+
+    # A second crash and resume keeps the call marked interrupted and still does not send
+    [again] = _crash(resumed)
+    _, result = _run_turn(again, {'send_email': lambda: sent.append('third')})
+    assert result == INTERRUPTED_TOOL_RESULT and sent == ['mail']
+
+
+def test_interrupted_refund_is_not_repeated(tmp_path):
+    refunds = []
+    arguments = '{"customer_id": "c1", "product_id": "p1", "reason": "damaged"}'
+
+    def crash_mid_refund():
+        refunds.append('refund')
+        raise KeyboardInterrupt
+
+    turn = TurnCheckpoint('session-1', directory=str(tmp_path))
+    turn.start('Customer Support Agent', [], 'default')
+    with pytest.raises(KeyboardInterrupt):
+        turn.run_tool('execute_refund', arguments, crash_mid_refund)
+    [resumed] = _crash(turn)
+    resumed.start('Customer Support Agent', [], 'default')
+    result = resumed.run_tool('execute_refund', arguments, lambda: refunds.append('again'))
+    assert result == INTERRUPTED_TOOL_RESULT and refunds == ['refund']
+
+
+def test_interrupted_read_only_tool_runs_again(tmp_path):
+    turn = TurnCheckpoint('session-1', directory=str(tmp_path))
+    turn.start('Sales Agent', [], 'default')
+
+    def crash():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        turn.run_tool('read_file', '{"path": "a"}', crash)
+    [resumed] = _crash(turn)
+    resumed.start('Sales Agent', [], 'default')
+    assert resumed.run_tool('read_file', '{"path": "a"}', lambda: 'contents') == 'contents'
+
+
+def test_idempotency_key_is_stable_and_visible_to_the_tool(tmp_path):
+    turn = TurnCheckpoint('session-1', turn_id='turn-1', directory=str(tmp_path))
+    turn.start('Sales Agent', [], 'default')
+    seen = turn.run_tool('send_email', '{}', current_idempotency_key.get)
+    assert seen == idempotency_key('turn-1', 1, 'send_email', '{}')
+    assert idempotency_key('turn-1', 2, 'send_email', '{}') != seen
+    assert current_idempotency_key.get() is None
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    turn = TurnCheckpoint('session-1', directory=str(tmp_path))
+    turn.start('Sales Agent', [], 'default')
+    turn.run_tool('read_file', '{}', lambda: 'ok')
+    turn._file.write('{"type": "tool", "step": 2, "ke')
+    [resumed] = _crash(turn)
+    assert sorted(resumed.recorded) == [1]
+    assert resumed.start_record['session'] == 'session-1'
+
+
+def test_finished_turns_leave_nothing_and_stale_logs_are_discarded(tmp_path):
+    done = TurnCheckpoint('session-1', directory=str(tmp_path))
+    done.start('Sales Agent', [], 'default')
+    done.finish()
+    stale = tmp_path / 'session-2--old.jsonl'
+    stale.write_text(json.dumps({'type': 'start', 'turn_id': 'old', 'session': 'session-2', 'agent': 'Sales Agent',
+                                 'tenant': 'default', 'messages': [], 'time': time.time() - 10}) + "\n")
+    assert interrupted_turns(str(tmp_path), max_age=5) == []
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+import usage_ledger
+from usage_ledger import UsageLedger, estimate_cost
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return UsageLedger(db_path=str(tmp_path / 'usage.db'), flush_interval=3600)
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT session, agent, model, calls, prompt_tokens, completion_tokens FROM usage').fetchall()
+    finally:
+        conn.close()
+
+
+def test_usage_is_totalled_by_session_agent_and_model(ledger):
+    ledger.record_usage({'prompt_tokens': 100, 'completion_tokens': 20}, 'gpt-4o', 'llm', session='s1', agent='Sales Agent')
+    ledger.record_usage({'prompt_tokens': 50}, 'text-embedding-3-small', 'embedding', session='s1', agent='Sales Agent')
+    ledger.record_usage(None, 'gpt-4o', 'llm', session='s1')
+    assert ledger.session_usage('s1')['tokens'] == 170
+    assert ledger.session_usage('s1')['cost_usd'] == pytest.approx(estimate_cost('gpt-4o', 100, 20, 0)
+                                                                    + estimate_cost('text-embedding-3-small', 0, 0, 50))
+    by_phase = ledger.summary('phase')
+    assert by_phase['embedding']['embedding_tokens'] == 50 and by_phase['embedding']['prompt_tokens'] == 0
+    assert by_phase['llm']['calls'] == 1
+
+
+def test_allow_stops_optional_work_once_a_session_token_budget_is_spent(ledger, monkeypatch):
+    monkeypatch.setattr(usage_ledger, 'SESSION_TOKEN_BUDGET', 100)
+    ledger.record('gpt-4o-mini', 60, 0, session='s1', agent='Sales Agent')
+    assert ledger.allow('reflection', 's1', 'Sales Agent')
+    ledger.record('gpt-4o-mini', 40, 0, session='s1', agent='Sales Agent')
+    assert not ledger.allow('reflection', 's1', 'Sales Agent')
+    # Other sessions of the same agent are unaffected
+    assert ledger.allow('reflection', 's2', 'Sales Agent')
+
+
+def test_allow_checks_agent_and_cost_budgets(ledger, monkeypatch):
+    monkeypatch.setattr(usage_ledger, 'AGENT_COST_BUDGET', 0.01)
+    ledger.record('gpt-4o', 1000, 1000, session='s1', agent='CEO Agent')  # $0.0125
+    assert not ledger.allow('vision', 's2', 'CEO Agent')
+    assert ledger.allow('vision', 's2', 'Sales Agent')
+
+
+def test_budgets_of_zero_are_disabled(ledger):
+    ledger.record('gpt-4o', 10 ** 9, 10 ** 9, session='s1', agent='Sales Agent')
+    assert ledger.allow('summarization', 's1', 'Sales Agent')
+
+
+def test_flush_writes_pending_rows_once(ledger):
+    ledger.record('gpt-4o', 10, 5, session='s1', agent='Sales Agent', phase='llm')
+    ledger.flush()
+    ledger.flush()
+    assert _rows(ledger.db_path) == [('s1', 'Sales Agent', 'gpt-4o', 1, 10, 5)]
+
+
+def test_failed_flush_keeps_the_deltas_for_the_next_one(ledger, tmp_path):
+    good_path = ledger.db_path
+    ledger.db_path = str(tmp_path / 'missing' / 'usage.db')  # Directory does not exist: connect fails
+    ledger.record('gpt-4o', 10, 5, session='s1', agent='Sales Agent')
+    ledger.flush()
+    ledger.record('gpt-4o', 1, 1, session='s1', agent='Sales Agent')
+    ledger.db_path = good_path
+    ledger.flush()
+    assert _rows(good_path) == [('s1', 'Sales Agent', 'gpt-4o', 2, 11, 6)]
@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import contextvars
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from telemetry import increment, observe
+
+# Turn checkpoint configuration (override in the .env file)
+CHECKPOINT_ENABLED = os.getenv('CHECKPOINT_ENABLED', 'true').lower() == 'true'
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', 'checkpoints')
+CHECKPOINT_FSYNC = os.getenv('CHECKPOINT_FSYNC', 'true').lower() == 'true'  # fsync every step (survives power loss)
+CHECKPOINT_MAX_AGE = float(os.getenv('CHECKPOINT_MAX_AGE', '86400'))  # Interrupted turns older than this are discarded
+# Tools whose effects leave the process; if one was interrupted mid-call it is never run again on resume
+SIDE_EFFECT_TOOLS = set(os.getenv(
+    'SIDE_EFFECT_TOOLS',
+    'send_real_email,send_email,write_file,store_data,supervisor_store_data,execute_shell_command,'
+    'open_application,click_at,escalate_to_human,process_sale,execute_refund,handle_customer_inquiry',
+).split(','))
+# Tools that return live objects (agents) and have no side effects; recorded, but re-run on resume
+RERUN_TOOLS = {'transfer_to_agent'}
+
+INTERRUPTED_TOOL_RESULT = ("This action was interrupted before its result was recorded and was not repeated, "
+                           "to avoid doing it twice. Check whether it took effect before retrying.")
+
+# Idempotency key of the tool call running in this context, e.g. for a Message-ID or an API request header
+current_idempotency_key = contextvars.ContextVar('current_idempotency_key', default=None)
+
+
+def _safe_name(session_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', session_id) or 'session'
+
+
+def idempotency_key(turn_id: str, step: int, name: str, arguments: str) -> str:
+    return hashlib.sha256(f"{turn_id}:{step}:{name}:{arguments or ''}".encode('utf-8')).hexdigest()[:32]
+
+
+def _as_message(record: Dict) -> SimpleNamespace:
+    call = record.get('function_call')
+    return SimpleNamespace(
+        content=record.get('content'),
+        function_call=SimpleNamespace(name=call['name'], arguments=call['arguments']) if call else None,
+    )
+
+
+class TurnCheckpoint:
+    """
+    Durable step log of one run_full_turn: the turn's input, then every model response and tool
+    result as it completes, written to `<dir>/<session>--<turn>.jsonl` (fsync'd per step). The file
+    is removed when the turn finishes, so a file left behind is an interrupted turn.
+
+    Resuming replays the log: recorded model responses are returned instead of calling the model,
+    and recorded tool results instead of running the tool, so recovery makes no network calls for
+    completed steps and costs O(steps in the turn). Once the log is exhausted the turn continues live.
+    """
+
+    def __init__(self, session_id: str, turn_id: str = None, directory: str = CHECKPOINT_DIR,
+                 records: Optional[List[Dict]] = None):
+        self.session_id = session_id
+        self.turn_id = turn_id or uuid.uuid4().hex
+        self.path = os.path.join(directory, f"{_safe_name(session_id)}--{self.turn_id}.jsonl")
+        self.start_record: Optional[Dict] = None
+        self.recorded: Dict[int, Dict] = {}
+        self.started_tools: Dict[str, Dict] = {}
+        self.persisted = 0  # Messages of this turn already appended to the session transcript
+        for record in records or []:
+            if record['type'] == 'start':
+                self.start_record = record
+            elif record['type'] == 'tool_started':
+                self.started_tools[record['key']] = record
+            elif record['type'] == 'persisted':
+                self.persisted = record['count']
+            else:
+                self.recorded[record['step']] = record
+        self.step = 0
+        self.replayed_steps = 0
+        self.load_seconds = 0.0  # Time spent reading the log after the restart
+        self._replay_started = None  # Set while fast-forwarding through a recovered log
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def replaying(self) -> bool:
+        """True while completed steps are being replayed from the log rather than executed."""
+        return self._replay_started is not None
+
+    def _write(self, record: Dict):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+            if CHECKPOINT_FSYNC:
+                os.fsync(self._file.fileno())
+
+    def start(self, agent: str, messages: List[Dict], tenant: str):
+        """Records the turn's input; a recovered turn keeps its record and starts replaying."""
+        if self.start_record is not None:
+            self._replay_started = time.perf_counter()
+            return
+        self.start_record = {'type': 'start', 'turn_id': self.turn_id, 'session': self.session_id,
+                             'agent': agent, 'tenant': tenant, 'messages': messages, 'time': time.time()}
+        self._write(self.start_record)
+
+    def record_persisted(self, count: int):
+        """Notes how many of the turn's messages are in the transcript, so a resume does not append them twice."""
+        self.persisted = count
+        self._write({'type': 'persisted', 'count': count})
+
+    def next_model_step(self, agent: str) -> Optional[SimpleNamespace]:
+        """The recorded response for the next model call, or None when it has to be made live."""
+        self.step += 1
+        record = self.recorded.get(self.step)
+        if record is None or record['type'] != 'model' or record['agent'] != agent:
+            self._end_replay()
+            return None
+        self.replayed_steps += 1
+        increment('gptco_checkpoint_replayed_total', kind='model')
+        return _as_message(record['message'])
+
+    def record_model_step(self, agent: str, message):
+        call = getattr(message, 'function_call', None)
+        self._write({'type': 'model', 'step': self.step, 'agent': agent, 'message': {
+            'content': message.content,
+            'function_call': {'name': call.name, 'arguments': call.arguments} if call else None,
+        }})
+
+    def run_tool(self, name: str, arguments: str, call: Callable):
+        """Runs a tool once per idempotency key: completed calls return their recorded result."""
+        self.step += 1
+        key = idempotency_key(self.turn_id, self.step, name, arguments)
+        record = self.recorded.get(self.step)
+        if record is not None and record['type'] == 'tool' and record['key'] == key:
+            self.replayed_steps += 1
+            # An interrupted call stays marked as such however often the turn is resumed
+            increment('gptco_checkpoint_replayed_total', kind='interrupted_tool' if record.get('interrupted') else 'tool')
+            return call() if name in RERUN_TOOLS else record['result']
+        interrupted = key in self.started_tools and name in SIDE_EFFECT_TOOLS
+        if interrupted:
+            # Crashed while this call was running: it may or may not have taken effect
+            logging.warning(f"Not repeating interrupted side-effect call {name} (key {key}).")
+            increment('gptco_checkpoint_replayed_total', kind='interrupted_tool')
+            result = INTERRUPTED_TOOL_RESULT
+        else:
+            self._end_replay()
+            self._write({'type': 'tool_started', 'step': self.step, 'key': key, 'name': name})
+            token = current_idempotency_key.set(key)
+            try:
+                result = call()
+            finally:
+                current_idempotency_key.reset(token)
+        stored = result if isinstance(result, (str, int, float, bool, list, dict, type(None))) else str(result)
+        record = {'type': 'tool', 'step': self.step, 'key': key, 'name': name, 'result': stored}
+        if interrupted:
+            record['interrupted'] = True
+        self._write(record)
+        return result
+
+    def _end_replay(self):
+        """Recovery is done when the first step has to run live: records load + fast-forward time."""
+        if self._replay_started is not None:
+            elapsed = self.load_seconds + time.perf_counter() - self._replay_started
+            self._replay_started = None
+            observe('gptco_checkpoint_recovery_seconds', elapsed)
+            logging.info(f"Recovered turn {self.turn_id} of session {self.session_id}: "
+                         f"{self.replayed_steps} step(s) replayed in {elapsed:.3f}s")
+
+    def finish(self):
+        """The turn completed: its log is no longer needed."""
+        self._end_replay()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def read_checkpoint(path: str) -> List[Dict]:
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crash mid-write; everything before it is intact
+                logging.warning(f"Skipping unreadable checkpoint line in {path}")
+    return records
+
+
+def interrupted_turns(directory: str = CHECKPOINT_DIR, max_age: float = CHECKPOINT_MAX_AGE) -> List[TurnCheckpoint]:
+    """Turns whose log was left behind by a crash, oldest first; stale or unreadable logs are discarded."""
+    if not os.path.isdir(directory):
+        return []
+    turns = []
+    for name in os.listdir(directory):
+        if not name.endswith('.jsonl') or '--' not in name:
+            continue
+        path = os.path.join(directory, name)
+        started = time.perf_counter()
+        records = read_checkpoint(path)
+        start = next((record for record in records if record.get('type') == 'start'), None)
+        if start is None or time.time() - start['time'] > max_age:
+            logging.warning(f"Discarding checkpoint {path} (no start record or older than {max_age:.0f}s).")
+            os.remove(path)
+            continue
+        turn = TurnCheckpoint(start['session'], start['turn_id'], directory, records)
+        turn.load_seconds = time.perf_counter() - started
+        turns.append(turn)
+    return sorted(turns, key=lambda turn: turn.start_record['time'])
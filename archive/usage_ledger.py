@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+# Usage accounting configuration (override in the .env file)
+USAGE_DB_PATH = os.getenv('USAGE_DB_PATH', 'agent_usage.db')
+USAGE_FLUSH_INTERVAL = float(os.getenv('USAGE_FLUSH_INTERVAL', '30'))  # Seconds between SQLite flushes
+SESSION_TOKEN_BUDGET = int(os.getenv('SESSION_TOKEN_BUDGET', '0'))  # 0 disables the budget
+AGENT_TOKEN_BUDGET = int(os.getenv('AGENT_TOKEN_BUDGET', '0'))
+SESSION_COST_BUDGET = float(os.getenv('SESSION_COST_BUDGET', '0'))  # USD
+AGENT_COST_BUDGET = float(os.getenv('AGENT_COST_BUDGET', '0'))  # USD
+
+# USD per 1K tokens: (prompt/input, completion/output). Override with MODEL_PRICES as JSON.
+MODEL_PRICES = {
+    'gpt-4o': (0.0025, 0.01),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-4.1-mini': (0.0004, 0.0016),
+    'text-embedding-ada-002': (0.0001, 0.0),
+    'text-embedding-3-small': (0.00002, 0.0),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv('MODEL_PRICES', '{}')).items()})
+
+# Optional work that is skipped once a session or agent is over budget
+OPTIONAL_FEATURES = ('reflection', 'summarization', 'vision')
+
+_FIELDS = ('calls', 'prompt_tokens', 'completion_tokens', 'embedding_tokens', 'cost_usd')
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int, embedding_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model or '', (0.0, 0.0))
+    return ((prompt_tokens + embedding_tokens) * prompt_price + completion_tokens * completion_price) / 1000.0
+
+
+class UsageLedger:
+    """
+    Records token usage per call, tagged by session, agent, tool and phase.
+    Totals are aggregated in memory and flushed to SQLite periodically by a
+    background thread, so recording never touches the disk on the hot path.
+    """
+
+    def __init__(self, db_path: str = USAGE_DB_PATH, flush_interval: float = USAGE_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}  # (session, agent, tool, phase, model) -> field deltas not yet flushed
+        self._totals = {}  # Same key -> lifetime totals for this process
+        self._session_totals = {}  # session -> [tokens, cost]
+        self._agent_totals = {}  # agent -> [tokens, cost]
+        self._degraded = set()  # (scope, name, feature) already reported
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def start(self):
+        """Starts the periodic flush thread (idempotent)."""
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='usage-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def record(self, model: Optional[str], prompt_tokens: int = 0, completion_tokens: int = 0,
+               embedding_tokens: int = 0, session: str = 'local', agent: str = '', tool: str = '', phase: str = ''):
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, embedding_tokens)
+        key = (session or 'local', agent or '', tool or '', phase or '', model or '')
+        deltas = (1, prompt_tokens, completion_tokens, embedding_tokens, cost)
+        tokens = prompt_tokens + completion_tokens + embedding_tokens
+        with self._lock:
+            for table in (self._pending, self._totals):
+                row = table.setdefault(key, [0, 0, 0, 0, 0.0])
+                for index, delta in enumerate(deltas):
+                    row[index] += delta
+            for table, name in ((self._session_totals, key[0]), (self._agent_totals, key[1])):
+                totals = table.setdefault(name, [0, 0.0])
+                totals[0] += tokens
+                totals[1] += cost
+        self.start()
+
+    def record_usage(self, usage, model: Optional[str], phase: str, session: str = 'local', agent: str = '',
+                     tool: str = ''):
+        """Records an API `usage` block (SDK object or dict). Embedding calls count as embedding tokens."""
+        if usage is None:
+            return
+        read = (lambda field: usage.get(field) or 0) if isinstance(usage, dict) else (lambda field: getattr(usage, field, 0) or 0)
+        prompt_tokens, completion_tokens = read('prompt_tokens'), read('completion_tokens')
+        embedding_tokens = 0
+        if phase == 'embedding':
+            prompt_tokens, embedding_tokens = 0, prompt_tokens
+        self.record(model, prompt_tokens, completion_tokens, embedding_tokens, session, agent, tool, phase)
+
+    def session_usage(self, session: str):
+        with self._lock:
+            tokens, cost = self._session_totals.get(session, [0, 0.0])
+        return {'tokens': tokens, 'cost_usd': cost}
+
+    def agent_usage(self, agent: str):
+        with self._lock:
+            tokens, cost = self._agent_totals.get(agent, [0, 0.0])
+        return {'tokens': tokens, 'cost_usd': cost}
+
+    def _over_budget(self, usage: Dict, token_budget: int, cost_budget: float) -> bool:
+        return bool((token_budget and usage['tokens'] >= token_budget)
+                    or (cost_budget and usage['cost_usd'] >= cost_budget))
+
+    def allow(self, feature: str, session: str = 'local', agent: str = '') -> bool:
+        """
+        Returns False when optional work (reflection, summarization, vision) should be skipped
+        because the session or agent has used up its budget.
+        """
+        checks = (
+            ('session', session, self.session_usage(session), SESSION_TOKEN_BUDGET, SESSION_COST_BUDGET),
+            ('agent', agent, self.agent_usage(agent), AGENT_TOKEN_BUDGET, AGENT_COST_BUDGET),
+        )
+        for scope, name, usage, token_budget, cost_budget in checks:
+            if name and self._over_budget(usage, token_budget, cost_budget):
+                if (scope, name, feature) not in self._degraded:
+                    self._degraded.add((scope, name, feature))
+                    logging.warning(f"{scope.capitalize()} '{name}' is over budget ({usage['tokens']} tokens, "
+                                    f"${usage['cost_usd']:.4f}); skipping optional {feature}.")
+                return False
+        return True
+
+    def summary(self, group_by: str = 'agent') -> Dict:
+        """Lifetime totals in this process grouped by session, agent, tool, phase or model."""
+        position = ('session', 'agent', 'tool', 'phase', 'model').index(group_by)
+        grouped = {}
+        with self._lock:
+            for key, row in self._totals.items():
+                target = grouped.setdefault(key[position], dict.fromkeys(_FIELDS, 0))
+                for field, value in zip(_FIELDS, row):
+                    target[field] += value
+        return grouped
+
+    def flush(self):
+        """Writes the pending aggregates to SQLite."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = time.time()
+        rows = [(now,) + key + tuple(row) for key, row in pending.items()]
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS usage (ts REAL, session TEXT, agent TEXT, tool TEXT, phase TEXT, '
+                'model TEXT, calls INTEGER, prompt_tokens INTEGER, completion_tokens INTEGER, '
+                'embedding_tokens INTEGER, cost_usd REAL)'
+            )
+            conn.executemany('INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logging.error(f"Failed to flush usage ledger. Error: {str(e)}")
+            # Put the deltas back so they are retried on the next flush
+            with self._lock:
+                for key, row in pending.items():
+                    target = self._pending.setdefault(key, [0, 0, 0, 0, 0.0])
+                    for index, value in enumerate(row):
+                        target[index] += value
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+ledger = UsageLedger()